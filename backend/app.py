@@ -4,26 +4,52 @@ from __future__ import annotations
 import json
 import os
 import math
-import numpy as np
+import time
 from typing import Dict, Any, List
 
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, stream_with_context, send_file, g
 from flask_cors import CORS
-from dotenv import load_dotenv
 
+# Nota: auth.spotify_oauth ya ejecuta load_dotenv() al importarse
 from auth.spotify_oauth import FRONTEND_URL
-from services.spotify_service import EnhancedSpotifyService
+from auth.token_manager import token_manager
+from services.spotify_service import get_spotify_service, UpstreamError
+from services.stats_engine import ListeningStatsEngine
+from services.history_store import ListeningHistoryStore
+from utils.playback_clock import server_now_ms, clock_sync_reply
 from websockets.live_visualizer import socketio, init_socketio
+from utils.lazy_import import lazy_import, is_loaded
+from utils.request_profiler import request_profiler, profiling_requested, admin_token_valid
+from utils.metrics import registry as metrics_registry, STAGE_LATENCY, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.log import get_logger, set_request_id, current_request_id, sampled
+from utils.tracing import span, start_root_span, end_root_span
+from utils.admission import limit_concurrency, limit_streaming, track_admission, api_admission
+from utils.quality_tiers import parse_tier
+from utils.shared_cache import cache_report
 
 # ================== Configuración básica ==================
 
-load_dotenv()
+# NumPy solo se importa si algo llega a usarlo
+np = lazy_import("numpy")
 
 app = Flask(__name__)
 
+log = get_logger("BACKEND")
+
+# Fracción de peticiones que dejan una línea de resumen a nivel INFO
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("LOG_REQUEST_SAMPLE_RATE", "0.01"))
+
+HTTP_LATENCY = metrics_registry.histogram(
+    "http_request_seconds",
+    "Duración de las peticiones HTTP por endpoint y código",
+    ["endpoint", "status"],
+)
+
 # JSON encoder personalizado para manejar tipos numpy
 class NumpyJSONEncoder(json.JSONEncoder):
     def default(self, obj):
+        if not is_loaded("numpy"):
+            return super(NumpyJSONEncoder, self).default(obj)
         if isinstance(obj, (np.integer, np.int32, np.int64)):
             return int(obj)
         elif isinstance(obj, (np.floating, np.float32, np.float64)):
@@ -53,25 +79,64 @@ CORS(
         "http://127.0.0.1:8000",
     ],
     supports_credentials=True,
-    allow_headers=["Content-Type", "Authorization", "X-Refresh-Token", "Accept"],
+    allow_headers=["Content-Type", "Authorization", "X-Refresh-Token", "Accept", "X-Admin-Token", "X-Profile",
+                   "X-Request-Id", "X-Quality-Tier"],
+    expose_headers=["X-Request-Id", "X-Profile-Id", "Retry-After", "X-Quality-Tier"],
     methods=["GET", "POST", "OPTIONS", "PUT", "DELETE"]
 )
 
 # Integrar SocketIO con la app
 init_socketio(app)
 
-print("🚀 Iniciando servidor Spotify Visualizer PRO...")
-print(f"📍 FRONTEND_URL: {FRONTEND_URL}")
-print(f"📍 SPOTIFY_REDIRECT_URI: {os.getenv('SPOTIFY_REDIRECT_URI')}")
-print("=" * 50)
-print("🔍 DEBUG - Verificación de variables de entorno")
-print(f"SPOTIFY_CLIENT_ID: {'✓' if os.getenv('SPOTIFY_CLIENT_ID') else '✗'}")
-print(f"SPOTIFY_CLIENT_ID length: {len(os.getenv('SPOTIFY_CLIENT_ID', ''))}")
-print(f"SPOTIFY_REDIRECT_URI: {os.getenv('SPOTIFY_REDIRECT_URI')}")
-print("=" * 50)
 
-# Inicializar el servicio mejorado
-spotify_service = EnhancedSpotifyService()
+# ================== Correlación de peticiones ==================
+
+@app.before_request
+def _start_request():
+    # Se respeta el X-Request-Id de un proxy / del cliente si es razonable
+    incoming = request.headers.get("X-Request-Id", "")
+    valid = 0 < len(incoming) <= 64 and all(c.isalnum() or c in "-_" for c in incoming)
+    set_request_id(incoming if valid else None)
+    g.request_started = time.perf_counter()
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    g.trace = start_root_span(f"{request.method} {route}", **{"http.method": request.method, "http.route": route})
+
+
+@app.after_request
+def _finish_request(response):
+    request_id = current_request_id()
+    if request_id:
+        response.headers["X-Request-Id"] = request_id
+
+    started = g.pop("request_started", None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_LATENCY.observe(elapsed, endpoint=endpoint, status=str(response.status_code))
+        log.info("%s %s -> %s en %.1f ms", request.method, endpoint, response.status_code, elapsed * 1000,
+                 extra=sampled(REQUEST_LOG_SAMPLE_RATE))
+
+    end_root_span(g.pop("trace", None), **{"http.status_code": response.status_code})
+    return response
+
+
+def _print_startup_banner():
+    """Banner de arranque (solo al ejecutar app.py directamente, no en cada worker)"""
+    print("🚀 Iniciando servidor Spotify Visualizer PRO...")
+    print(f"📍 FRONTEND_URL: {FRONTEND_URL}")
+    print(f"📍 SPOTIFY_REDIRECT_URI: {os.getenv('SPOTIFY_REDIRECT_URI')}")
+    print("=" * 50)
+    print("🔍 DEBUG - Verificación de variables de entorno")
+    print(f"SPOTIFY_CLIENT_ID: {'✓' if os.getenv('SPOTIFY_CLIENT_ID') else '✗'}")
+    print(f"SPOTIFY_CLIENT_ID length: {len(os.getenv('SPOTIFY_CLIENT_ID', ''))}")
+    print(f"SPOTIFY_REDIRECT_URI: {os.getenv('SPOTIFY_REDIRECT_URI')}")
+    print("=" * 50)
+
+
+# Servicio mejorado compartido (la misma instancia que usa live_visualizer)
+spotify_service = get_spotify_service()
+history_store = ListeningHistoryStore()
+stats_engine = ListeningStatsEngine(spotify_service, history_store)
 
 
 # ================== Helpers internos ==================
@@ -79,13 +144,58 @@ spotify_service = EnhancedSpotifyService()
 def _get_access_token_from_header() -> str | None:
     """
     Extrae el access_token del header Authorization: Bearer <token>.
+    Si es el último token emitido a un usuario registrado (o uno anterior que
+    aún no ha caducado) se usa su token vigente; un token antiguo ya caducado
+    devuelve None (401) para que el cliente refresque.
     """
     auth_header = request.headers.get("Authorization", "")
     if auth_header.startswith("Bearer "):
-        return auth_header.replace("Bearer ", "").strip()
+        return token_manager.fresh_token_for(auth_header.replace("Bearer ", "").strip())
     return None
 
 
+def _upstream_error_response(e: UpstreamError):
+    """Error de Spotify con su código: 401 (refrescar), 429 (Retry-After) o 502"""
+    status = e.status_code if e.status_code in (401, 403, 404, 429) else 502
+    response = jsonify({"error": str(e), "upstream_status": e.status_code})
+    response.status_code = status
+    if e.retry_after:
+        response.headers["Retry-After"] = e.retry_after
+    return response
+
+
+def _ndjson_response(items) -> Response:
+    """
+    Respuesta NDJSON en streaming: una línea JSON por item, enviada en cuanto
+    el generador la produce (memoria plana y primer item antes).
+    El primer item se pide antes de responder: si Spotify falla de entrada el
+    cliente recibe el código de error, no un 200 vacío. Un fallo a mitad del
+    stream termina con una línea {"error": ...}.
+    """
+    items = iter(items)
+    try:
+        first = next(items, None)
+    except UpstreamError as e:
+        return _upstream_error_response(e)
+
+    def generate():
+        try:
+            if first is None:
+                return
+            yield json.dumps(first, cls=NumpyJSONEncoder, separators=(",", ":")) + "\n"
+            for item in items:
+                yield json.dumps(item, cls=NumpyJSONEncoder, separators=(",", ":")) + "\n"
+        except Exception as e:
+            log.error("💥 Error en streaming NDJSON: %s", e)
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"},
+    )
+
+
 def _callback_success_html(data: dict) -> str:
     """
     Genera HTML que cierra la ventana y envía datos al window.opener (frontend).
@@ -313,6 +423,23 @@ def home():
     return jsonify({"message": "Spotify Visualizer PRO API", "status": "running", "version": "2.0"})
 
 
+@app.route("/metrics")
+def metrics():
+    """Métricas del proceso en formato de texto de Prometheus"""
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route("/api/clock-sync")
+def clock_sync():
+    """
+    Ping de sincronización de reloj (estilo NTP) para clientes que usan HTTP.
+    Devuelve los timestamps del servidor (reloj de pared en ms epoch, comparables
+    entre nodos) junto al client_ts recibido.
+    """
+    server_recv_ms = server_now_ms()
+    return jsonify(clock_sync_reply(request.args.get("client_ts"), server_recv_ms))
+
+
 # ================== OAuth ==================
 
 @app.route("/auth/login")
@@ -322,10 +449,10 @@ def login():
     El frontend abre esta URL en una nueva pestaña/ventana.
     """
     try:
-        print("🔍 /auth/login llamado")
+        log.debug("🔍 /auth/login llamado")
         auth_url = spotify_service.get_auth_url(show_dialog=True)
 
-        print(f"🔗 URL de autenticación generada: {auth_url[:100]}...")
+        log.debug("🔗 URL de autenticación generada: %s...", auth_url[:100])
 
         return jsonify({
             "auth_url": auth_url,
@@ -337,9 +464,7 @@ def login():
         })
 
     except Exception as e:
-        print(f"💥 Error COMPLETO en /auth/login: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("💥 Error en /auth/login: %s", e)
         return jsonify({
             "error": f"No se pudo generar la URL de autenticación: {str(e)}",
             "debug_info": {
@@ -359,22 +484,22 @@ def callback():
         auth_code = request.args.get("code")
         error = request.args.get("error")
 
-        print(f"📞 Callback recibido - code: {'✓' if auth_code else '✗'}, error: {error}")
+        log.debug("📞 Callback recibido - code: %s, error: %s", "✓" if auth_code else "✗", error)
 
         if error:
-            print(f"❌ Error en callback: {error}")
+            log.error("❌ Error en callback: %s", error)
             return _callback_error_html(f"Spotify error: {error}")
 
         if not auth_code:
-            print("❌ No se recibió código de autorización")
+            log.error("❌ No se recibió código de autorización")
             return _callback_error_html("No authorization code")
 
         tokens = spotify_service.exchange_code_for_tokens(auth_code)
         if not tokens:
-            print("❌ Falló el intercambio de tokens")
+            log.error("❌ Falló el intercambio de tokens")
             return _callback_error_html("Authentication failed - token exchange failed")
 
-        print("🎉 ¡Autenticación completada exitosamente!")
+        log.info("🎉 ¡Autenticación completada exitosamente!")
 
         access_token = tokens.get("access_token")
         refresh_token_value = tokens.get("refresh_token")
@@ -386,6 +511,10 @@ def callback():
         if access_token:
             user_profile = spotify_service.get_user_profile(access_token)
 
+        # El servidor guarda los tokens para refrescarlos antes de que caduquen
+        if user_profile and user_profile.get("id"):
+            token_manager.store_tokens(user_profile["id"], tokens)
+
         # Preparar datos para enviar al frontend
         callback_data = {
             "access_token": access_token,
@@ -409,7 +538,7 @@ def callback():
         return _callback_success_html(callback_data)
 
     except Exception as e:
-        print(f"💥 Excepción en callback: {e}")
+        log.error("💥 Excepción en callback: %s", e)
         return _callback_error_html("Internal server error")
 
 
@@ -425,42 +554,66 @@ def refresh():
         if not refresh_token_body:
             return jsonify({"error": "No refresh_token provided"}), 400
 
-        tokens = spotify_service.refresh_access_token(refresh_token_body)
+        # Single-flight: varias pestañas refrescando a la vez comparten la llamada
+        tokens = token_manager.refresh(refresh_token_body)
         if not tokens:
             return jsonify({"error": "Could not refresh token"}), 400
 
+        if token_manager.user_for_refresh_token(refresh_token_body) is None:
+            user_id = spotify_service.get_user_id(tokens["access_token"])
+            if user_id:
+                token_manager.store_tokens(
+                    user_id, dict(tokens, refresh_token=tokens.get("refresh_token") or refresh_token_body)
+                )
+
         return jsonify(tokens), 200
 
     except Exception as e:
-        print(f"💥 Error en /auth/refresh: {e}")
+        log.error("💥 Error en /auth/refresh: %s", e)
         return jsonify({"error": "Internal server error"}), 500
 
 
 # ================== Endpoints protegidos ==================
 
 @app.route('/api/current-track')
+@limit_concurrency(track_admission)
 def current_track():
     access_token = _get_access_token_from_header()
 
-    print(f"🔍 [BACKEND] Token recibido: {'✓' if access_token else '✗'}")
+    log.debug("🔍 Token recibido: %s", '✓' if access_token else '✗')
 
     if not access_token:
         return jsonify({"error": "No access token"}), 401
 
+    # Nivel de calidad pedido por el cliente (solo puede pedir menos que el automático)
+    quality = parse_tier(request.headers.get("X-Quality-Tier") or request.args.get("quality"))
+
+    # Perfilado opcional de esta petición (solo operadores con ADMIN_TOKEN)
+    if profiling_requested(request):
+        with request_profiler.profile("current-track") as run:
+            response = app.make_response(_current_track_response(access_token, quality))
+        if run["id"]:
+            response.headers["X-Profile-Id"] = run["id"]
+        return response
+
+    return _current_track_response(access_token, quality)
+
+
+def _current_track_response(access_token: str, quality: int | None = None):
     try:
         # Usar el servicio mejorado
-        track_data = spotify_service.get_current_track_enhanced(access_token)
+        track_data = spotify_service.get_current_track_enhanced(access_token, quality)
 
-        print(f"🔍 [BACKEND] Track data recibido de Spotify: {'✓' if track_data else '✗'}")
+        log.debug("🔍 Track data recibido de Spotify: %s", '✓' if track_data else '✗')
 
         if track_data:
-            print(f"🎵 [BACKEND] Canción: {track_data.get('item', {}).get('name', 'No name')}")
-            print(f"▶️ [BACKEND] Reproduciendo: {track_data.get('is_playing', False)}")
-            print(f"🎨 [BACKEND] Album colors: {'✓' if 'album_colors' in track_data else '✗'}")
+            log.debug("🎵 Canción: %s", track_data.get('item', {}).get('name', 'No name'))
+            log.debug("▶️ Reproduciendo: %s", track_data.get('is_playing', False))
+            log.debug("🎨 Album colors: %s", '✓' if 'album_colors' in track_data else '✗')
 
         # Si no hay canción reproduciéndose
         if track_data is None or track_data.get('is_playing') is False:
-            print("⏸️ [BACKEND] No hay reproducción activa")
+            log.debug("⏸️ No hay reproducción activa")
             return jsonify({
                 "is_playing": False,
                 "message": "No track playing",
@@ -484,12 +637,13 @@ def current_track():
                 track_data['movement_rules']['attraction_points'] = attraction_points
 
         # ✅ Usar jsonify que utilizará nuestro encoder personalizado
-        return jsonify(track_data)
+        with STAGE_LATENCY.time(stage="json_encode"), span("serialize"):
+            response = jsonify(track_data)
+        response.headers["X-Quality-Tier"] = track_data.get("quality", {}).get("name", "full")
+        return response
 
     except Exception as e:
-        print(f"💥 [BACKEND] Error en /api/current-track: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("💥 Error en /api/current-track: %s", e)
         return jsonify({
             "error": str(e),
             "debug": "Exception occurred",
@@ -498,6 +652,7 @@ def current_track():
 
 
 @app.route("/api/user-profile")
+@limit_concurrency(api_admission)
 def user_profile():
     access_token = _get_access_token_from_header()
     if not access_token:
@@ -510,11 +665,12 @@ def user_profile():
         else:
             return jsonify({"error": "Could not fetch user profile"}), 400
     except Exception as e:
-        print(f"💥 Error en /api/user-profile: {e}")
+        log.error("💥 Error en /api/user-profile: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/top-tracks")
+@limit_concurrency(api_admission)
 def top_tracks():
     access_token = _get_access_token_from_header()
     if not access_token:
@@ -523,18 +679,20 @@ def top_tracks():
     try:
         time_range = request.args.get("time_range", "short_term")
         limit = int(request.args.get("limit", 10))
+        include_features = request.args.get("include_features", "false").lower() == "true"
 
-        tracks_data = spotify_service.get_top_tracks(access_token, time_range, limit)
+        tracks_data = spotify_service.get_top_tracks(access_token, time_range, limit, include_features)
         if tracks_data:
             return jsonify(tracks_data), 200
         else:
             return jsonify({"error": "Could not fetch top tracks"}), 400
     except Exception as e:
-        print(f"💥 Error en /api/top-tracks: {e}")
+        log.error("💥 Error en /api/top-tracks: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/top-artists")
+@limit_concurrency(api_admission)
 def top_artists():
     access_token = _get_access_token_from_header()
     if not access_token:
@@ -550,11 +708,12 @@ def top_artists():
         else:
             return jsonify({"error": "Could not fetch top artists"}), 400
     except Exception as e:
-        print(f"💥 Error en /api/top-artists: {e}")
+        log.error("💥 Error en /api/top-artists: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/recent-tracks")
+@limit_concurrency(api_admission)
 def recent_tracks():
     access_token = _get_access_token_from_header()
     if not access_token:
@@ -562,18 +721,217 @@ def recent_tracks():
 
     try:
         limit = int(request.args.get("limit", 20))
+        include_features = request.args.get("include_features", "false").lower() == "true"
 
-        recent_data = spotify_service.get_recent_tracks(access_token, limit)
+        recent_data = spotify_service.get_recent_tracks(access_token, limit, include_features)
         if recent_data:
             return jsonify(recent_data), 200
         else:
             return jsonify({"error": "Could not fetch recent tracks"}), 400
     except Exception as e:
-        print(f"💥 Error en /api/recent-tracks: {e}")
+        log.error("💥 Error en /api/recent-tracks: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/history")
+@limit_concurrency(api_admission)
+def listening_history():
+    """
+    Historial de escucha desde el almacén local (sincroniza antes si está viejo).
+    Parámetros: limit, since / until (ms desde epoch).
+    """
+    access_token = _get_access_token_from_header()
+    if not access_token:
+        return jsonify({"error": "No access token"}), 401
+
+    try:
+        user_id = spotify_service.get_user_id(access_token)
+        if not user_id:
+            return jsonify({"error": "Could not resolve user"}), 400
+
+        history_store.sync_if_stale(spotify_service, access_token, user_id)
+
+        limit = int(request.args.get("limit", 50))
+        since_ms = request.args.get("since", type=int)
+        until_ms = request.args.get("until", type=int)
+
+        items = history_store.get_plays(user_id, limit, since_ms, until_ms)
+        return jsonify({
+            "items": items,
+            "total": history_store.count_plays(user_id, since_ms, until_ms),
+            "sync": history_store.get_sync_state(user_id),
+        }), 200
+    except UpstreamError as e:
+        return _upstream_error_response(e)
+    except Exception as e:
+        log.error("💥 Error en /api/history: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/history/sync", methods=["POST"])
+@limit_concurrency(api_admission)
+def sync_history():
+    """Fuerza un sync incremental del historial local"""
+    access_token = _get_access_token_from_header()
+    if not access_token:
+        return jsonify({"error": "No access token"}), 401
+
+    try:
+        user_id = spotify_service.get_user_id(access_token)
+        if not user_id:
+            return jsonify({"error": "Could not resolve user"}), 400
+
+        result = history_store.sync_user(spotify_service, access_token, user_id)
+        return jsonify({
+            "new_plays": result["new_plays"],
+            "pages": result["pages"],
+            "sync_ms": result["sync_ms"],
+            "total": history_store.count_plays(user_id),
+        }), 200
+    except UpstreamError as e:
+        return _upstream_error_response(e)
+    except Exception as e:
+        log.error("💥 Error en /api/history/sync: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/history/timeline")
+@limit_concurrency(api_admission)
+def history_timeline():
+    """
+    Serie temporal desde los agregados: reproducciones, minutos y medias de
+    features por cubo. Parámetros: granularity (hour|day|week), since, until.
+    """
+    access_token = _get_access_token_from_header()
+    if not access_token:
+        return jsonify({"error": "No access token"}), 401
+
+    try:
+        user_id = spotify_service.get_user_id(access_token)
+        if not user_id:
+            return jsonify({"error": "Could not resolve user"}), 400
+
+        history_store.sync_if_stale(spotify_service, access_token, user_id)
+
+        granularity = request.args.get("granularity", "day")
+        if granularity not in ("hour", "day", "week"):
+            return jsonify({"error": "granularity must be hour, day or week"}), 400
+
+        since_ms = request.args.get("since", type=int)
+        until_ms = request.args.get("until", type=int)
+        return jsonify({
+            "granularity": granularity,
+            "buckets": history_store.rollups.get_buckets(user_id, granularity, since_ms, until_ms),
+            "top_artists": history_store.rollups.get_top_counts(user_id, "artist", granularity, since_ms, until_ms),
+            "top_genres": history_store.rollups.get_top_counts(user_id, "genre", granularity, since_ms, until_ms),
+        }), 200
+    except UpstreamError as e:
+        return _upstream_error_response(e)
+    except Exception as e:
+        log.error("💥 Error en /api/history/timeline: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/history/heatmap")
+@limit_concurrency(api_admission)
+def history_heatmap():
+    """Mapa de calor 7x24 (día de la semana x hora). Parámetro: tz_offset (horas)"""
+    access_token = _get_access_token_from_header()
+    if not access_token:
+        return jsonify({"error": "No access token"}), 401
+
+    try:
+        user_id = spotify_service.get_user_id(access_token)
+        if not user_id:
+            return jsonify({"error": "Could not resolve user"}), 400
+
+        history_store.sync_if_stale(spotify_service, access_token, user_id)
+
+        tz_offset = request.args.get("tz_offset", 0, type=int)
+        return jsonify({
+            "tz_offset": tz_offset,
+            "days": ["mon", "tue", "wed", "thu", "fri", "sat", "sun"],
+            "heatmap": history_store.rollups.get_heatmap(user_id, tz_offset),
+        }), 200
+    except UpstreamError as e:
+        return _upstream_error_response(e)
+    except Exception as e:
+        log.error("💥 Error en /api/history/heatmap: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/top-tracks/stream")
+@limit_streaming(api_admission)
+def top_tracks_stream():
+    access_token = _get_access_token_from_header()
+    if not access_token:
+        return jsonify({"error": "No access token"}), 401
+
+    time_range = request.args.get("time_range", "short_term")
+    limit = int(request.args.get("limit", 50))
+    page_size = int(request.args.get("page_size", 10))
+    include_features = request.args.get("include_features", "false").lower() == "true"
+
+    return _ndjson_response(spotify_service.iter_top_tracks(
+        access_token, time_range, limit, include_features, page_size))
+
+
+@app.route("/api/top-artists/stream")
+@limit_streaming(api_admission)
+def top_artists_stream():
+    access_token = _get_access_token_from_header()
+    if not access_token:
+        return jsonify({"error": "No access token"}), 401
+
+    time_range = request.args.get("time_range", "short_term")
+    limit = int(request.args.get("limit", 50))
+    page_size = int(request.args.get("page_size", 10))
+
+    return _ndjson_response(spotify_service.iter_top_artists(access_token, time_range, limit, page_size))
+
+
+@app.route("/api/recent-tracks/stream")
+@limit_streaming(api_admission)
+def recent_tracks_stream():
+    access_token = _get_access_token_from_header()
+    if not access_token:
+        return jsonify({"error": "No access token"}), 401
+
+    limit = int(request.args.get("limit", 50))
+    page_size = int(request.args.get("page_size", 10))
+    include_features = request.args.get("include_features", "false").lower() == "true"
+
+    return _ndjson_response(spotify_service.iter_recent_tracks(
+        access_token, limit, include_features, page_size))
+
+
+@app.route("/api/history/stream")
+@limit_streaming(api_admission)
+def history_stream():
+    """Historial local completo (o por rango since/until) en NDJSON"""
+    access_token = _get_access_token_from_header()
+    if not access_token:
+        return jsonify({"error": "No access token"}), 401
+
+    user_id = spotify_service.get_user_id(access_token)
+    if not user_id:
+        return jsonify({"error": "Could not resolve user"}), 400
+
+    # Como el resto de endpoints del historial: sincronizar antes si está viejo
+    try:
+        history_store.sync_if_stale(spotify_service, access_token, user_id)
+    except UpstreamError as e:
+        return _upstream_error_response(e)
+    except Exception as e:
+        log.warning("⚠️ Sync del historial fallido, se sirve lo guardado: %s", e)
+
+    since_ms = request.args.get("since", type=int)
+    until_ms = request.args.get("until", type=int)
+    return _ndjson_response(history_store.iter_plays(user_id, since_ms, until_ms))
+
+
 @app.route('/api/debug-visualizer')
+@limit_concurrency(track_admission)
 def debug_visualizer():
     """Endpoint para debug - ver qué datos está recibiendo el frontend"""
     access_token = _get_access_token_from_header()
@@ -604,53 +962,36 @@ def debug_visualizer():
         return jsonify(debug_info)
 
     except Exception as e:
-        print(f"💥 Error en /api/debug-visualizer: {e}")
+        log.error("💥 Error en /api/debug-visualizer: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/stats")
+@limit_concurrency(api_admission)
 def user_stats():
     """
-    Ejemplo de endpoint de stats.
+    Estadísticas de escucha: medias, percentiles, distribuciones de audio
+    features y comparación entre rangos de tiempo (cacheadas por usuario).
     """
     access_token = _get_access_token_from_header()
     if not access_token:
         return jsonify({"error": "No access token"}), 401
 
     try:
-        top_tracks = spotify_service.get_top_tracks(access_token, "medium_term", 50)
-        top_artists = spotify_service.get_top_artists(access_token, "medium_term", 50)
-        recent_tracks = spotify_service.get_recent_tracks(access_token, 50)
-
-        total_tracks = len(recent_tracks.get("items", [])) if recent_tracks else 0
-        total_artists = len(top_artists.get("items", [])) if top_artists else 0
-
-        stats = {
-            "total_tracks_played": total_tracks,
-            "total_artists": total_artists,
-            "audio_features": {
-                "avg_energy": 0.65,
-                "avg_tempo": 125,
-                "avg_danceability": 0.72,
-            },
-        }
-
-        return jsonify(stats), 200
+        force_refresh = request.args.get("refresh", "false").lower() == "true"
+        stats = stats_engine.get_stats(access_token, force_refresh=force_refresh)
+        if stats:
+            return jsonify(stats), 200
+        else:
+            return jsonify({"error": "Could not compute stats"}), 400
 
     except Exception as e:
-        print(f"💥 Error en /api/stats: {e}")
-        return jsonify({
-            "total_tracks_played": 156,
-            "total_artists": 42,
-            "audio_features": {
-                "avg_energy": 0.68,
-                "avg_tempo": 128,
-                "avg_danceability": 0.75,
-            },
-        }), 200
+        log.error("💥 Error en /api/stats: %s", e)
+        return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/album-colors")
+@limit_concurrency(track_admission)
 def album_colors():
     """
     Endpoint directo para extraer colores de un álbum (para testing).
@@ -660,7 +1001,7 @@ def album_colors():
         if not image_url:
             return jsonify({"error": "No image_url provided"}), 400
 
-        print(f"🎨 Extrayendo colores de: {image_url}")
+        log.debug("🎨 Extrayendo colores de: %s", image_url)
 
         # Usar el extractor directamente
         from utils.album_color_extractor import get_album_colors_from_url
@@ -673,13 +1014,62 @@ def album_colors():
         })
 
     except Exception as e:
-        print(f"💥 Error en /api/album-colors: {e}")
+        log.error("💥 Error en /api/album-colors: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
+# ================== Administración ==================
+
+def _admin_authorized() -> bool:
+    return admin_token_valid(request.headers.get("X-Admin-Token"))
+
+
+@app.route("/api/admin/caches")
+def cache_stats():
+    """Presupuesto de memoria de los caches y tamaño / aciertos / expulsiones de cada uno"""
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(cache_report())
+
+
+@app.route("/api/admin/profiles")
+def list_profiles():
+    """Perfiles guardados por el perfilado bajo demanda"""
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({"profiles": request_profiler.list_profiles()})
+
+
+@app.route("/api/admin/profiles/<profile_id>")
+def download_profile(profile_id: str):
+    """
+    Descarga un perfil .prof (abrir con pstats / snakeviz), o un resumen
+    en texto con ?format=text&sort=cumulative&limit=50.
+    """
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+
+    if request.args.get("format") == "text":
+        text = request_profiler.render_text(
+            profile_id,
+            sort=request.args.get("sort", "cumulative"),
+            limit=request.args.get("limit", 50, type=int),
+        )
+        if text is None:
+            return jsonify({"error": "Profile not found"}), 404
+        return Response(text, mimetype="text/plain")
+
+    path = request_profiler.path_for(profile_id)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, mimetype="application/octet-stream", as_attachment=True,
+                     download_name=f"{profile_id}.prof")
+
+
 # ================== Entry point ==================
 
 if __name__ == "__main__":
+    _print_startup_banner()
     print("🎵 Servidor Spotify Visualizer PRO iniciado!")
     print("📍 Puerto: 8080")
     print("🔗 Redirect URI:", os.getenv("SPOTIFY_REDIRECT_URI"))
@@ -8,6 +8,11 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Después de load_dotenv: LOG_LEVEL puede venir del .env
+from utils.log import get_logger
+
+log = get_logger("SpotifyOAuth")
+
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 SPOTIFY_REDIRECT_URI = os.getenv(
@@ -17,6 +22,10 @@ SPOTIFY_REDIRECT_URI = os.getenv(
 
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://127.0.0.1:3000")
 
+# Cuentas de Spotify (authorize / token). Se puede apuntar al emulador local
+# (python -m tools.spotify_emulator) para pruebas de carga y benchmarks.
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com").rstrip("/")
+
 SPOTIFY_SCOPES = " ".join([
     "user-read-currently-playing",
     "user-read-playback-state",
@@ -45,7 +54,7 @@ def _get_basic_auth_header() -> str:
 
 def get_auth_url(show_dialog=False, state=None):
     """Genera la URL de autorización de Spotify"""
-    auth_base_url = "https://accounts.spotify.com/authorize"
+    auth_base_url = f"{SPOTIFY_ACCOUNTS_URL}/authorize"
 
     params = {
         'client_id': SPOTIFY_CLIENT_ID,
@@ -60,14 +69,14 @@ def get_auth_url(show_dialog=False, state=None):
         params['state'] = state
 
     auth_url = f"{auth_base_url}?{urlencode(params)}"
-    print(f"[DEBUG] ✅ Auth URL generada")
+    log.debug("✅ Auth URL generada")
     return auth_url
 
 
 def exchange_code_for_tokens(auth_code: str) -> dict | None:
     """Intercambia el código de autorización por tokens"""
     try:
-        token_url = "https://accounts.spotify.com/api/token"
+        token_url = f"{SPOTIFY_ACCOUNTS_URL}/api/token"
 
         headers = {
             "Authorization": _get_basic_auth_header(),
@@ -84,13 +93,13 @@ def exchange_code_for_tokens(auth_code: str) -> dict | None:
         response.raise_for_status()
 
         tokens = response.json()
-        print(f"[DEBUG] ✅ Tokens obtenidos")
+        log.debug("✅ Tokens obtenidos")
         return tokens
 
     except Exception as e:
-        print(f"❌ Error en exchange_code_for_tokens: {e}")
+        log.error("❌ Error en exchange_code_for_tokens: %s", e)
         if hasattr(e, 'response') and e.response:
-            print(f"❌ Response: {e.response.text}")
+            log.error("❌ Response: %s", e.response.text)
         return None
 
 
@@ -108,7 +117,7 @@ def refresh_access_token(refresh_token: str) -> dict | None:
         }
 
         response = requests.post(
-            "https://accounts.spotify.com/api/token",
+            f"{SPOTIFY_ACCOUNTS_URL}/api/token",
             headers=headers,
             data=data,
             timeout=10,
@@ -116,12 +125,12 @@ def refresh_access_token(refresh_token: str) -> dict | None:
 
         if response.status_code == 200:
             tokens = response.json()
-            print("[spotify_oauth] ✅ Access token refrescado")
+            log.debug("✅ Access token refrescado")
             return tokens
 
-        print(f"[spotify_oauth] ❌ Error al refrescar: {response.text}")
+        log.warning("❌ Error al refrescar: %s", response.text)
         return None
 
     except Exception as e:
-        print(f"[spotify_oauth] 💥 Excepción: {e}")
+        log.error("💥 Excepción al refrescar: %s", e)
         return None
\ No newline at end of file
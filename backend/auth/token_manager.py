@@ -0,0 +1,254 @@
+# backend/auth/token_manager.py
+
+"""
+Gestor de tokens en el servidor, por usuario de Spotify.
+- Refresca de forma proactiva antes de que caduque el access_token.
+- Refresh "single-flight": peticiones concurrentes con el mismo
+  refresh_token comparten una sola llamada a /api/token.
+- Avisa a los listeners (p.ej. el worker de websockets) cuando hay token
+  nuevo, para cambiarlo en los polls en curso sin esperar a un 401.
+- Olvida a los usuarios sin sockets ni peticiones durante TOKEN_IDLE_TTL
+  segundos (o al desconectarse su último socket): no se refrescan para siempre.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List
+
+from auth.spotify_oauth import refresh_access_token
+from utils.log import get_logger
+
+log = get_logger("TokenManager")
+
+
+class _Flight:
+    __slots__ = ("event", "result")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Dict | None = None
+
+
+class TokenManager:
+    # Refrescar cuando falten menos de N segundos para caducar
+    REFRESH_MARGIN_S = float(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+    CHECK_INTERVAL_S = 30.0
+    # Un refresh recién hecho se reutiliza (varias pestañas refrescando a la vez)
+    RECENT_REFRESH_S = 10.0
+    MAX_KNOWN_TOKENS = 4096
+    # Usuarios sin actividad (sockets o peticiones) durante N segundos se olvidan
+    IDLE_TTL_S = float(os.getenv("TOKEN_IDLE_TTL", "1800"))
+
+    def __init__(self, refresh_fn: Callable[[str], Dict | None] = refresh_access_token):
+        self.refresh_fn = refresh_fn
+        self._lock = threading.Lock()
+        # { user_id: {access_token, refresh_token, expires_at, last_seen} }
+        self._users: Dict[str, Dict[str, Any]] = {}
+        # { access_token (actual o antiguo): (user_id, expires_at) }
+        self._token_users: "OrderedDict[str, tuple]" = OrderedDict()
+        # { refresh_token: user_id }
+        self._refresh_users: Dict[str, str] = {}
+        self._inflight: Dict[str, _Flight] = {}
+        self._recent: Dict[str, tuple] = {}
+        self._listeners: List[Callable[[str, str, str | None], None]] = []
+        self._thread: threading.Thread | None = None
+
+    # ========================= Registro ==========================
+    def store_tokens(self, user_id: str, tokens: Dict) -> None:
+        """
+        Guarda los tokens de un usuario (callback OAuth, /auth/refresh, websockets).
+        Sin expires_in la caducidad es desconocida: se toma como ya vencida, así
+        que se refresca en cuanto se pida (si hay refresh_token) en vez de
+        suponer una hora de vida.
+        """
+        access_token = tokens.get("access_token")
+        if not user_id or not access_token:
+            return
+
+        expires_in = float(tokens.get("expires_in") or 0)
+        with self._lock:
+            entry = self._users.get(user_id, {})
+            previous_token = entry.get("access_token")
+            refresh_token = tokens.get("refresh_token") or entry.get("refresh_token")
+
+            expires_at = time.time() + expires_in
+            self._users[user_id] = {
+                "access_token": access_token,
+                "refresh_token": refresh_token,
+                "expires_at": expires_at,
+                "last_seen": time.monotonic(),
+            }
+            self._remember_token(access_token, user_id, expires_at)
+            if refresh_token:
+                self._refresh_users[refresh_token] = user_id
+
+        self._ensure_refresher()
+        if previous_token and previous_token != access_token:
+            self._notify(user_id, access_token, previous_token)
+
+    def add_listener(self, listener: Callable[[str, str, str | None], None]) -> None:
+        """listener(user_id, nuevo_access_token, access_token_anterior)"""
+        self._listeners.append(listener)
+
+    def user_for_refresh_token(self, refresh_token: str) -> str | None:
+        with self._lock:
+            return self._refresh_users.get(refresh_token)
+
+    def remove_user(self, user_id: str) -> None:
+        """Olvida al usuario y sus tokens (último socket desconectado, inactividad)"""
+        with self._lock:
+            entry = self._users.pop(user_id, None)
+            if entry is None:
+                return
+            for token in [t for t, (owner, _) in self._token_users.items() if owner == user_id]:
+                del self._token_users[token]
+            if entry.get("refresh_token"):
+                self._refresh_users.pop(entry["refresh_token"], None)
+                self._recent.pop(entry["refresh_token"], None)
+
+    def _remember_token(self, access_token: str, user_id: str, expires_at: float) -> None:
+        self._token_users[access_token] = (user_id, expires_at)
+        self._token_users.move_to_end(access_token)
+        while len(self._token_users) > self.MAX_KNOWN_TOKENS:
+            self._token_users.popitem(last=False)
+
+    # ========================= Consulta ==========================
+    def get_access_token(self, user_id: str) -> str | None:
+        """Token válido del usuario; lo refresca antes si está por caducar"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry:
+                entry["last_seen"] = time.monotonic()
+        if not entry:
+            return None
+
+        if entry["expires_at"] - time.time() <= self.REFRESH_MARGIN_S and entry.get("refresh_token"):
+            self.refresh_user(user_id)
+            with self._lock:
+                entry = self._users.get(user_id, entry)
+        return entry["access_token"]
+
+    def fresh_token_for(self, access_token: str) -> str | None:
+        """
+        Token vigente del usuario del token, si es el último que se le emitió o
+        aún no ha caducado (el cliente puede ir por detrás de un refresh).
+        Un token antiguo ya caducado devuelve None: el cliente debe refrescar.
+        Un token desconocido se devuelve tal cual (Spotify decide).
+        """
+        with self._lock:
+            known = self._token_users.get(access_token)
+            if known is None:
+                return access_token
+            user_id, expires_at = known
+            entry = self._users.get(user_id)
+            if entry is None:
+                return access_token
+            if entry["access_token"] != access_token and expires_at <= time.time():
+                return None
+        return self.get_access_token(user_id) or access_token
+
+    # ========================= Refresh ==========================
+    def refresh(self, refresh_token: str) -> Dict | None:
+        """Refresh single-flight: una sola llamada por refresh_token a la vez"""
+        now = time.monotonic()
+        with self._lock:
+            recent = self._recent.get(refresh_token)
+            if recent and now - recent[0] < self.RECENT_REFRESH_S:
+                return recent[1]
+
+            flight = self._inflight.get(refresh_token)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight()
+                self._inflight[refresh_token] = flight
+
+        if not is_leader:
+            flight.event.wait(timeout=15)
+            return flight.result
+
+        result = None
+        try:
+            result = self.refresh_fn(refresh_token)
+        finally:
+            flight.result = result
+            with self._lock:
+                self._inflight.pop(refresh_token, None)
+                if result:
+                    self._recent[refresh_token] = (time.monotonic(), result)
+                    # No acumular resultados viejos
+                    for key in [k for k, (ts, _) in self._recent.items() if now - ts > self.RECENT_REFRESH_S]:
+                        self._recent.pop(key, None)
+            flight.event.set()
+
+        user_id = self.user_for_refresh_token(refresh_token)
+        if result and user_id:
+            self.store_tokens(user_id, dict(result, refresh_token=result.get("refresh_token") or refresh_token))
+        return result
+
+    def refresh_user(self, user_id: str) -> str | None:
+        with self._lock:
+            entry = self._users.get(user_id)
+        if not entry or not entry.get("refresh_token"):
+            return None
+
+        result = self.refresh(entry["refresh_token"])
+        return result.get("access_token") if result else None
+
+    # ========================= Refresh proactivo ==========================
+    def _ensure_refresher(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._refresher_loop, name="token-refresher", daemon=True)
+        self._thread.start()
+
+    def evict_idle(self) -> List[str]:
+        """Olvida los usuarios inactivos y los tokens antiguos ya caducados"""
+        idle_before = time.monotonic() - self.IDLE_TTL_S
+        now = time.time()
+        with self._lock:
+            idle = [user_id for user_id, entry in self._users.items() if entry["last_seen"] < idle_before]
+            current = {entry["access_token"] for entry in self._users.values()}
+            for token in [t for t, (_, expires_at) in self._token_users.items()
+                          if expires_at <= now and t not in current]:
+                del self._token_users[token]
+        for user_id in idle:
+            self.remove_user(user_id)
+        return idle
+
+    def _refresher_loop(self) -> None:
+        log.info("🔑 Refresco proactivo de tokens iniciado")
+        while True:
+            time.sleep(self.CHECK_INTERVAL_S)
+            for user_id in self.evict_idle():
+                log.info("💤 Usuario inactivo olvidado: %s", user_id)
+
+            # Margen extra de un intervalo para no llegar tarde entre comprobaciones
+            deadline = time.time() + self.REFRESH_MARGIN_S + self.CHECK_INTERVAL_S
+            with self._lock:
+                due = [user_id for user_id, entry in self._users.items()
+                       if entry["expires_at"] <= deadline and entry.get("refresh_token")]
+
+            for user_id in due:
+                try:
+                    if self.refresh_user(user_id):
+                        log.debug("✅ Token refrescado para %s", user_id)
+                    else:
+                        log.warning("❌ No se pudo refrescar el token de %s", user_id)
+                except Exception as e:
+                    log.error("💥 Error refrescando %s: %s", user_id, e)
+
+    def _notify(self, user_id: str, access_token: str, previous_token: str | None) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(user_id, access_token, previous_token)
+            except Exception as e:
+                log.error("❌ Error en listener: %s", e)
+
+
+# Instancia global (una por proceso)
+token_manager = TokenManager()
@@ -0,0 +1,136 @@
+# backend/services/batch_loader.py
+
+"""
+Cargador por lotes para endpoints de Spotify que aceptan varios ids
+(/audio-features?ids=, /artists?ids=).
+Junta los ids que se piden durante una ventana corta (aunque vengan de
+peticiones distintas) y hace el mínimo número de llamadas por lote.
+Cada petición aporta su token: si un lote falla con uno (p. ej. caducado)
+se reintenta con el de otra petición del mismo lote.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+
+from utils.log import get_logger
+
+
+class _PendingId:
+    __slots__ = ("event", "value")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Dict | None = None
+
+
+class BatchLoader:
+    def __init__(self, name: str, fetch_batch: Callable[[List[str], str], Dict[str, Dict]],
+                 cache: Dict[str, Dict], max_batch: int, window_s: float = 0.01):
+        """
+        fetch_batch(ids, access_token) -> { id: datos } para como mucho max_batch ids.
+        Debe lanzar una excepción si la llamada falla (los ids que falten en la
+        respuesta se toman por desconocidos, no por fallo).
+        cache es el cache por id (TieredCache) que se va llenando con los resultados.
+        """
+        self.name = name
+        self.log = get_logger(f"BatchLoader:{name}")
+        self.fetch_batch = fetch_batch
+        self.cache = cache
+        self.max_batch = max_batch
+        self.window_s = window_s
+
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _PendingId] = {}
+        self._queued: List[str] = []
+        # Tokens de las peticiones que han encolado ids, sin repetir (el último, el más reciente)
+        self._queued_tokens: Dict[str, None] = {}
+        self._flush_scheduled = False
+
+    def load_many(self, ids: Iterable[str], access_token: str) -> Dict[str, Dict]:
+        """Devuelve { id: datos } para los ids pedidos (los que Spotify conozca)"""
+        wanted = [i for i in dict.fromkeys(ids) if i]
+        # Una sola consulta al cache (L1 + L2) para todos los ids
+        result: Dict[str, Dict] = self.cache.get_many(wanted) if wanted else {}
+        waiting: Dict[str, _PendingId] = {}
+        is_leader = False
+
+        with self._lock:
+            for item_id in wanted:
+                if item_id in result:
+                    continue
+
+                pending = self._pending.get(item_id)
+                if pending is None:
+                    pending = _PendingId()
+                    self._pending[item_id] = pending
+                    self._queued.append(item_id)
+                waiting[item_id] = pending
+
+            if waiting:
+                # Los datos de catálogo no dependen del usuario: vale cualquier token válido
+                self._queued_tokens.pop(access_token, None)
+                self._queued_tokens[access_token] = None
+
+            if self._queued and not self._flush_scheduled:
+                self._flush_scheduled = True
+                is_leader = True
+
+        if is_leader:
+            # Esperar un poco para juntar ids de otras peticiones concurrentes
+            if self.window_s > 0:
+                time.sleep(self.window_s)
+            self._flush()
+
+        for item_id, pending in waiting.items():
+            pending.event.wait(timeout=15)
+            if pending.value is not None:
+                result[item_id] = pending.value
+
+        return result
+
+    def load(self, item_id: str, access_token: str) -> Dict | None:
+        return self.load_many([item_id], access_token).get(item_id)
+
+    def _flush(self) -> None:
+        with self._lock:
+            ids = self._queued
+            # El más reciente primero: es el que menos probabilidades tiene de haber caducado
+            tokens = list(reversed(self._queued_tokens))
+            self._queued = []
+            self._queued_tokens = {}
+            self._flush_scheduled = False
+
+        for start in range(0, len(ids), self.max_batch):
+            chunk = ids[start:start + self.max_batch]
+            values = self._fetch_chunk(chunk, tokens)
+
+            found = {item_id: values[item_id] for item_id in chunk if values.get(item_id) is not None}
+            if found:
+                self.cache.set_many(found)
+
+            with self._lock:
+                for item_id in chunk:
+                    value = values.get(item_id)
+                    pending = self._pending.pop(item_id, None)
+                    if pending is not None:
+                        pending.value = value
+                        pending.event.set()
+
+    def _fetch_chunk(self, chunk: List[str], tokens: List[str]) -> Dict[str, Dict]:
+        """
+        Pide un lote probando los tokens de las peticiones en cola hasta que uno
+        funcione. Un token rechazado (401) se descarta para el resto de lotes.
+        """
+        for token in list(tokens):
+            try:
+                values = self.fetch_batch(chunk, token) or {}
+                self.log.debug("📦 %s ids en 1 llamada", len(chunk))
+                return values
+            except Exception as e:
+                self.log.warning("❌ Error en lote: %s", e)
+                if getattr(e, "status_code", None) == 401 and len(tokens) > 1:
+                    tokens.remove(token)
+        return {}
@@ -0,0 +1,273 @@
+# backend/services/history_rollups.py
+
+"""
+Índice de agregados por tiempo sobre el historial de escucha.
+Mantiene cubos por hora/día/semana (reproducciones, ms escuchados, sumas de
+audio features y conteos de artistas/géneros) y un mapa hora-de-la-semana.
+Se actualiza de forma incremental cuando se añaden reproducciones, así las
+consultas por rango leen cubos en vez de recorrer las filas crudas.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from itertools import islice
+from typing import Dict, Any, List, Iterable
+
+HOUR_MS = 3600 * 1000
+DAY_MS = 24 * HOUR_MS
+WEEK_MS = 7 * DAY_MS
+# 1970-01-01 fue jueves: desplazamos 4 días para que las semanas empiecen en lunes
+_WEEK_OFFSET_MS = 4 * DAY_MS
+
+GRANULARITIES = {"hour": HOUR_MS, "day": DAY_MS, "week": WEEK_MS}
+
+ROLLUP_FEATURES = ["energy", "valence", "danceability", "acousticness", "tempo"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    user_id         TEXT    NOT NULL,
+    granularity     TEXT    NOT NULL,
+    bucket_start_ms INTEGER NOT NULL,
+    play_count      INTEGER NOT NULL DEFAULT 0,
+    ms_played       INTEGER NOT NULL DEFAULT 0,
+    features_count  INTEGER NOT NULL DEFAULT 0,
+    energy_sum      REAL    NOT NULL DEFAULT 0,
+    valence_sum     REAL    NOT NULL DEFAULT 0,
+    danceability_sum REAL   NOT NULL DEFAULT 0,
+    acousticness_sum REAL   NOT NULL DEFAULT 0,
+    tempo_sum       REAL    NOT NULL DEFAULT 0,
+    energy_count    INTEGER NOT NULL DEFAULT 0,
+    valence_count   INTEGER NOT NULL DEFAULT 0,
+    danceability_count INTEGER NOT NULL DEFAULT 0,
+    acousticness_count INTEGER NOT NULL DEFAULT 0,
+    tempo_count     INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, granularity, bucket_start_ms)
+);
+CREATE TABLE IF NOT EXISTS rollup_counts (
+    user_id         TEXT    NOT NULL,
+    granularity     TEXT    NOT NULL,
+    bucket_start_ms INTEGER NOT NULL,
+    kind            TEXT    NOT NULL,
+    key             TEXT    NOT NULL,
+    count           INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, granularity, bucket_start_ms, kind, key)
+);
+CREATE TABLE IF NOT EXISTS hour_of_week (
+    user_id    TEXT    NOT NULL,
+    weekday    INTEGER NOT NULL,
+    hour       INTEGER NOT NULL,
+    play_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, weekday, hour)
+);
+CREATE TABLE IF NOT EXISTS rollup_state (
+    user_id          TEXT PRIMARY KEY,
+    rolled_up_to_ms  INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def bucket_start(played_at_ms: int, granularity: str) -> int:
+    size = GRANULARITIES[granularity]
+    if granularity == "week":
+        return ((played_at_ms - _WEEK_OFFSET_MS) // size) * size + _WEEK_OFFSET_MS
+    return (played_at_ms // size) * size
+
+
+class HistoryRollupIndex:
+    # Reproducciones por tanda al ponerse al día (features y géneros se piden por tanda)
+    UPDATE_BATCH = 1000
+
+    def __init__(self, store: Any):
+        # Comparte conexión y lock con ListeningHistoryStore
+        self.store = store
+        with store._lock:
+            store._conn.executescript(_SCHEMA)
+            self._add_feature_counts()
+            store._conn.commit()
+
+    def _add_feature_counts(self) -> None:
+        """
+        Migra bases anteriores a los conteos por feature: las columnas nuevas
+        arrancan con features_count, que es lo que se usaba antes como divisor.
+        """
+        conn = self.store._conn
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(rollups)")}
+        for name in ROLLUP_FEATURES:
+            column = f"{name}_count"
+            if column not in existing:
+                conn.execute(f"ALTER TABLE rollups ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+                conn.execute(f"UPDATE rollups SET {column} = features_count")
+
+    # ========================= Mantenimiento ==========================
+    def pending_rows(self, user_id: str) -> Iterable[Dict]:
+        """Reproducciones guardadas que aún no están en los agregados (en streaming)"""
+        return self.store.iter_play_rows(user_id, since_ms=self._rolled_up_to(user_id) + 1)
+
+    def update_user(self, service: Any, access_token: str, user_id: str) -> int:
+        """
+        Añade a los agregados las reproducciones nuevas (normalmente las del
+        último sync). Va por tandas de UPDATE_BATCH: tras una importación grande
+        no se carga todo el historial en memoria.
+        """
+        pending = iter(self.pending_rows(user_id))
+        added = 0
+        while True:
+            rows = list(islice(pending, self.UPDATE_BATCH))
+            if not rows:
+                return added
+            self._add_batch(service, access_token, user_id, rows)
+            added += len(rows)
+
+    def _add_batch(self, service: Any, access_token: str, user_id: str, rows: List[Dict]) -> None:
+        """Una tanda: features y géneros por lotes, luego add_plays"""
+        track_ids = [row["track_id"] for row in rows]
+        artist_ids = [a for row in rows for a in (row["artist_ids"] or "").split(",") if a]
+        features = service.get_audio_features_bulk(track_ids, access_token) if service else {}
+        artists = service.get_artists_bulk(artist_ids, access_token) if service else {}
+        genres = {artist_id: artist.get("genres", []) for artist_id, artist in artists.items()}
+
+        self.add_plays(user_id, rows, features, genres)
+
+    def add_plays(self, user_id: str, rows: Iterable[Dict], features: Dict[str, Dict],
+                  genres_by_artist: Dict[str, List[str]]) -> None:
+        """Suma las reproducciones a todos los cubos (en memoria y luego un solo commit)"""
+        bucket_totals: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        count_totals: Dict[tuple, int] = defaultdict(int)
+        heatmap: Dict[tuple, int] = defaultdict(int)
+        newest = 0
+
+        for row in rows:
+            played_at_ms = row["played_at_ms"]
+            newest = max(newest, played_at_ms)
+            track_features = features.get(row["track_id"]) or {}
+            artist_ids = [a for a in (row["artist_ids"] or "").split(",") if a]
+
+            for granularity in GRANULARITIES:
+                start = bucket_start(played_at_ms, granularity)
+                totals = bucket_totals[(granularity, start)]
+                totals["play_count"] += 1
+                totals["ms_played"] += row.get("duration_ms") or 0
+                if track_features:
+                    totals["features_count"] += 1
+                    # Cada feature con su propio conteo: la que falte no cuenta como 0
+                    for name in ROLLUP_FEATURES:
+                        value = track_features.get(name)
+                        if value is not None:
+                            totals[f"{name}_sum"] += value
+                            totals[f"{name}_count"] += 1
+
+                for artist_id in artist_ids:
+                    count_totals[(granularity, start, "artist", artist_id)] += 1
+                for genre in {g for a in artist_ids for g in genres_by_artist.get(a, [])}:
+                    count_totals[(granularity, start, "genre", genre)] += 1
+
+            days_since_epoch = played_at_ms // DAY_MS
+            weekday = (days_since_epoch + 3) % 7  # 0 = lunes
+            hour = (played_at_ms % DAY_MS) // HOUR_MS
+            heatmap[(weekday, hour)] += 1
+
+        if not newest:
+            return
+
+        columns = (["play_count", "ms_played", "features_count"]
+                   + [f"{n}_sum" for n in ROLLUP_FEATURES] + [f"{n}_count" for n in ROLLUP_FEATURES])
+        upsert_bucket = (
+            f"INSERT INTO rollups (user_id, granularity, bucket_start_ms, {', '.join(columns)}) "
+            f"VALUES (?, ?, ?, {', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT(user_id, granularity, bucket_start_ms) DO UPDATE SET "
+            + ", ".join(f"{c} = {c} + excluded.{c}" for c in columns)
+        )
+
+        conn = self.store._conn
+        with self.store._lock:
+            conn.executemany(upsert_bucket, [
+                (user_id, granularity, start, *[totals.get(c, 0) for c in columns])
+                for (granularity, start), totals in bucket_totals.items()
+            ])
+            conn.executemany(
+                "INSERT INTO rollup_counts (user_id, granularity, bucket_start_ms, kind, key, count) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(user_id, granularity, bucket_start_ms, kind, key) "
+                "DO UPDATE SET count = count + excluded.count",
+                [(user_id, *key, count) for key, count in count_totals.items()],
+            )
+            conn.executemany(
+                "INSERT INTO hour_of_week (user_id, weekday, hour, play_count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(user_id, weekday, hour) DO UPDATE SET play_count = play_count + excluded.play_count",
+                [(user_id, weekday, hour, count) for (weekday, hour), count in heatmap.items()],
+            )
+            conn.execute(
+                "INSERT INTO rollup_state (user_id, rolled_up_to_ms) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET rolled_up_to_ms = MAX(rolled_up_to_ms, excluded.rolled_up_to_ms)",
+                (user_id, newest),
+            )
+            conn.commit()
+
+    def _rolled_up_to(self, user_id: str) -> int:
+        with self.store._lock:
+            row = self.store._conn.execute(
+                "SELECT rolled_up_to_ms FROM rollup_state WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    # ========================= Consultas ==========================
+    def get_buckets(self, user_id: str, granularity: str = "day", since_ms: int | None = None,
+                    until_ms: int | None = None) -> List[Dict[str, Any]]:
+        """Serie temporal de cubos: reproducciones, minutos y medias de features"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity debe ser una de {list(GRANULARITIES)}")
+
+        where, params = self._bucket_range(user_id, granularity, since_ms, until_ms)
+        with self.store._lock:
+            rows = self.store._conn.execute(
+                f"SELECT * FROM rollups WHERE {where} ORDER BY bucket_start_ms ASC", params
+            ).fetchall()
+
+        buckets = []
+        for row in rows:
+            buckets.append({
+                "bucket_start_ms": row["bucket_start_ms"],
+                "play_count": row["play_count"],
+                "minutes_played": round(row["ms_played"] / 60000, 1),
+                "avg_features": {
+                    name: (round(row[f"{name}_sum"] / row[f"{name}_count"], 4) if row[f"{name}_count"] else None)
+                    for name in ROLLUP_FEATURES
+                },
+            })
+        return buckets
+
+    def get_top_counts(self, user_id: str, kind: str = "artist", granularity: str = "week",
+                       since_ms: int | None = None, until_ms: int | None = None,
+                       limit: int = 10) -> List[Dict[str, Any]]:
+        """Artistas o géneros más escuchados en el rango (sumando cubos)"""
+        where, params = self._bucket_range(user_id, granularity, since_ms, until_ms)
+        with self.store._lock:
+            rows = self.store._conn.execute(
+                f"SELECT key, SUM(count) AS total FROM rollup_counts WHERE {where} AND kind = ? "
+                f"GROUP BY key ORDER BY total DESC LIMIT ?",
+                params + [kind, int(limit)],
+            ).fetchall()
+        return [{"key": row["key"], "count": row["total"]} for row in rows]
+
+    def get_heatmap(self, user_id: str, tz_offset_hours: int = 0) -> List[List[int]]:
+        """Matriz 7x24 (lunes..domingo x horas) desplazada a la zona horaria pedida"""
+        cells = [0] * (7 * 24)
+        with self.store._lock:
+            rows = self.store._conn.execute(
+                "SELECT weekday, hour, play_count FROM hour_of_week WHERE user_id = ?", (user_id,)
+            ).fetchall()
+        for row in rows:
+            index = (row["weekday"] * 24 + row["hour"] + int(tz_offset_hours)) % (7 * 24)
+            cells[index] += row["play_count"]
+        return [cells[day * 24:(day + 1) * 24] for day in range(7)]
+
+    @staticmethod
+    def _bucket_range(user_id: str, granularity: str, since_ms: int | None, until_ms: int | None):
+        clauses, params = ["user_id = ?", "granularity = ?"], [user_id, granularity]
+        if since_ms is not None:
+            clauses.append("bucket_start_ms >= ?")
+            params.append(bucket_start(int(since_ms), granularity))
+        if until_ms is not None:
+            clauses.append("bucket_start_ms < ?")
+            params.append(int(until_ms))
+        return " AND ".join(clauses), params
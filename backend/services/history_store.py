@@ -0,0 +1,285 @@
+# backend/services/history_store.py
+
+"""
+Historial de escucha local por usuario (SQLite, solo-anexar).
+Se sincroniza de forma incremental con el cursor `after` de
+/me/player/recently-played, así cada sync solo descarga reproducciones
+nuevas y las vistas de historial consultan datos locales.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Iterator
+
+from services.history_rollups import HistoryRollupIndex
+from utils.log import get_logger
+
+log = get_logger("HistoryStore")
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "listening_history.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plays (
+    user_id      TEXT    NOT NULL,
+    played_at_ms INTEGER NOT NULL,
+    track_id     TEXT,
+    track_name   TEXT,
+    artist_ids   TEXT,
+    artist_names TEXT,
+    album_id     TEXT,
+    duration_ms  INTEGER,
+    context_uri  TEXT,
+    track_json   TEXT,
+    PRIMARY KEY (user_id, played_at_ms)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    user_id           TEXT PRIMARY KEY,
+    last_played_at_ms INTEGER NOT NULL DEFAULT 0,
+    last_sync_ts      REAL    NOT NULL DEFAULT 0
+);
+"""
+
+# Campos del track que no hace falta guardar (pesan mucho y no se usan)
+_TRACK_DROP_KEYS = ("available_markets",)
+
+
+def parse_played_at(played_at: str) -> int:
+    """'2024-01-01T12:00:00.123Z' -> milisegundos desde epoch"""
+    return int(datetime.fromisoformat(played_at.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+def format_played_at(played_at_ms: int) -> str:
+    return datetime.fromtimestamp(played_at_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class ListeningHistoryStore:
+    # Páginas máximas por sync (50 reproducciones por página)
+    MAX_SYNC_PAGES = 20
+    # Reproducciones por lectura de get_plays (para más, /api/history/stream)
+    MAX_PLAYS_LIMIT = 1000
+    # Antigüedad máxima del último sync antes de que una lectura dispare otro
+    SYNC_INTERVAL_S = float(os.getenv("HISTORY_SYNC_INTERVAL", "60"))
+
+    def __init__(self, db_path: str | None = None):
+        self.db_path = db_path or os.getenv("HISTORY_DB_PATH", DEFAULT_DB_PATH)
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._user_locks: Dict[str, threading.Lock] = {}
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            if self.db_path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+
+        # Agregados por hora/día/semana, mantenidos en cada sync
+        self.rollups = HistoryRollupIndex(self)
+
+    # ========================= Escritura ==========================
+    def append_plays(self, user_id: str, items: List[Dict]) -> List[Dict]:
+        """
+        Añade reproducciones (items de recently-played). Ignora las que ya existen.
+        Devuelve las filas realmente insertadas.
+        """
+        rows = []
+        for play in items:
+            track = dict(play.get("track") or {})
+            if not play.get("played_at") or not track:
+                continue
+            for key in _TRACK_DROP_KEYS:
+                track.pop(key, None)
+            if track.get("album"):
+                track["album"] = {k: v for k, v in track["album"].items() if k not in _TRACK_DROP_KEYS}
+
+            artists = track.get("artists", [])
+            rows.append({
+                "user_id": user_id,
+                "played_at_ms": parse_played_at(play["played_at"]),
+                "track_id": track.get("id"),
+                "track_name": track.get("name"),
+                "artist_ids": ",".join(a.get("id") or "" for a in artists),
+                "artist_names": ", ".join(a.get("name") or "" for a in artists),
+                "album_id": (track.get("album") or {}).get("id"),
+                "duration_ms": track.get("duration_ms", 0),
+                "context_uri": (play.get("context") or {}).get("uri"),
+                "track_json": json.dumps(track, separators=(",", ":")),
+            })
+
+        inserted = []
+        with self._lock:
+            for row in rows:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO plays (user_id, played_at_ms, track_id, track_name, artist_ids, "
+                    "artist_names, album_id, duration_ms, context_uri, track_json) "
+                    "VALUES (:user_id, :played_at_ms, :track_id, :track_name, :artist_ids, "
+                    ":artist_names, :album_id, :duration_ms, :context_uri, :track_json)",
+                    row,
+                )
+                if cursor.rowcount:
+                    inserted.append(row)
+
+            if rows:
+                newest = max(row["played_at_ms"] for row in rows)
+                self._conn.execute(
+                    "INSERT INTO sync_state (user_id, last_played_at_ms, last_sync_ts) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET "
+                    "last_played_at_ms = MAX(last_played_at_ms, excluded.last_played_at_ms)",
+                    (user_id, newest, 0),
+                )
+            self._conn.commit()
+
+        return inserted
+
+    def _mark_synced(self, user_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sync_state (user_id, last_sync_ts) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET last_sync_ts = excluded.last_sync_ts",
+                (user_id, time.time()),
+            )
+            self._conn.commit()
+
+    # ========================= Sincronización ==========================
+    def sync_user(self, service: Any, access_token: str, user_id: str) -> Dict[str, Any]:
+        """
+        Descarga solo las reproducciones posteriores al último cursor guardado.
+        La primera vez trae las últimas 50 (lo máximo que guarda Spotify).
+        Si una página falla (401, 429, 5xx...) la excepción sube y el sync no
+        se marca como hecho: lo ya insertado se queda y el siguiente lo reintenta.
+        """
+        with self._lock:
+            user_lock = self._user_locks.setdefault(user_id, threading.Lock())
+
+        with user_lock:
+            started = time.perf_counter()
+            cursor_ms = self.get_sync_state(user_id)["last_played_at_ms"]
+            new_plays: List[Dict] = []
+            pages = 0
+
+            while pages < self.MAX_SYNC_PAGES:
+                page = service.get_recent_tracks_after(access_token, cursor_ms or None, limit=50)
+                pages += 1
+                if not page or not page.get("items"):
+                    break
+
+                new_plays.extend(self.append_plays(user_id, page["items"]))
+
+                next_cursor = (page.get("cursors") or {}).get("after")
+                next_cursor = int(next_cursor) if next_cursor else self.get_sync_state(user_id)["last_played_at_ms"]
+                if len(page["items"]) < 50 or not next_cursor or next_cursor <= cursor_ms:
+                    break
+                cursor_ms = next_cursor
+
+            # Llevar los agregados al día (solo las filas nuevas)
+            try:
+                self.rollups.update_user(service, access_token, user_id)
+            except Exception as e:
+                log.error("❌ Error actualizando agregados: %s", e)
+
+            self._mark_synced(user_id)
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            log.info("🔄 Sync %s: %s nuevas en %s página(s), %sms", user_id, len(new_plays), pages, elapsed_ms)
+
+            return {"new_plays": len(new_plays), "pages": pages, "sync_ms": elapsed_ms, "inserted": new_plays}
+
+    def sync_if_stale(self, service: Any, access_token: str, user_id: str) -> Dict[str, Any] | None:
+        """Sincroniza solo si el último sync es más viejo que SYNC_INTERVAL_S"""
+        last_sync = self.get_sync_state(user_id)["last_sync_ts"]
+        if time.time() - last_sync < self.SYNC_INTERVAL_S:
+            return None
+        return self.sync_user(service, access_token, user_id)
+
+    # ========================= Lectura ==========================
+    def get_sync_state(self, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_played_at_ms, last_sync_ts FROM sync_state WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return {"last_played_at_ms": 0, "last_sync_ts": 0.0}
+        return {"last_played_at_ms": row["last_played_at_ms"], "last_sync_ts": row["last_sync_ts"]}
+
+    def count_plays(self, user_id: str, since_ms: int | None = None, until_ms: int | None = None) -> int:
+        where, params = self._range_clause(user_id, since_ms, until_ms)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM plays WHERE {where}", params).fetchone()[0]
+
+    def get_plays(self, user_id: str, limit: int = 50, since_ms: int | None = None,
+                  until_ms: int | None = None) -> List[Dict]:
+        """Reproducciones más recientes primero, con el formato de recently-played"""
+        # LIMIT negativo en SQLite es "sin límite": acotar siempre
+        limit = max(1, min(self.MAX_PLAYS_LIMIT, int(limit)))
+        where, params = self._range_clause(user_id, since_ms, until_ms)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT played_at_ms, context_uri, track_json FROM plays WHERE {where} "
+                f"ORDER BY played_at_ms DESC LIMIT ?",
+                params + [limit],
+            ).fetchall()
+
+        return [
+            {
+                "played_at": format_played_at(row["played_at_ms"]),
+                "played_at_ms": row["played_at_ms"],
+                "context": {"uri": row["context_uri"]} if row["context_uri"] else None,
+                "track": json.loads(row["track_json"]),
+            }
+            for row in rows
+        ]
+
+    def iter_plays(self, user_id: str, since_ms: int | None = None, until_ms: int | None = None,
+                   batch_size: int = 200) -> Iterator[Dict]:
+        """
+        Como get_plays pero en streaming (más recientes primero), leyendo por
+        tandas con keyset pagination para no cargar todo el historial en memoria.
+        """
+        until = until_ms
+        while True:
+            batch = self.get_plays(user_id, batch_size, since_ms, until)
+            if not batch:
+                return
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            until = batch[-1]["played_at_ms"]
+
+    def iter_play_rows(self, user_id: str, since_ms: int | None = None, until_ms: int | None = None,
+                       batch_size: int = 1000) -> Iterator[Dict]:
+        """
+        Filas ligeras (sin JSON del track), de la más antigua a la más reciente,
+        leídas por tandas (keyset pagination) como iter_plays.
+        """
+        since = since_ms
+        while True:
+            where, params = self._range_clause(user_id, since, until_ms)
+            with self._lock:
+                batch = self._conn.execute(
+                    f"SELECT played_at_ms, track_id, artist_ids, duration_ms FROM plays WHERE {where} "
+                    f"ORDER BY played_at_ms ASC LIMIT ?",
+                    params + [batch_size],
+                ).fetchall()
+            for row in batch:
+                yield dict(row)
+            if len(batch) < batch_size:
+                return
+            since = batch[-1]["played_at_ms"] + 1
+
+    @staticmethod
+    def _range_clause(user_id: str, since_ms: int | None, until_ms: int | None):
+        clauses, params = ["user_id = ?"], [user_id]
+        if since_ms is not None:
+            clauses.append("played_at_ms >= ?")
+            params.append(int(since_ms))
+        if until_ms is not None:
+            clauses.append("played_at_ms < ?")
+            params.append(int(until_ms))
+        return " AND ".join(clauses), params
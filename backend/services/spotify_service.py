@@ -5,9 +5,11 @@ Servicio mejorado que integra extracción avanzada de colores
 """
 
 from __future__ import annotations
+import os
+import time
+import hashlib
 import math
-from typing import Dict, Any, List
-import numpy as np  # Asegurar importación numpy
+from typing import Dict, Any, List, Iterator
 
 import requests
 
@@ -20,13 +22,62 @@ from auth.spotify_oauth import (
 
 # Importar el nuevo extractor de colores
 from utils.album_color_extractor import get_album_colors_from_url
+from utils.lazy_import import lazy_import, is_loaded
+from utils.shared_cache import create_cache
+from utils.track_models import AudioFeatures, AudioAnalysis
+from utils.playback_clock import server_now_ms, build_position_sample
+from utils.metrics import UPSTREAM_LATENCY, UPSTREAM_RESPONSES, STAGE_LATENCY, endpoint_label
+from services.track_prefetcher import TrackPrefetcher
+from utils.log import get_logger
+from utils.tracing import span, KIND_CLIENT
+from utils.quality_tiers import quality_governor, TIER_SERVED, NO_ARTIST, FAST_PALETTE, FEATURES_ONLY
+from services.batch_loader import BatchLoader
+
+np = lazy_import("numpy")
+
+log = get_logger("SpotifyService")
+
+
+class UpstreamError(Exception):
+    """Spotify respondió con error a mitad de una operación (401, 429, 5xx...)"""
+
+    def __init__(self, path: str, status_code: int, retry_after: str | None = None):
+        super().__init__(f"Spotify {path}: HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
 
 
 class EnhancedSpotifyService:
-    BASE_URL = "https://api.spotify.com/v1"
+    # SPOTIFY_API_URL permite apuntar al emulador local (tools/spotify_emulator.py)
+    BASE_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1").rstrip("/")
+
+    # Límites de los endpoints por lotes de Spotify
+    FEATURES_BATCH_SIZE = 100
+    ARTISTS_BATCH_SIZE = 50
+    ALBUMS_BATCH_SIZE = 20
 
     def __init__(self):
-        print("[SpotifyService] ✅ Servicio mejorado inicializado")
+        # Caches por track / artista (los datos de Spotify no cambian por canción).
+        # Compartidos entre workers si CACHE_BACKEND_URL apunta a SQLite / Redis.
+        self.features_cache = create_cache("features", ttl_s=7 * 86400, l1_max_entries=4096)
+        self.analysis_cache = create_cache("analysis", ttl_s=7 * 86400, l1_max_entries=64)
+        self.artist_cache = create_cache("artist", ttl_s=86400, l1_max_entries=2048)
+        self.album_cache = create_cache("album", ttl_s=7 * 86400, l1_max_entries=1024)
+        # { sha256(token): user_id } para no pedir /me en cada petición
+        self.token_users = create_cache("token_user", ttl_s=3600, l1_max_entries=1024)
+
+        # Cargadores por lotes que llenan los caches anteriores
+        self.features_loader = BatchLoader("audio-features", self._fetch_features_batch,
+                                           self.features_cache, self.FEATURES_BATCH_SIZE)
+        self.artists_loader = BatchLoader("artists", self._fetch_artists_batch,
+                                          self.artist_cache, self.ARTISTS_BATCH_SIZE)
+        self.albums_loader = BatchLoader("albums", self._fetch_albums_batch,
+                                         self.album_cache, self.ALBUMS_BATCH_SIZE)
+
+        # Precarga de la siguiente canción de la cola
+        self.prefetcher = TrackPrefetcher(self)
+
+        log.info("✅ Servicio mejorado inicializado")
 
     @staticmethod
     def get_auth_url(show_dialog: bool = True, state: str | None = None) -> str:
@@ -48,11 +99,33 @@ class EnhancedSpotifyService:
     def _get(self, path: str, access_token: str, params: dict | None = None) -> requests.Response:
         headers = self._auth_header(access_token)
         url = f"{self.BASE_URL}{path}"
-        return requests.get(url, headers=headers, params=params, timeout=8)
+        endpoint = endpoint_label(path)
+        status = "error"
+        response = None
+        start = time.perf_counter()
+        try:
+            with span(f"spotify GET {endpoint}", KIND_CLIENT, **{"http.method": "GET", "url.path": endpoint}) as s:
+                response = requests.get(url, headers=headers, params=params, timeout=8)
+                status = str(response.status_code)
+                if s is not None:
+                    s.set_attribute("http.status_code", response.status_code)
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            UPSTREAM_LATENCY.observe(elapsed, endpoint=endpoint)
+            UPSTREAM_RESPONSES.inc(endpoint=endpoint, status=status)
+            # Señal de carga para elegir el nivel de calidad
+            quality_governor.record_upstream(
+                response.status_code if response is not None else None, elapsed,
+                response.headers.get("Retry-After") if response is not None else None,
+            )
 
     # ========================= Conversión de tipos numpy ==========================
     def _convert_numpy_types(self, obj: Any) -> Any:
         """Convierte tipos numpy a tipos nativos de Python para JSON serializable"""
+        if not is_loaded("numpy"):
+            # Si NumPy no se ha importado no puede haber tipos numpy
+            return obj
         if isinstance(obj, (np.integer, np.int32, np.int64)):
             return int(obj)
         elif isinstance(obj, (np.floating, np.float32, np.float64)):
@@ -76,22 +149,38 @@ class EnhancedSpotifyService:
             response = self._get("/me", access_token)
             if response.status_code == 200:
                 return response.json()
-            print(f"[SpotifyService] Error get_user_profile: {response.status_code}")
+            log.warning("Error get_user_profile: %s", response.status_code)
             return None
         except Exception as e:
-            print(f"[SpotifyService] Excepción get_user_profile: {e}")
+            log.warning("Excepción get_user_profile: %s", e)
             return None
 
-    def get_top_tracks(self, access_token: str, time_range: str = "short_term", limit: int = 10) -> dict | None:
+    def get_user_id(self, access_token: str) -> str | None:
+        """Id de Spotify del dueño del token (cacheado por token)"""
+        token_key = hashlib.sha256(access_token.encode()).hexdigest()
+        user_id = self.token_users.get(token_key)
+        if user_id is None:
+            profile = self.get_user_profile(access_token)
+            if not profile or not profile.get("id"):
+                return None
+            user_id = profile["id"]
+            self.token_users[token_key] = user_id
+        return user_id
+
+    def get_top_tracks(self, access_token: str, time_range: str = "short_term", limit: int = 10,
+                       include_features: bool = False) -> dict | None:
         try:
             response = self._get("/me/top/tracks", access_token,
                                  params={"time_range": time_range, "limit": limit})
             if response.status_code == 200:
-                return response.json()
-            print(f"[SpotifyService] Error get_top_tracks: {response.status_code}")
+                data = response.json()
+                if include_features:
+                    self._attach_audio_features(data.get("items", []), access_token)
+                return data
+            log.warning("Error get_top_tracks: %s", response.status_code)
             return None
         except Exception as e:
-            print(f"[SpotifyService] Excepción get_top_tracks: {e}")
+            log.warning("Excepción get_top_tracks: %s", e)
             return None
 
     def get_top_artists(self, access_token: str, time_range: str = "short_term", limit: int = 10) -> dict | None:
@@ -100,26 +189,209 @@ class EnhancedSpotifyService:
                                  params={"time_range": time_range, "limit": limit})
             if response.status_code == 200:
                 return response.json()
-            print(f"[SpotifyService] Error get_top_artists: {response.status_code}")
+            log.warning("Error get_top_artists: %s", response.status_code)
             return None
         except Exception as e:
-            print(f"[SpotifyService] Excepción get_top_artists: {e}")
+            log.warning("Excepción get_top_artists: %s", e)
             return None
 
-    def get_recent_tracks(self, access_token: str, limit: int = 20) -> dict | None:
+    def get_recent_tracks(self, access_token: str, limit: int = 20,
+                          include_features: bool = False) -> dict | None:
         try:
             response = self._get("/me/player/recently-played", access_token,
                                  params={"limit": limit})
+            if response.status_code == 200:
+                data = response.json()
+                if include_features:
+                    tracks = [play.get("track") or {} for play in data.get("items", [])]
+                    self._attach_audio_features(tracks, access_token)
+                return data
+            log.warning("Error get_recent_tracks: %s", response.status_code)
+            return None
+        except Exception as e:
+            log.warning("Excepción get_recent_tracks: %s", e)
+            return None
+
+    def get_recent_tracks_after(self, access_token: str, after_ms: int | None, limit: int = 50) -> dict:
+        """
+        Reproducciones posteriores a `after_ms` (cursor `after` de recently-played;
+        sin cursor, las más recientes). Lanza UpstreamError si Spotify responde
+        con error: el sync del historial no debe tomarlo por "nada nuevo".
+        """
+        params = {"limit": limit}
+        if after_ms:
+            params["after"] = int(after_ms)
+        response = self._get("/me/player/recently-played", access_token, params=params)
+        if response.status_code != 200:
+            log.warning("Error get_recent_tracks_after: %s", response.status_code)
+            raise UpstreamError("/me/player/recently-played", response.status_code,
+                                response.headers.get("Retry-After"))
+        return response.json()
+
+    # ========================= Paginación en streaming ==========================
+    def _iter_pages(self, path: str, access_token: str, total: int, page_size: int = 10,
+                    params: dict | None = None, cursor_paging: bool = False) -> Iterator[List[Dict]]:
+        """
+        Recorre un endpoint paginado y va devolviendo los items página a página.
+        - offset/limit para /me/top/*
+        - cursor `before` para /me/player/recently-played
+        Una página con error lanza UpstreamError (no se corta en silencio).
+        """
+        page_size = max(1, min(50, page_size))
+        params = dict(params or {})
+        fetched = 0
+        offset = 0
+        before = None
+
+        while fetched < total:
+            page_params = dict(params, limit=min(page_size, total - fetched))
+            if cursor_paging:
+                if before:
+                    page_params["before"] = before
+            else:
+                page_params["offset"] = offset
+
+            response = self._get(path, access_token, params=page_params)
+            if response.status_code != 200:
+                log.warning("Error paginando %s: %s", path, response.status_code)
+                raise UpstreamError(path, response.status_code, response.headers.get("Retry-After"))
+
+            data = response.json()
+            items = data.get("items", [])
+            if not items:
+                return
+
+            fetched += len(items)
+            offset += len(items)
+            yield items
+
+            if cursor_paging:
+                before = (data.get("cursors") or {}).get("before")
+                if not before:
+                    return
+            elif not data.get("next"):
+                return
+
+    def iter_top_tracks(self, access_token: str, time_range: str = "short_term", limit: int = 50,
+                        include_features: bool = False, page_size: int = 10) -> Iterator[Dict]:
+        """Top tracks uno a uno, enriqueciendo cada página en cuanto llega"""
+        for items in self._iter_pages("/me/top/tracks", access_token, limit, page_size,
+                                      params={"time_range": time_range}):
+            if include_features:
+                self._attach_audio_features(items, access_token)
+            yield from items
+
+    def iter_top_artists(self, access_token: str, time_range: str = "short_term", limit: int = 50,
+                         page_size: int = 10) -> Iterator[Dict]:
+        for items in self._iter_pages("/me/top/artists", access_token, limit, page_size,
+                                      params={"time_range": time_range}):
+            yield from items
+
+    def iter_recent_tracks(self, access_token: str, limit: int = 50, include_features: bool = False,
+                           page_size: int = 10) -> Iterator[Dict]:
+        for items in self._iter_pages("/me/player/recently-played", access_token, limit, page_size,
+                                      cursor_paging=True):
+            if include_features:
+                self._attach_audio_features([play.get("track") or {} for play in items], access_token)
+            yield from items
+
+    def get_playback_queue(self, access_token: str) -> dict | None:
+        try:
+            response = self._get("/me/player/queue", access_token)
             if response.status_code == 200:
                 return response.json()
-            print(f"[SpotifyService] Error get_recent_tracks: {response.status_code}")
+            log.warning("Error get_playback_queue: %s", response.status_code)
             return None
         except Exception as e:
-            print(f"[SpotifyService] Excepción get_recent_tracks: {e}")
+            log.warning("Excepción get_playback_queue: %s", e)
             return None
 
+    # ========================= Llamadas por lotes ==========================
+    def _fetch_features_batch(self, track_ids: List[str], access_token: str) -> Dict[str, AudioFeatures]:
+        """Una llamada a /audio-features?ids= (hasta 100 ids)"""
+        response = self._get("/audio-features", access_token, params={"ids": ",".join(track_ids)})
+        if response.status_code != 200:
+            log.warning("Error audio-features por lotes: %s", response.status_code)
+            raise UpstreamError("/audio-features", response.status_code, response.headers.get("Retry-After"))
+        return {f["id"]: AudioFeatures(f) for f in response.json().get("audio_features", []) if f}
+
+    def _fetch_artists_batch(self, artist_ids: List[str], access_token: str) -> Dict[str, Dict]:
+        """Una llamada a /artists?ids= (hasta 50 ids)"""
+        response = self._get("/artists", access_token, params={"ids": ",".join(artist_ids)})
+        if response.status_code != 200:
+            log.warning("Error artists por lotes: %s", response.status_code)
+            raise UpstreamError("/artists", response.status_code, response.headers.get("Retry-After"))
+        return {a["id"]: a for a in response.json().get("artists", []) if a}
+
+    def _fetch_albums_batch(self, album_ids: List[str], access_token: str) -> Dict[str, Dict]:
+        """Una llamada a /albums?ids= (hasta 20 ids)"""
+        response = self._get("/albums", access_token, params={"ids": ",".join(album_ids)})
+        if response.status_code != 200:
+            log.warning("Error albums por lotes: %s", response.status_code)
+            raise UpstreamError("/albums", response.status_code, response.headers.get("Retry-After"))
+        return {a["id"]: a for a in response.json().get("albums", []) if a}
+
+    def get_audio_features_bulk(self, track_ids: List[str], access_token: str) -> Dict[str, AudioFeatures]:
+        """
+        Audio features de muchos tracks con el mínimo de llamadas: { track_id: features }
+        (AudioFeatures se lee como un dict: .get(), [] y `in`)
+        """
+        return self.features_loader.load_many(track_ids, access_token)
+
+    def get_artists_bulk(self, artist_ids: List[str], access_token: str) -> Dict[str, Dict]:
+        """Artistas completos con el mínimo de llamadas: { artist_id: artista }"""
+        return self.artists_loader.load_many(artist_ids, access_token)
+
+    def get_albums_bulk(self, album_ids: List[str], access_token: str) -> Dict[str, Dict]:
+        """Álbumes completos (con sus portadas) con el mínimo de llamadas: { album_id: álbum }"""
+        return self.albums_loader.load_many(album_ids, access_token)
+
+    def _attach_audio_features(self, tracks: List[Dict], access_token: str) -> None:
+        """Añade `audio_features` a cada track usando llamadas por lotes"""
+        features = self.get_audio_features_bulk([t.get("id") for t in tracks], access_token)
+        for track in tracks:
+            track["audio_features"] = AudioFeatures.coerce(features.get(track.get("id"))).to_json()
+
+    # ========================= Datos por track (con cache) ==========================
+    def _get_audio_features(self, track_id: str, access_token: str) -> AudioFeatures:
+        """Audio features de un track (agrupado con otras peticiones concurrentes)"""
+        return AudioFeatures.coerce(self.features_loader.load(track_id, access_token))
+
+    def _cached_audio_analysis(self, track_id: str) -> AudioAnalysis | None:
+        cached = self.analysis_cache.get(track_id)
+        return None if cached is None else AudioAnalysis.coerce(cached)
+
+    def _get_audio_analysis(self, track_id: str, access_token: str) -> AudioAnalysis:
+        """Audio analysis de un track, usando el cache si ya se pidió"""
+        cached = self._cached_audio_analysis(track_id)
+        if cached is not None:
+            return cached
+
+        response = self._get(f"/audio-analysis/{track_id}", access_token)
+        if response.status_code != 200:
+            return AudioAnalysis.EMPTY
+
+        # En cache va la versión compacta (matrices por bloque, no miles de dicts)
+        analysis = AudioAnalysis.from_json(response.json())
+        self.analysis_cache[track_id] = analysis
+        return analysis
+
+    def warm_track(self, item: Dict, access_token: str) -> None:
+        """
+        Calienta los caches de un track (features, análisis, artista y paleta)
+        para que la primera respuesta mejorada no pague las llamadas en frío.
+        """
+        track_id = item.get("id")
+        if not track_id:
+            return
+
+        self._get_audio_features(track_id, access_token)
+        self._get_audio_analysis(track_id, access_token)
+        self._get_artist_info(item.get("artists", []), access_token)
+        self._extract_album_colors(item)
+
     # ================== VERSIÓN MEJORADA PARA VISUALIZADOR ==================
-    def get_current_track_enhanced(self, access_token: str) -> Dict[str, Any] | None:
+    def get_current_track_enhanced(self, access_token: str, quality: int | None = None) -> Dict[str, Any] | None:
         """
         Devuelve la canción actual con:
         - Datos de track completos
@@ -127,91 +399,122 @@ class EnhancedSpotifyService:
         - Análisis de audio
         - COLORES EXTRAÍDOS DEL ÁLBUM
         - Datos para visualización mejorada
+
+        Con carga alta recorta trabajo según el nivel de calidad (ver
+        utils/quality_tiers.py); `quality` es el nivel que pide el cliente.
+        El nivel servido va en result["quality"].
         """
         try:
-            print(f"[SpotifyService] 🎵 Obteniendo canción mejorada...")
+            log.debug("🎵 Obteniendo canción mejorada...")
 
-            # 1. Canción actual
+            # 1. Canción actual (medimos la petición para fechar la posición)
+            requested_at_ms = server_now_ms()
             current_resp = self._get("/me/player/currently-playing", access_token)
+            received_at_ms = server_now_ms()
 
             if current_resp.status_code == 204:
-                print("[SpotifyService] ⏸️ No hay reproducción activa")
+                log.debug("⏸️ No hay reproducción activa")
                 idle_data = self._get_idle_visualizer_data()
                 return {
                     "is_playing": False,
                     "message": "No content",
+                    "server_time_ms": received_at_ms,
                     "visualizer": self._convert_numpy_types(idle_data)
                 }
 
             if current_resp.status_code != 200:
-                print(f"[SpotifyService] ❌ Error: {current_resp.status_code}")
+                log.warning("❌ Error: %s", current_resp.status_code)
                 return None
 
             raw_data = current_resp.json()
+            position_sample = build_position_sample(raw_data, requested_at_ms, received_at_ms)
             item = raw_data.get("item")
             if not item:
-                print("[SpotifyService] ❌ No hay item en la respuesta")
+                log.warning("❌ No hay item en la respuesta")
                 return {"is_playing": False, "message": "No track item"}
 
             track_id = item.get("id")
             if not track_id:
-                print("[SpotifyService] ❌ No hay track ID")
+                log.warning("❌ No hay track ID")
                 return {"is_playing": False, "message": "No track id"}
 
-            print(f"[SpotifyService] ✅ Track: {item.get('name')}")
+            log.debug("✅ Track: %s", item.get('name'))
+
+            # Nivel de calidad según la carga (y lo que pida el cliente)
+            quality_info = quality_governor.choose(quality)
+            tier = quality_info["tier"]
 
             # 2. Audio features
-            features_resp = self._get(f"/audio-features/{track_id}", access_token)
-            audio_features = features_resp.json() if features_resp.status_code == 200 else {}
+            audio_features = self._get_audio_features(track_id, access_token)
 
-            # 3. Audio analysis (para beats, secciones, etc.)
-            analysis_resp = self._get(f"/audio-analysis/{track_id}", access_token)
-            audio_analysis = analysis_resp.json() if analysis_resp.status_code == 200 else {}
+            # 3. Audio analysis (para beats, secciones, etc.); en features_only
+            #    solo si ya está en cache
+            if tier >= FEATURES_ONLY:
+                audio_analysis = self._cached_audio_analysis(track_id) or AudioAnalysis.EMPTY
+            else:
+                audio_analysis = self._get_audio_analysis(track_id, access_token)
 
             # 4. ✨ EXTRAER COLORES DEL ÁLBUM (MEJORA PRINCIPAL)
-            album_colors = self._extract_album_colors(item)
+            with span("album_colors", tier=quality_info["name"]):
+                album_colors = self._extract_album_colors(
+                    item, fast=tier >= FAST_PALETTE, cached_only=tier >= FEATURES_ONLY
+                )
 
             # 5. Información de artistas (géneros, popularidad)
-            artist_data = self._get_artist_info(item.get("artists", []), access_token)
+            artist_data = self._get_artist_info(item.get("artists", []), access_token, fetch=tier < NO_ARTIST)
 
             # 6. Generar datos de visualización MEJORADOS
-            visualizer_data = self._generate_enhanced_visualizer_data(
-                item, audio_features, audio_analysis, album_colors
-            )
+            #    (los cálculos leen atributos de las features con sus valores por defecto)
+            features = audio_features.filled()
+            with STAGE_LATENCY.time(stage="derived_model"), span("derived_model"):
+                visualizer_data = self._generate_enhanced_visualizer_data(
+                    item, features, audio_analysis, album_colors
+                )
 
-            # 7. Datos de movimiento inteligente
-            movement_data = self._calculate_intelligent_movement(audio_features, audio_analysis)
+                # 7. Datos de movimiento inteligente
+                movement_data = self._calculate_intelligent_movement(features, audio_analysis)
 
             result = {
                 "is_playing": raw_data.get("is_playing", False),
                 "progress_ms": raw_data.get("progress_ms", 0),
+                "position_sample": position_sample,  # ✨ NUEVO: posición con timestamp del servidor
+                "server_time_ms": server_now_ms(),
                 "item": item,
-                "audio_features": audio_features,
-                "audio_analysis": audio_analysis,
+                "audio_features": audio_features.to_json(),
+                "audio_analysis": None,  # se añade al final (ya sale con tipos nativos)
                 "album_colors": album_colors,  # ✨ NUEVO: Colores del álbum
                 "artist_info": artist_data,
                 "visualizer": visualizer_data,
                 "movement_rules": movement_data,  # ✨ NUEVO: Reglas de movimiento
-                "track_mood": self._calculate_track_mood(audio_features, album_colors),
-                "complexity_score": self._calculate_complexity_score(audio_features, audio_analysis)
+                "track_mood": self._calculate_track_mood(features, album_colors),
+                "complexity_score": self._calculate_complexity_score(features, audio_analysis),
+                "quality": quality_info,
             }
+            TIER_SERVED.inc(tier=quality_info["name"], reason=quality_info["reason"])
+
+            log.debug("🎨 Colores extraídos: %s", album_colors.get('color_mood', 'unknown'))
+            log.debug("🎮 Reglas de movimiento: %s comportamientos", len(movement_data.get('behaviors', [])))
 
-            print(f"[SpotifyService] 🎨 Colores extraídos: {album_colors.get('color_mood', 'unknown')}")
-            print(f"[SpotifyService] 🎮 Reglas de movimiento: {len(movement_data.get('behaviors', []))} comportamientos")
+            # 8. Precargar la siguiente canción de la cola si esta está por terminar
+            #    (trabajo extra: no con el servicio cargado)
+            if tier < FAST_PALETTE:
+                self.prefetcher.maybe_prefetch(access_token, position_sample)
 
             # ✅ CONVERTIR TODOS LOS TIPOS NUMPY ANTES DE RETORNAR
             result = self._convert_numpy_types(result)
+            result["audio_analysis"] = audio_analysis.to_json()
 
             return result
 
         except Exception as e:
-            print(f"[SpotifyService] 💥 Error en get_current_track_enhanced: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("💥 Error en get_current_track_enhanced: %s", e)
             return None
 
-    def _extract_album_colors(self, item: Dict) -> Dict:
-        """Extrae colores de la portada del álbum"""
+    def _extract_album_colors(self, item: Dict, fast: bool = False, cached_only: bool = False) -> Dict:
+        """
+        Extrae colores de la portada del álbum.
+        fast: cuantizador barato; cached_only: solo paleta ya calculada (o la por defecto).
+        """
         try:
             if not item.get('album') or not item['album'].get('images'):
                 return self._get_default_colors()
@@ -225,10 +528,14 @@ class EnhancedSpotifyService:
             if not image_url:
                 return self._get_default_colors()
 
-            print(f"[SpotifyService] 🎨 Extrayendo colores de: {image_url[:80]}...")
+            log.debug("🎨 Extrayendo colores de: %s...", image_url[:80])
 
-            # Usar el extractor avanzado
-            colors = get_album_colors_from_url(image_url)
+            # Usar el extractor avanzado (el álbum permite reutilizar su paleta)
+            colors = get_album_colors_from_url(
+                image_url, fast=fast, cached_only=cached_only, album_id=item['album'].get('id'),
+            )
+            if colors is None:
+                return self._get_default_colors()
 
             # Convertir tipos numpy en los colores
             colors = self._convert_numpy_types(colors)
@@ -244,7 +551,7 @@ class EnhancedSpotifyService:
             return colors
 
         except Exception as e:
-            print(f"[SpotifyService] ❌ Error extrayendo colores: {e}")
+            log.warning("❌ Error extrayendo colores: %s", e)
             return self._get_default_colors()
 
     def _get_default_colors(self) -> Dict:
@@ -261,8 +568,8 @@ class EnhancedSpotifyService:
             "image_url": None
         }
 
-    def _get_artist_info(self, artists: List, access_token: str) -> Dict:
-        """Obtiene información adicional de artistas"""
+    def _get_artist_info(self, artists: List, access_token: str, fetch: bool = True) -> Dict:
+        """Obtiene información adicional de artistas (fetch=False: solo del cache)"""
         try:
             if not artists:
                 return {}
@@ -274,13 +581,14 @@ class EnhancedSpotifyService:
             if not artist_id:
                 return {"genres": [], "popularity": 0}
 
-            # Llamar a la API de Spotify para el artista
-            response = self._get(f"/artists/{artist_id}", access_token)
-            if response.status_code != 200:
+            # Artista desde el cache o agrupado con otras peticiones (/artists?ids=)
+            if fetch:
+                artist_data = self.artists_loader.load(artist_id, access_token)
+            else:
+                artist_data = self.artist_cache.get(artist_id)
+            if not artist_data:
                 return {"genres": [], "popularity": 0}
 
-            artist_data = response.json()
-
             return {
                 "genres": artist_data.get("genres", [])[:5],
                 "popularity": artist_data.get("popularity", 0),
@@ -289,25 +597,25 @@ class EnhancedSpotifyService:
             }
 
         except Exception as e:
-            print(f"[SpotifyService] Error obteniendo artista: {e}")
+            log.warning("Error obteniendo artista: %s", e)
             return {"genres": [], "popularity": 0}
 
-    def _generate_enhanced_visualizer_data(self, item: Dict, audio_features: Dict,
-                                           audio_analysis: Dict, album_colors: Dict) -> Dict:
+    def _generate_enhanced_visualizer_data(self, item: Dict, audio_features: AudioFeatures,
+                                           audio_analysis: AudioAnalysis, album_colors: Dict) -> Dict:
         """Genera datos mejorados para el visualizador"""
 
         # Usar audio features o valores por defecto
-        energy = audio_features.get("energy", 0.5)
-        tempo = audio_features.get("tempo", 120)
-        danceability = audio_features.get("danceability", 0.5)
-        valence = audio_features.get("valence", 0.5)
-        acousticness = audio_features.get("acousticness", 0.5)
-        instrumentalness = audio_features.get("instrumentalness", 0)
-        liveness = audio_features.get("liveness", 0.2)
-        speechiness = audio_features.get("speechiness", 0.1)
-        loudness = audio_features.get("loudness", -10)
-        key = audio_features.get("key", 0)
-        mode = audio_features.get("mode", 1)
+        energy = audio_features.energy
+        tempo = audio_features.tempo
+        danceability = audio_features.danceability
+        valence = audio_features.valence
+        acousticness = audio_features.acousticness
+        instrumentalness = audio_features.instrumentalness
+        liveness = audio_features.liveness
+        speechiness = audio_features.speechiness
+        loudness = audio_features.loudness
+        key = audio_features.key
+        mode = audio_features.mode
 
         # Calcular número de nodos basado en audio features
         base_nodes = 80
@@ -380,23 +688,23 @@ class EnhancedSpotifyService:
                 album_colors.get("palette_hex", [])) > 2 else "#f97316"
         }
 
-    def _calculate_intelligent_movement(self, audio_features: Dict, audio_analysis: Dict) -> Dict:
+    def _calculate_intelligent_movement(self, audio_features: AudioFeatures, audio_analysis: AudioAnalysis) -> Dict:
         """Calcula reglas de movimiento inteligente basadas en análisis de audio"""
 
         # Valores por defecto
-        energy = audio_features.get("energy", 0.5)
-        tempo = audio_features.get("tempo", 120)
-        danceability = audio_features.get("danceability", 0.5)
-        valence = audio_features.get("valence", 0.5)
-        key = audio_features.get("key", 0)
+        energy = audio_features.energy
+        tempo = audio_features.tempo
+        danceability = audio_features.danceability
+        valence = audio_features.valence
+        key = audio_features.key
 
-        # Obtener beats y secciones del análisis
-        beats = audio_analysis.get("beats", [])
-        sections = audio_analysis.get("sections", [])
+        # Obtener beats y secciones del análisis (sin reconstruir sus dicts)
+        n_beats = audio_analysis.count("beats")
+        section_loudness = audio_analysis.column("sections", "loudness")
 
         # Calcular densidad de beats
-        duration_sec = max(audio_features.get("duration_ms", 180000) / 1000, 1)
-        beat_density = float(len(beats) / duration_sec)
+        duration_sec = max(audio_features.duration_ms / 1000, 1)
+        beat_density = float(n_beats / duration_sec)
 
         # Determinar patrón rítmico
         rhythmic_pattern = "steady"
@@ -416,11 +724,11 @@ class EnhancedSpotifyService:
 
         # Calcular variación de secciones
         section_variation = 0.0
-        if len(sections) > 1:
-            loudnesses = [s.get("loudness", -10) for s in sections]
+        if len(section_loudness) > 1:
+            loudnesses = [-10 if v is None else v for v in section_loudness]
             section_variation = float(max(loudnesses) - min(loudnesses))
 
-        attraction_points = self._calculate_attraction_points(beats, sections)
+        attraction_points = self._calculate_attraction_points(n_beats, section_loudness)
 
         # Asegurar que todos los valores sean tipos nativos
         attraction_points = self._convert_numpy_types(attraction_points)
@@ -442,8 +750,11 @@ class EnhancedSpotifyService:
             }
         }
 
-    def _calculate_attraction_points(self, beats: List, sections: List) -> List[Dict]:
-        """Calcula puntos de atracción basados en la estructura de la canción"""
+    def _calculate_attraction_points(self, n_beats: int, section_loudness: List) -> List[Dict]:
+        """
+        Calcula puntos de atracción basados en la estructura de la canción
+        (número de beats y loudness de cada sección; None si falta)
+        """
         attraction_points = []
 
         # Punto central siempre
@@ -456,13 +767,12 @@ class EnhancedSpotifyService:
         })
 
         # Puntos basados en beats (si hay datos)
-        if beats and len(beats) > 10:
-            # Tomar algunos beats importantes
-            important_beats = beats[::max(1, len(beats) // 8)]  # ~8 beats importantes
+        if n_beats > 10:
+            # Tomar algunos beats importantes (~8, repartidos por la canción)
+            step = max(1, n_beats // 8)
+            important_beats = -(-n_beats // step)
 
-            for i, beat in enumerate(important_beats[:8]):
-                if i >= 8:
-                    break
+            for i in range(min(8, important_beats)):
 
                 angle = (i / 8) * 2 * math.pi
                 distance = 0.3 + (i % 3) * 0.1
@@ -477,19 +787,16 @@ class EnhancedSpotifyService:
                 })
 
         # Puntos basados en secciones (si hay datos)
-        if sections and len(sections) > 1:
-            for i, section in enumerate(sections[:4]):  # Máximo 4 secciones
-                if i >= 4:
-                    break
-
+        if len(section_loudness) > 1:
+            for i, loudness in enumerate(section_loudness[:4]):  # Máximo 4 secciones
                 # Posición en círculo
-                angle = (i / len(sections)) * 2 * math.pi + 0.785  # Offset 45°
+                angle = (i / len(section_loudness)) * 2 * math.pi + 0.785  # Offset 45°
                 distance = 0.4
 
                 attraction_points.append({
                     "x": float(0.5 + math.cos(angle) * distance),
                     "y": float(0.5 + math.sin(angle) * distance),
-                    "strength": float(0.4 + section.get("loudness", -5) / 50),
+                    "strength": float(0.4 + (-5 if loudness is None else loudness) / 50),
                     "radius": 0.15,
                     "type": "section",
                     "section_index": int(i)
@@ -497,14 +804,14 @@ class EnhancedSpotifyService:
 
         return attraction_points
 
-    def _calculate_track_mood(self, audio_features: Dict, album_colors: Dict) -> str:
+    def _calculate_track_mood(self, audio_features: AudioFeatures, album_colors: Dict) -> str:
         """Calcula el mood general de la canción combinando audio y colores"""
 
-        energy = audio_features.get("energy", 0.5)
-        valence = audio_features.get("valence", 0.5)
-        danceability = audio_features.get("danceability", 0.5)
-        tempo = audio_features.get("tempo", 120)
-        acousticness = audio_features.get("acousticness", 0.5)
+        energy = audio_features.energy
+        valence = audio_features.valence
+        danceability = audio_features.danceability
+        tempo = audio_features.tempo
+        acousticness = audio_features.acousticness
 
         color_mood = album_colors.get("color_mood", "balanced")
 
@@ -529,19 +836,19 @@ class EnhancedSpotifyService:
 
         return "balanced"
 
-    def _calculate_complexity_score(self, audio_features: Dict, audio_analysis: Dict) -> float:
+    def _calculate_complexity_score(self, audio_features: AudioFeatures, audio_analysis: AudioAnalysis) -> float:
         """Calcula un score de complejidad musical (0-1)"""
 
-        energy = audio_features.get("energy", 0.5)
-        danceability = audio_features.get("danceability", 0.5)
-        valence = audio_features.get("valence", 0.5)
-        acousticness = audio_features.get("acousticness", 0.5)
-        instrumentalness = audio_features.get("instrumentalness", 0)
-        speechiness = audio_features.get("speechiness", 0.1)
-        liveness = audio_features.get("liveness", 0.2)
+        energy = audio_features.energy
+        danceability = audio_features.danceability
+        valence = audio_features.valence
+        acousticness = audio_features.acousticness
+        instrumentalness = audio_features.instrumentalness
+        speechiness = audio_features.speechiness
+        liveness = audio_features.liveness
 
         # Componentes de complejidad
-        rhythmic_complexity = min(1.0, len(audio_analysis.get("beats", [])) / 100)
+        rhythmic_complexity = min(1.0, audio_analysis.count("beats") / 100)
         harmonic_complexity = 1.0 - acousticness  # Menos acústico = más complejo
         textural_complexity = (1.0 - instrumentalness) * 0.5 + speechiness * 0.5
         dynamic_complexity = liveness * 0.7 + energy * 0.3
@@ -577,10 +884,15 @@ class EnhancedSpotifyService:
         }
 
 
-# Instancia global mejorada
+# Instancia global mejorada (única: app.py y live_visualizer.py usan esta misma)
 spotify_service = EnhancedSpotifyService()
 
 
+def get_spotify_service() -> EnhancedSpotifyService:
+    """Servicio compartido (un solo juego de caches por proceso)"""
+    return spotify_service
+
+
 # Alias para compatibilidad
 def get_current_track_full(access_token: str) -> Dict | None:
     return spotify_service.get_current_track_enhanced(access_token)
\ No newline at end of file
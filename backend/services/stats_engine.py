@@ -0,0 +1,269 @@
+# backend/services/stats_engine.py
+
+"""
+Motor de estadísticas de escucha.
+Pide en paralelo los tops y el historial reciente, trae las audio features
+por lotes y calcula distribuciones, medias, percentiles y comparaciones por
+rango de tiempo con NumPy. El resultado se cachea por usuario con un TTL.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import hashlib
+import warnings
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+from utils.lazy_import import lazy_import
+from utils.log import get_logger
+from utils.shared_cache import create_cache
+
+np = lazy_import("numpy")
+
+log = get_logger("StatsEngine")
+
+
+# Features en escala 0-1 (histograma fijo) y el resto con su propio rango
+UNIT_FEATURES = ["energy", "danceability", "valence", "acousticness",
+                 "instrumentalness", "speechiness", "liveness"]
+SCALAR_FEATURES = ["tempo", "loudness"]
+ALL_FEATURES = UNIT_FEATURES + SCALAR_FEATURES
+
+TIME_RANGES = ["short_term", "medium_term", "long_term"]
+PERCENTILES = [10, 25, 50, 75, 90]
+
+
+class ListeningStatsEngine:
+    CACHE_TTL_S = float(os.getenv("STATS_CACHE_TTL", "300"))
+
+    def __init__(self, service: Any, history_store: Any = None, max_workers: int = 5):
+        self.service = service
+        # Historial local opcional (ListeningHistoryStore) para totales reales
+        self.history_store = history_store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stats")
+        # { user_key: stats } con TTL (compartido entre workers si hay L2)
+        self._cache = create_cache("stats", ttl_s=self.CACHE_TTL_S, l1_max_entries=256)
+
+    # ========================= API pública ==========================
+    def get_stats(self, access_token: str, force_refresh: bool = False) -> Dict | None:
+        user_key = self._user_key(access_token)
+
+        if not force_refresh:
+            cached = self._cache.get(user_key)
+            if cached is not None:
+                return cached
+
+        stats = self.compute_stats(access_token)
+        if stats is None:
+            return None
+
+        self._cache.set(user_key, stats)
+        return stats
+
+    def invalidate(self, access_token: str) -> None:
+        self._cache.delete(self._user_key(access_token))
+
+    def compute_stats(self, access_token: str) -> Dict | None:
+        started = time.perf_counter()
+
+        # 1. Listas en paralelo (tops de los tres rangos + artistas + recientes)
+        futures = {
+            f"tracks_{time_range}": self._executor.submit(
+                self.service.get_top_tracks, access_token, time_range, 50)
+            for time_range in TIME_RANGES
+        }
+        futures["artists"] = self._executor.submit(
+            self.service.get_top_artists, access_token, "medium_term", 50)
+        futures["recent"] = self._executor.submit(
+            self.service.get_recent_tracks, access_token, 50)
+
+        lists = {name: future.result() for name, future in futures.items()}
+        if not any(lists.values()):
+            return None
+
+        tracks_by_range = {
+            time_range: (lists[f"tracks_{time_range}"] or {}).get("items", [])
+            for time_range in TIME_RANGES
+        }
+        top_artists = (lists["artists"] or {}).get("items", [])
+        recent_tracks = [play.get("track") or {} for play in (lists["recent"] or {}).get("items", [])]
+
+        # 2. Audio features de todos los tracks en llamadas por lotes
+        all_ids = [t.get("id") for tracks in tracks_by_range.values() for t in tracks]
+        all_ids += [t.get("id") for t in recent_tracks]
+        features = self.service.get_audio_features_bulk(all_ids, access_token)
+
+        # 3. Cálculos vectorizados
+        medium_matrix = self._feature_matrix(tracks_by_range["medium_term"], features)
+        recent_matrix = self._feature_matrix(recent_tracks, features)
+        range_means = {
+            time_range: self._means(self._feature_matrix(tracks, features))
+            for time_range, tracks in tracks_by_range.items()
+        }
+
+        medium_means = range_means["medium_term"]
+        stats = {
+            "total_tracks_played": len(recent_tracks),
+            "total_artists": len(top_artists),
+            # Formato anterior (compatibilidad)
+            "audio_features": {
+                "avg_energy": medium_means.get("energy"),
+                "avg_tempo": medium_means.get("tempo"),
+                "avg_danceability": medium_means.get("danceability"),
+            },
+            "features": {
+                "means": medium_means,
+                "std": self._std(medium_matrix),
+                "percentiles": self._percentiles(medium_matrix),
+                "distributions": self._distributions(medium_matrix),
+            },
+            "recent": {
+                "means": self._means(recent_matrix),
+                "unique_tracks": len({t.get("id") for t in recent_tracks if t.get("id")}),
+                "unique_artists": len({a.get("id") for t in recent_tracks
+                                       for a in t.get("artists", []) if a.get("id")}),
+            },
+            "time_ranges": {
+                "means": range_means,
+                "shift_short_vs_long": self._diff(range_means["short_term"], range_means["long_term"]),
+                "overlap": self._range_overlap(tracks_by_range),
+            },
+            "genres": self._genre_distribution(top_artists),
+            "popularity": self._popularity_stats(tracks_by_range["medium_term"]),
+            "generated_at": time.time(),
+            "compute_ms": 0.0,
+        }
+        history = self._history_summary(access_token)
+        if history:
+            stats["history"] = history
+            stats["total_tracks_played"] = history["total_plays"]
+
+        stats["compute_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return stats
+
+    # ========================= Helpers internos ==========================
+    def _user_key(self, access_token: str) -> str:
+        # Si no se puede resolver el usuario, cachear por token
+        return self.service.get_user_id(access_token) or hashlib.sha256(access_token.encode()).hexdigest()
+
+    def _history_summary(self, access_token: str) -> Dict[str, Any] | None:
+        """Totales desde el historial local (consulta SQLite, sin llamar a la API)"""
+        if self.history_store is None:
+            return None
+        user_id = self.service.get_user_id(access_token)
+        if not user_id:
+            return None
+        try:
+            self.history_store.sync_if_stale(self.service, access_token, user_id)
+        except Exception as e:
+            # Las stats no dependen del sync: se usan los totales ya guardados
+            log.warning("⚠️ Sync del historial fallido, se usan los totales guardados: %s", e)
+        return {
+            "total_plays": self.history_store.count_plays(user_id),
+            "last_played_at_ms": self.history_store.get_sync_state(user_id)["last_played_at_ms"],
+        }
+
+    @staticmethod
+    def _feature_matrix(tracks: List[Dict], features: Dict[str, Dict]) -> np.ndarray:
+        """Matriz (n_tracks, n_features); NaN donde falte un valor"""
+        rows = []
+        for track in tracks:
+            track_features = features.get(track.get("id"))
+            if track_features:
+                rows.append([
+                    np.nan if track_features.get(name) is None else track_features[name]
+                    for name in ALL_FEATURES
+                ])
+        if not rows:
+            return np.empty((0, len(ALL_FEATURES)), dtype=np.float64)
+        return np.asarray(rows, dtype=np.float64)
+
+    @staticmethod
+    def _column_stat(matrix: np.ndarray, fn) -> Dict[str, float | None]:
+        if matrix.shape[0] == 0:
+            return {name: None for name in ALL_FEATURES}
+        with warnings.catch_warnings():
+            # Columnas sin datos (todo NaN) -> None, sin avisos de NumPy
+            warnings.simplefilter("ignore", RuntimeWarning)
+            values = fn(matrix)
+        return {name: (None if np.isnan(v) else round(float(v), 4))
+                for name, v in zip(ALL_FEATURES, values)}
+
+    def _means(self, matrix: np.ndarray) -> Dict[str, float | None]:
+        return self._column_stat(matrix, lambda m: np.nanmean(m, axis=0))
+
+    def _std(self, matrix: np.ndarray) -> Dict[str, float | None]:
+        return self._column_stat(matrix, lambda m: np.nanstd(m, axis=0))
+
+    @staticmethod
+    def _percentiles(matrix: np.ndarray) -> Dict[str, Dict[str, float]]:
+        if matrix.shape[0] == 0:
+            return {}
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            values = np.nanpercentile(matrix, PERCENTILES, axis=0)  # (n_percentiles, n_features)
+        return {
+            name: {f"p{p}": round(float(values[i, j]), 4) for i, p in enumerate(PERCENTILES)}
+            for j, name in enumerate(ALL_FEATURES)
+            if not np.isnan(values[:, j]).any()
+        }
+
+    @staticmethod
+    def _distributions(matrix: np.ndarray, bins: int = 10) -> Dict[str, Dict[str, List]]:
+        """Histogramas: bins fijos 0-1 para las features unitarias, rango propio para el resto"""
+        distributions = {}
+        for j, name in enumerate(ALL_FEATURES):
+            column = matrix[:, j]
+            column = column[~np.isnan(column)]
+            if column.size == 0:
+                continue
+            value_range = (0.0, 1.0) if name in UNIT_FEATURES else None
+            counts, edges = np.histogram(column, bins=bins, range=value_range)
+            distributions[name] = {
+                "counts": counts.astype(int).tolist(),
+                "edges": np.round(edges, 3).tolist(),
+            }
+        return distributions
+
+    @staticmethod
+    def _diff(a: Dict[str, float | None], b: Dict[str, float | None]) -> Dict[str, float | None]:
+        return {
+            name: (round(a[name] - b[name], 4) if a.get(name) is not None and b.get(name) is not None else None)
+            for name in ALL_FEATURES
+        }
+
+    @staticmethod
+    def _range_overlap(tracks_by_range: Dict[str, List[Dict]]) -> Dict[str, float]:
+        """Fracción de tracks compartidos entre rangos (Jaccard)"""
+        ids = {r: {t.get("id") for t in tracks if t.get("id")} for r, tracks in tracks_by_range.items()}
+        overlap = {}
+        for i, first in enumerate(TIME_RANGES):
+            for second in TIME_RANGES[i + 1:]:
+                union = ids[first] | ids[second]
+                overlap[f"{first}__{second}"] = round(len(ids[first] & ids[second]) / len(union), 4) if union else 0.0
+        return overlap
+
+    @staticmethod
+    def _genre_distribution(artists: List[Dict], top_n: int = 10) -> Dict[str, Any]:
+        counter = Counter(genre for artist in artists for genre in artist.get("genres", []))
+        total = sum(counter.values())
+        return {
+            "total_genres": len(counter),
+            "top": [
+                {"genre": genre, "count": count, "share": round(count / total, 4)}
+                for genre, count in counter.most_common(top_n)
+            ],
+        }
+
+    @staticmethod
+    def _popularity_stats(tracks: List[Dict]) -> Dict[str, float | None]:
+        popularity = np.asarray([t.get("popularity", 0) for t in tracks], dtype=np.float64)
+        if popularity.size == 0:
+            return {"mean": None, "median": None}
+        return {
+            "mean": round(float(popularity.mean()), 2),
+            "median": round(float(np.median(popularity)), 2),
+        }
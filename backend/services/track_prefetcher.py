@@ -0,0 +1,81 @@
+# backend/services/track_prefetcher.py
+
+"""
+Precarga de la siguiente canción de la cola de reproducción.
+Cuando la canción actual está por terminar, lee /me/player/queue en segundo
+plano y calienta los caches (features, análisis, artista y paleta) del
+siguiente item, para que el cambio de canción se renderice al instante.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Dict, Any
+
+from utils.playback_clock import remaining_ms
+from utils.log import get_logger
+
+log = get_logger("TrackPrefetcher")
+
+
+class TrackPrefetcher:
+    # Empezar a precargar cuando falten menos de N ms para el final
+    PREFETCH_WINDOW_MS = int(os.getenv("PREFETCH_WINDOW_MS", "30000"))
+
+    def __init__(self, service: Any):
+        self.service = service
+        self._lock = threading.Lock()
+        # Tracks actuales para los que ya se lanzó la precarga: { track_id, ... }
+        self._scheduled: set[str] = set()
+
+    def maybe_prefetch(self, access_token: str, position_sample: Dict | None) -> bool:
+        """
+        Lanza la precarga en un hilo de fondo si la canción actual entra en la
+        ventana final. Solo una vez por canción actual.
+        """
+        if not position_sample:
+            return False
+
+        track_id = position_sample.get("track_id")
+        left_ms = remaining_ms(position_sample)
+        if not track_id or left_ms is None or left_ms > self.PREFETCH_WINDOW_MS:
+            return False
+
+        with self._lock:
+            if track_id in self._scheduled:
+                return False
+            # No acumular ids de canciones pasadas
+            if len(self._scheduled) > 256:
+                self._scheduled.clear()
+            self._scheduled.add(track_id)
+
+        thread = threading.Thread(
+            target=self._prefetch_next,
+            args=(access_token, track_id),
+            daemon=True,
+        )
+        thread.start()
+        return True
+
+    def _prefetch_next(self, access_token: str, current_track_id: str) -> None:
+        try:
+            queue = self.service.get_playback_queue(access_token)
+            if not queue:
+                return
+
+            upcoming = queue.get("queue") or []
+            next_item = next(
+                (item for item in upcoming
+                 if item and item.get("type", "track") == "track" and item.get("id") != current_track_id),
+                None,
+            )
+            if not next_item:
+                return
+
+            log.debug("⏭️ Precargando: %s", next_item.get('name'))
+            self.service.warm_track(next_item, access_token)
+            log.debug("✅ Caches calientes para: %s", next_item.get('name'))
+
+        except Exception as e:
+            log.warning("❌ Error precargando siguiente canción: %s", e)
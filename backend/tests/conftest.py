@@ -0,0 +1,17 @@
+# backend/tests/conftest.py
+
+"""
+Los módulos del backend se importan relativos a backend/ (como al lanzar
+app.py), y los caches y el cluster van en memoria durante los tests.
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ["CACHE_BACKEND_URL"] = "memory://"
+os.environ["CLUSTER_BACKEND_URL"] = "memory://"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
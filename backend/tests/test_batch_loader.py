@@ -0,0 +1,124 @@
+# backend/tests/test_batch_loader.py
+
+import threading
+
+from services.batch_loader import BatchLoader
+from utils.shared_cache import TieredCache
+
+
+class RecordingFetch:
+    """fetch_batch de mentira: apunta cada llamada y devuelve datos para los ids conocidos"""
+
+    def __init__(self, known=None, delay_s=0.0):
+        self.calls = []
+        self.known = known
+        self.delay_s = delay_s
+        self._lock = threading.Lock()
+
+    def __call__(self, ids, access_token):
+        with self._lock:
+            self.calls.append((list(ids), access_token))
+        if self.delay_s:
+            threading.Event().wait(self.delay_s)
+        return {i: {"id": i} for i in ids if self.known is None or i in self.known}
+
+
+def make_loader(fetch, max_batch=50, window_s=0.05, name="test"):
+    return BatchLoader(name, fetch, TieredCache(f"batch_{name}"), max_batch=max_batch, window_s=window_s)
+
+
+def test_concurrent_requests_share_one_batch():
+    fetch = RecordingFetch()
+    loader = make_loader(fetch, window_s=0.2)
+    results = {}
+    start = threading.Barrier(4)
+
+    def worker(n):
+        start.wait()
+        results[n] = loader.load_many([f"id{n}", "shared"], "token")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    # El primero hace de líder, espera la ventana y pide los ids de todos de una vez
+    assert len(fetch.calls) == 1
+    assert sorted(fetch.calls[0][0]) == ["id0", "id1", "id2", "id3", "shared"]
+    for n in range(4):
+        assert results[n] == {f"id{n}": {"id": f"id{n}"}, "shared": {"id": "shared"}}
+
+
+def test_batches_are_split_by_max_batch():
+    fetch = RecordingFetch()
+    loader = make_loader(fetch, max_batch=3, window_s=0)
+
+    result = loader.load_many([f"id{i}" for i in range(7)], "token")
+
+    assert [len(ids) for ids, _ in fetch.calls] == [3, 3, 1]
+    assert len(result) == 7
+
+
+def test_cached_ids_are_not_fetched_again():
+    fetch = RecordingFetch()
+    loader = make_loader(fetch, window_s=0)
+
+    loader.load_many(["a", "b"], "token")
+    result = loader.load_many(["a", "b", "c"], "token")
+
+    assert [ids for ids, _ in fetch.calls] == [["a", "b"], ["c"]]
+    assert set(result) == {"a", "b", "c"}
+
+
+def test_unknown_ids_are_left_out_and_not_cached():
+    fetch = RecordingFetch(known={"a"})
+    loader = make_loader(fetch, window_s=0)
+
+    assert loader.load_many(["a", "missing"], "token") == {"a": {"id": "a"}}
+    assert loader.load("missing", "token") is None
+    assert len(fetch.calls) == 2
+
+
+def test_failed_batch_releases_waiters():
+    def failing(ids, access_token):
+        raise RuntimeError("boom")
+
+    loader = make_loader(failing, window_s=0)
+
+    assert loader.load_many(["a", "b"], "token") == {}
+    assert loader._pending == {}
+
+
+class ExpiredToken(Exception):
+    status_code = 401
+
+
+def test_failed_token_falls_back_to_another_callers_token():
+    fetch = RecordingFetch(delay_s=0)
+
+    def fetch_batch(ids, access_token):
+        if access_token == "expired":
+            fetch.calls.append((list(ids), access_token))
+            raise ExpiredToken("HTTP 401")
+        return fetch(ids, access_token)
+
+    loader = make_loader(fetch_batch, max_batch=2, window_s=0.2)
+    results = {}
+
+    def worker(name, token):
+        results[name] = loader.load_many([f"{name}1", f"{name}2"], token)
+
+    # El del token caducado llega el último, pero su lote no falla por ello
+    good = threading.Thread(target=worker, args=("good", "valid"))
+    bad = threading.Thread(target=worker, args=("bad", "expired"))
+    good.start()
+    threading.Event().wait(0.05)
+    bad.start()
+    for t in (good, bad):
+        t.join(timeout=5)
+
+    assert set(results["good"]) == {"good1", "good2"}
+    assert set(results["bad"]) == {"bad1", "bad2"}
+    # El token rechazado se prueba una vez y se descarta para el resto de lotes
+    assert [token for _, token in fetch.calls] == ["expired", "valid", "valid"]
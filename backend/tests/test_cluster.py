@@ -0,0 +1,89 @@
+# backend/tests/test_cluster.py
+
+import time
+
+import pytest
+
+from websockets import cluster
+from websockets.cluster import create_cluster_backend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return create_cluster_backend("memory://")
+    return create_cluster_backend(f"sqlite:///{tmp_path / 'cluster.db'}")
+
+
+def test_only_one_node_holds_a_lease(backend):
+    assert backend.acquire_lease("poll:user", "node-a", ttl_s=10)
+    assert not backend.acquire_lease("poll:user", "node-b", ttl_s=10)
+    # El dueño renueva
+    assert backend.acquire_lease("poll:user", "node-a", ttl_s=10)
+    # Otro lease es independiente
+    assert backend.acquire_lease("poll:other", "node-b", ttl_s=10)
+
+
+def test_expired_lease_can_be_taken_over(backend):
+    assert backend.acquire_lease("poll:user", "node-a", ttl_s=0.05)
+    time.sleep(0.1)
+
+    assert backend.acquire_lease("poll:user", "node-b", ttl_s=10)
+    assert not backend.acquire_lease("poll:user", "node-a", ttl_s=10)
+
+
+def test_only_the_holder_releases(backend):
+    backend.acquire_lease("poll:user", "node-a", ttl_s=10)
+
+    backend.release_lease("poll:user", "node-b")
+    assert not backend.acquire_lease("poll:user", "node-b", ttl_s=10)
+
+    backend.release_lease("poll:user", "node-a")
+    assert backend.acquire_lease("poll:user", "node-b", ttl_s=10)
+
+
+def test_clients_by_user_and_token_update(backend):
+    backend.register_client("sid1", "node-a", "tok", "user")
+    backend.register_client("sid2", "node-b", "tok", "user")
+    backend.register_client("sid3", "node-a", "x", "other")
+
+    backend.update_token("user", "tok2")
+
+    grouped = backend.clients_by_user()
+    assert sorted(c["sid"] for c in grouped["user"]) == ["sid1", "sid2"]
+    assert {c["access_token"] for c in grouped["user"]} == {"tok2"}
+    assert grouped["other"][0]["access_token"] == "x"
+
+    backend.unregister_client("sid1")
+    assert [c["sid"] for c in backend.clients_by_user()["user"]] == ["sid2"]
+
+
+def test_clients_without_heartbeat_expire(backend, monkeypatch):
+    backend.register_client("sid1", "node-a", "tok", "user")
+    backend.register_client("sid2", "node-b", "tok", "user")
+    monkeypatch.setattr(cluster, "CLIENT_TTL_S", 0.05)
+    time.sleep(0.1)
+
+    # Solo el nodo dueño del socket lo mantiene vivo
+    backend.heartbeat("node-a", ["sid1", "sid2"])
+
+    assert [c["sid"] for c in backend.list_clients()] == ["sid1"]
+
+
+def test_has_clients_checks_one_user(backend, monkeypatch):
+    backend.register_client("sid1", "node-a", "tok", "user")
+    backend.register_client("sid2", "node-b", "tok", "user")
+
+    assert backend.has_clients("user")
+    assert not backend.has_clients("nobody")
+
+    backend.unregister_client("sid1")
+    assert backend.has_clients("user")
+    backend.unregister_client("sid2")
+    assert not backend.has_clients("user")
+
+    backend.register_client("sid3", "node-a", "tok", "user")
+    monkeypatch.setattr(cluster, "CLIENT_TTL_S", 0.05)
+    time.sleep(0.1)
+    # Sin heartbeat ya no cuenta
+    assert not backend.has_clients("user")
@@ -0,0 +1,45 @@
+# backend/tests/test_codec.py
+
+import numpy as np
+import pytest
+
+from utils.shared_cache import TieredCache, SQLiteCacheBackend, encode_value, decode_value
+
+
+def roundtrip(value):
+    return decode_value(encode_value(value))
+
+
+def test_plain_values_and_arrays():
+    value = {"a": [1, 2.5, "x", None, True], "nested": {"b": []}}
+    assert roundtrip(value) == value
+
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+    restored = roundtrip({"array": array})["array"]
+    assert restored.dtype == np.float32
+    assert np.array_equal(restored, array)
+
+
+def test_numpy_scalars_become_python_values():
+    restored = roundtrip({"n": np.int64(3), "x": np.float32(0.5)})
+
+    assert restored == {"n": 3, "x": 0.5}
+    assert type(restored["n"]) is int
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        decode_value(b"not a cache entry")
+
+
+def test_arrays_survive_the_l2(tmp_path):
+    cache = TieredCache("codec_l2_arrays", l2=SQLiteCacheBackend(str(tmp_path / "cache.db")))
+    waveform = np.linspace(0, 1, 64, dtype=np.float64)
+    cache.set("track", {"id": "t1", "waveform": waveform})
+
+    # Sin L1: lo que vuelve viene decodificado del L2
+    cache.clear_local()
+    found = cache.get("track")
+
+    assert found["id"] == "t1"
+    assert np.array_equal(found["waveform"], waveform)
@@ -0,0 +1,52 @@
+# backend/tests/test_history_rollups.py
+
+import sqlite3
+
+from services.history_store import ListeningHistoryStore
+
+HOUR = 3600 * 1000
+
+
+def row(n, track_id):
+    return {"played_at_ms": n * HOUR, "track_id": track_id, "artist_ids": "", "duration_ms": 1000}
+
+
+def test_missing_features_do_not_drag_the_averages():
+    store = ListeningHistoryStore(":memory:")
+    features = {
+        "full": {"energy": 0.8, "valence": 0.4, "danceability": 0.6, "acousticness": 0.2, "tempo": 120.0},
+        "partial": {"energy": 0.6, "tempo": None},
+    }
+
+    store.rollups.add_plays("user", [row(0, "full"), row(1, "partial"), row(2, "none")], features, {})
+
+    [bucket] = store.rollups.get_buckets("user", "day")
+    assert bucket["play_count"] == 3
+    assert bucket["avg_features"]["energy"] == 0.7
+    assert bucket["avg_features"]["valence"] == 0.4
+    assert bucket["avg_features"]["tempo"] == 120.0
+
+
+def test_old_databases_get_per_feature_counts(tmp_path):
+    path = str(tmp_path / "history.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE rollups (
+            user_id TEXT NOT NULL, granularity TEXT NOT NULL, bucket_start_ms INTEGER NOT NULL,
+            play_count INTEGER NOT NULL DEFAULT 0, ms_played INTEGER NOT NULL DEFAULT 0,
+            features_count INTEGER NOT NULL DEFAULT 0,
+            energy_sum REAL NOT NULL DEFAULT 0, valence_sum REAL NOT NULL DEFAULT 0,
+            danceability_sum REAL NOT NULL DEFAULT 0, acousticness_sum REAL NOT NULL DEFAULT 0,
+            tempo_sum REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, granularity, bucket_start_ms)
+        );
+        INSERT INTO rollups (user_id, granularity, bucket_start_ms, play_count, features_count, energy_sum)
+        VALUES ('user', 'day', 0, 2, 2, 1.0);
+    """)
+    conn.commit()
+    conn.close()
+
+    store = ListeningHistoryStore(path)
+
+    [bucket] = store.rollups.get_buckets("user", "day")
+    assert bucket["avg_features"]["energy"] == 0.5
@@ -0,0 +1,66 @@
+# backend/tests/test_history_store.py
+
+import pytest
+
+from services.history_store import ListeningHistoryStore
+from services.spotify_service import UpstreamError
+
+
+def play(n):
+    return {
+        "played_at": f"2024-01-01T00:{n // 60:02d}:{n % 60:02d}.000Z",
+        "track": {"id": f"t{n}", "name": f"Track {n}", "duration_ms": 1000,
+                  "artists": [{"id": "a1", "name": "Artist"}]},
+    }
+
+
+class FakeService:
+    """Servicio de mentira: sirve páginas de recently-played y falla en la que se le diga"""
+
+    def __init__(self, pages, fail_at=None, status_code=401):
+        self.pages = pages
+        self.fail_at = fail_at
+        self.status_code = status_code
+        self.calls = 0
+
+    def get_recent_tracks_after(self, access_token, after_ms, limit=50):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise UpstreamError("/me/player/recently-played", self.status_code)
+        page = self.pages[self.calls - 1] if self.calls <= len(self.pages) else []
+        cursor = str(1_700_000_000_000 + self.calls) if page else None
+        return {"items": page, "cursors": {"after": cursor}}
+
+    def get_audio_features_bulk(self, track_ids, access_token):
+        return {}
+
+    def get_artists_bulk(self, artist_ids, access_token):
+        return {}
+
+
+@pytest.fixture
+def store():
+    return ListeningHistoryStore(":memory:")
+
+
+def test_sync_marks_synced_only_when_every_page_succeeds(store):
+    service = FakeService([[play(n) for n in range(50)]], fail_at=2)
+
+    with pytest.raises(UpstreamError):
+        store.sync_if_stale(service, "token", "user")
+
+    # Lo insertado se queda, pero el siguiente sync_if_stale vuelve a intentarlo
+    assert store.count_plays("user") == 50
+    assert store.get_sync_state("user")["last_sync_ts"] == 0.0
+
+    result = store.sync_if_stale(FakeService([]), "token", "user")
+    assert result is not None
+    assert store.get_sync_state("user")["last_sync_ts"] > 0
+
+
+def test_play_rows_are_read_in_chunks(store):
+    store.append_plays("user", [play(n) for n in range(25)])
+
+    rows = list(store.iter_play_rows("user", batch_size=10))
+
+    assert [row["track_id"] for row in rows] == [f"t{n}" for n in range(25)]
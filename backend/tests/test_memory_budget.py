@@ -0,0 +1,82 @@
+# backend/tests/test_memory_budget.py
+
+import pytest
+
+from utils import shared_cache
+from utils.memory_budget import MemoryBudget
+from utils.shared_cache import TieredCache
+
+
+def test_scan_evicts_probation_before_protected():
+    budget = MemoryBudget(300)
+    owner = object()
+    budget.charge(owner, "hot", 100, None)
+    budget.touch(owner, "hot")
+
+    # Un barrido de claves de un solo uso no echa a la que se ha vuelto a leer
+    victims = []
+    for n in range(5):
+        victims += budget.charge(owner, f"scan{n}", 100, None)
+
+    assert "hot" not in [key for _, key, _ in victims]
+    assert [key for _, key, _ in victims] == ["scan0", "scan1", "scan2"]
+    assert budget.used_bytes == 300
+
+
+def test_protected_segment_is_capped():
+    budget = MemoryBudget(1000)
+    owner = object()
+    for n in range(5):
+        budget.charge(owner, f"k{n}", 200, None)
+        budget.touch(owner, f"k{n}")
+
+    stats = budget.stats()
+    assert stats["protected_bytes"] <= MemoryBudget.PROTECTED_FRACTION * 1000
+    assert stats["probation_bytes"] + stats["protected_bytes"] == 1000
+
+
+def test_recharging_a_key_replaces_its_size():
+    budget = MemoryBudget(1000)
+    owner = object()
+    budget.charge(owner, "k", 400, None)
+    budget.charge(owner, "k", 100, None)
+
+    assert budget.used_bytes == 100
+    assert budget.bytes_for(owner) == 100
+
+    budget.release(owner, "k")
+    assert budget.used_bytes == 0
+
+
+@pytest.fixture
+def small_budget(monkeypatch):
+    budget = MemoryBudget(10_000)
+    monkeypatch.setattr(shared_cache, "memory_budget", budget)
+    return budget
+
+
+def test_cache_drops_entries_evicted_by_the_budget(small_budget):
+    cache = TieredCache("budget_evict")
+    cache.set("a", "x" * 6000)
+    cache.set("b", "y" * 6000)
+
+    assert "a" not in cache
+    assert cache.get("b") == "y" * 6000
+    assert cache.evictions["budget"] == 1
+    assert small_budget.bytes_for(cache) == small_budget.used_bytes
+
+
+def test_stale_victim_does_not_drop_a_rewritten_entry(small_budget):
+    cache = TieredCache("budget_race")
+    cache.set("k", "old")
+    stale_token = cache._l1["k"]
+
+    # Otro hilo reescribe la clave entre la expulsión y _drop_l1
+    cache.set("k", "new")
+    cache._drop_l1("k", stale_token)
+
+    assert cache.get("k") == "new"
+    assert cache.evictions["budget"] == 0
+
+    cache._drop_l1("k", cache._l1["k"])
+    assert "k" not in cache
@@ -0,0 +1,53 @@
+# backend/tests/test_send_queue.py
+
+import socketio
+from engineio import socket as eio_socket
+
+from websockets.send_queue import LatestOnlySender, FrameSize
+
+
+class FakeSocketIO:
+    """Lo que LatestOnlySender usa de flask_socketio.SocketIO: .server y .emit"""
+
+    def __init__(self):
+        self.server = socketio.Server(async_mode="threading")
+        self.emitted = []
+
+    def emit(self, event, data, room=None, namespace=None):
+        self.emitted.append((event, room))
+
+
+def connect(fake, eio_sid):
+    """Socket conectado a este proceso, como lo deja el handshake de Engine.IO"""
+    sid = fake.server.manager.connect(eio_sid, "/")
+    fake.server.eio.sockets[eio_sid] = eio_socket.Socket(fake.server.eio, eio_sid)
+    return sid
+
+
+def test_engine_io_internals_are_still_there():
+    # _engine_queue_size depende de ellos: si una actualización los cambia, fallar aquí
+    fake = FakeSocketIO()
+    sid = connect(fake, "eio1")
+    sender = LatestOnlySender(fake)
+
+    assert fake.server.manager.eio_sid_from_sid(sid, "/") == "eio1"
+    assert sender._engine_queue_size(sid) == 0
+    assert sender._engine_queue_size("other-node-sid") is None
+
+    fake.server.eio.sockets["eio1"].queue.put("packet")
+    assert sender._engine_queue_size(sid) == 1
+
+
+def test_second_frame_waits_while_the_first_is_queued():
+    fake = FakeSocketIO()
+    sid = connect(fake, "eio1")
+    sender = LatestOnlySender(fake)
+    sender._ensure_flusher = lambda: None
+
+    sender.send(sid, "current_track", {"n": 1})
+    fake.server.eio.sockets["eio1"].queue.put("packet")
+    sender.send(sid, "current_track", {"n": 2})
+
+    assert fake.emitted == [("current_track", sid)]
+    assert sender._pending_frames_metric() == {(): 1}
+    assert sender._outstanding_bytes_metric() == {(): FrameSize({"n": 1}).bytes}
@@ -0,0 +1,146 @@
+# backend/tests/test_token_manager.py
+
+import threading
+import time
+
+import pytest
+
+from auth.token_manager import TokenManager
+
+
+class SlowRefresh:
+    """refresh_fn de mentira que tarda lo suficiente para que las peticiones se solapen"""
+
+    def __init__(self, delay_s=0.2):
+        self.calls = 0
+        self.delay_s = delay_s
+        self._lock = threading.Lock()
+
+    def __call__(self, refresh_token):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        time.sleep(self.delay_s)
+        return {"access_token": f"new-{n}", "expires_in": 3600}
+
+
+@pytest.fixture
+def refresh_fn():
+    return SlowRefresh()
+
+
+@pytest.fixture
+def manager(refresh_fn):
+    tm = TokenManager(refresh_fn=refresh_fn)
+    # Sin hilo de refresco proactivo en los tests
+    tm._ensure_refresher = lambda: None
+    return tm
+
+
+def test_concurrent_refreshes_share_one_call(manager, refresh_fn):
+    results = []
+    start = threading.Barrier(5)
+
+    def worker():
+        start.wait()
+        results.append(manager.refresh("rt"))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert refresh_fn.calls == 1
+    assert [r["access_token"] for r in results] == ["new-1"] * 5
+
+
+def test_recent_refresh_is_reused(manager, refresh_fn):
+    first = manager.refresh("rt")
+    second = manager.refresh("rt")
+
+    assert refresh_fn.calls == 1
+    assert second is first
+
+
+def test_refresh_stores_tokens_for_known_user(manager):
+    manager.store_tokens("user", {"access_token": "old", "refresh_token": "rt", "expires_in": 3600})
+
+    manager.refresh("rt")
+
+    assert manager.get_access_token("user") == "new-1"
+
+
+def test_listeners_get_the_new_token(manager):
+    seen = []
+    manager.add_listener(lambda user_id, token, previous: seen.append((user_id, token, previous)))
+    manager.store_tokens("user", {"access_token": "a", "expires_in": 3600})
+    manager.store_tokens("user", {"access_token": "b", "expires_in": 3600})
+
+    assert seen == [("user", "b", "a")]
+
+
+def test_fresh_token_for_only_swaps_current_or_unexpired_tokens(manager):
+    manager.store_tokens("user", {"access_token": "old", "refresh_token": "rt", "expires_in": 3600})
+    manager.store_tokens("user", {"access_token": "current", "expires_in": 3600})
+
+    assert manager.fresh_token_for("current") == "current"
+    # Un token anterior que aún no ha caducado: el cliente va por detrás de un refresh
+    assert manager.fresh_token_for("old") == "current"
+    # Desconocido: se deja tal cual, Spotify decide
+    assert manager.fresh_token_for("unknown") == "unknown"
+
+    manager._token_users["old"] = ("user", time.time() - 1)
+    assert manager.fresh_token_for("old") is None
+
+
+def test_idle_users_are_forgotten(manager):
+    manager.store_tokens("user", {"access_token": "a", "refresh_token": "rt", "expires_in": 3600})
+    manager.IDLE_TTL_S = 60
+    manager._users["user"]["last_seen"] -= 120
+
+    assert manager.evict_idle() == ["user"]
+    assert manager.get_access_token("user") is None
+    assert manager.user_for_refresh_token("rt") is None
+    # Ya no se cambia por nada: va tal cual a Spotify
+    assert manager.fresh_token_for("a") == "a"
+
+
+def test_activity_keeps_users(manager):
+    manager.store_tokens("user", {"access_token": "a", "expires_in": 3600})
+    manager.IDLE_TTL_S = 60
+    manager._users["user"]["last_seen"] -= 120
+
+    manager.fresh_token_for("a")
+
+    assert manager.evict_idle() == []
+
+
+def test_remove_user(manager):
+    manager.store_tokens("user", {"access_token": "a", "refresh_token": "rt", "expires_in": 3600})
+    manager.store_tokens("other", {"access_token": "b", "expires_in": 3600})
+
+    manager.remove_user("user")
+
+    assert manager.get_access_token("user") is None
+    assert "a" not in manager._token_users
+    assert manager.get_access_token("other") == "b"
+
+
+def test_unknown_expiry_is_refreshed_right_away(manager, refresh_fn):
+    # El cliente registra el token por websocket sin expires_in
+    manager.store_tokens("user", {"access_token": "a", "refresh_token": "rt"})
+
+    assert manager.get_access_token("user") == "new-1"
+    assert refresh_fn.calls == 1
+    # Con la caducidad ya conocida no se vuelve a refrescar
+    assert manager.get_access_token("user") == "new-1"
+    assert refresh_fn.calls == 1
+
+
+def test_unknown_expiry_without_refresh_token_is_kept(manager, refresh_fn):
+    manager.store_tokens("user", {"access_token": "a"})
+
+    # Sin forma de refrescar, el token va tal cual: Spotify decide
+    assert manager.get_access_token("user") == "a"
+    assert refresh_fn.calls == 0
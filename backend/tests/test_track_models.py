@@ -0,0 +1,108 @@
+# backend/tests/test_track_models.py
+
+import pytest
+
+from utils.shared_cache import TieredCache, SQLiteCacheBackend, encode_value, decode_value
+from utils.track_models import AudioFeatures, AudioAnalysis, Palette
+
+FEATURES = {
+    "danceability": 0.62, "energy": 0.81, "key": 5, "loudness": -5.3, "mode": 0,
+    "speechiness": 0.04, "acousticness": 0.01, "instrumentalness": 0.0, "liveness": 0.12,
+    "valence": 0.4, "tempo": 128.02, "type": "audio_features", "id": "track1",
+    "uri": "spotify:track:track1", "track_href": "https://api.spotify.com/v1/tracks/track1",
+    "analysis_url": "https://api.spotify.com/v1/audio-analysis/track1",
+    "duration_ms": 201000, "time_signature": 4,
+}
+
+
+def make_analysis(n_beats=16):
+    beats = [{"start": i * 0.5, "duration": 0.5, "confidence": 0.8} for i in range(n_beats)]
+    return {
+        "meta": {"analyzer_version": "4.0.0", "status_code": 0},
+        "track": {"duration": n_beats * 0.5, "tempo": 120.0, "key": 5, "mode": 1},
+        "bars": beats[::4],
+        "beats": beats,
+        "tatums": beats,
+        "sections": [{"start": 0.0, "duration": n_beats * 0.5, "confidence": 1.0, "loudness": -6.0,
+                      "tempo": 120.0, "tempo_confidence": 0.9, "key": 5, "key_confidence": 0.5,
+                      "mode": 1, "mode_confidence": 0.6, "time_signature": 4,
+                      "time_signature_confidence": 1.0}],
+        "segments": [{"start": i * 0.5, "duration": 0.5, "confidence": 0.7, "loudness_start": -20.0,
+                      "loudness_max": -8.5, "loudness_max_time": 0.1, "loudness_end": 0.0,
+                      "pitches": [0.1 * (j + 1) for j in range(12)],
+                      "timbre": [float(j - 6) for j in range(12)]} for i in range(n_beats)],
+    }
+
+
+@pytest.fixture(scope="module")
+def palette_result():
+    from PIL import Image
+    from utils.album_color_extractor import get_color_extractor
+
+    img = Image.new("RGB", (64, 64), (200, 40, 30))
+    img.paste((20, 60, 180), (0, 0, 32, 64))
+    return get_color_extractor().build_palette(img, fast=True)
+
+
+def roundtrip(value):
+    return decode_value(encode_value(value))
+
+
+def test_audio_features_roundtrip():
+    features = AudioFeatures(FEATURES)
+
+    restored = roundtrip(features)
+
+    assert isinstance(restored, AudioFeatures)
+    assert restored.to_json() == FEATURES
+    assert list(restored.to_json()) == list(FEATURES)
+
+
+def test_audio_features_defaults():
+    partial = AudioFeatures({"energy": 0.9})
+
+    assert partial.get("tempo") is None
+    assert "tempo" not in partial
+    assert partial.filled()["tempo"] == AudioFeatures.DEFAULTS["tempo"]
+    assert partial.filled()["energy"] == 0.9
+    assert roundtrip(partial).to_json() == {"energy": 0.9}
+
+
+def test_audio_analysis_roundtrip():
+    raw = make_analysis()
+    analysis = AudioAnalysis.from_json(raw)
+
+    assert analysis.to_json() == raw
+    restored = roundtrip(analysis)
+    assert isinstance(restored, AudioAnalysis)
+    assert restored.to_json() == raw
+    assert restored.count("beats") == 16
+    assert restored.column("beats", "start")[:3] == [0.0, 0.5, 1.0]
+
+
+def test_palette_roundtrip(palette_result):
+    palette = Palette.from_result(palette_result)
+
+    assert palette is not None
+    restored = roundtrip(palette)
+    assert isinstance(restored, Palette)
+    assert restored.to_json() == palette.to_json()
+
+
+def test_incomplete_palette_is_not_packed(palette_result):
+    broken = dict(palette_result)
+    del broken["contrast_ratio"]
+
+    assert Palette.from_result(broken) is None
+
+
+def test_models_survive_the_l2(tmp_path):
+    cache = TieredCache("codec_l2", l2=SQLiteCacheBackend(str(tmp_path / "cache.db")))
+    cache.set_many({"features": AudioFeatures(FEATURES), "analysis": AudioAnalysis.from_json(make_analysis())})
+
+    # Sin L1: lo que vuelve viene decodificado del L2
+    cache.clear_local()
+    found = cache.get_many(["features", "analysis"])
+
+    assert found["features"].to_json() == FEATURES
+    assert found["analysis"].to_json() == make_analysis()
@@ -0,0 +1,352 @@
+# backend/tools/benchmark.py
+
+"""
+Suite de benchmarks del pipeline de la canción actual, sin conexión: todo va
+contra el emulador local de Spotify (tools/spotify_emulator.py) levantado en
+el mismo proceso.
+
+Casos:
+- current_track:   /api/current-track con caches fríos y calientes
+                   (latencia y throughput, secuencial y concurrente)
+- stages:          desglose por etapa de get_current_track_enhanced (histogramas
+                   de /metrics: llamadas a Spotify, descarga, cuantización...)
+- quantizers:      extract_dominant_colors_kmeans frente a alternativas, por tamaño
+- serialization:   _convert_numpy_types + JSON de análisis grandes
+
+Uso (desde backend/):
+    python -m tools.benchmark --out bench.json
+    python -m tools.benchmark --only quantizers,serialization --quick
+    python -m tools.benchmark --out new.json --compare bench.json --threshold 15
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List
+
+# Caches solo en proceso: los resultados no dependen de un Redis / SQLite externo
+os.environ["CACHE_BACKEND_URL"] = "memory://"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES = ["current_track", "stages", "quantizers", "serialization"]
+
+
+# ========================= Utilidades ==========================
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def summarize_ms(samples_s: List[float]) -> Dict[str, float]:
+    values = sorted(s * 1000 for s in samples_s)
+    return {
+        "n": len(values),
+        "min_ms": round(values[0], 3),
+        "p50_ms": round(_percentile(values, 0.50), 3),
+        "p95_ms": round(_percentile(values, 0.95), 3),
+        "p99_ms": round(_percentile(values, 0.99), 3),
+        "mean_ms": round(statistics.fmean(values), 3),
+    }
+
+
+def measure(fn: Callable[[], Any], repeat: int, warmup: int = 1, before: Callable[[], Any] | None = None):
+    """Ejecuta fn `repeat` veces (más `warmup` descartadas) y resume las latencias"""
+    for _ in range(warmup):
+        if before:
+            before()
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize_ms(samples)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+class BenchEnv:
+    """Emulador + app + servicio apuntando a él"""
+
+    def __init__(self, emulator_config: Dict[str, Any] | None = None):
+        from tools.spotify_emulator import start_emulator_thread
+
+        self.emulator_url, self.emulator = start_emulator_thread(emulator_config or {})
+
+        import app as backend_app
+        from services.spotify_service import get_spotify_service
+        from utils.album_color_extractor import get_color_extractor
+
+        self.app = backend_app
+        self.service = get_spotify_service()
+        self.service.BASE_URL = f"{self.emulator_url}/v1"
+        self.extractor = get_color_extractor()
+        self.client = backend_app.app.test_client()
+
+    def clear_caches(self) -> None:
+        from utils.shared_cache import iter_caches
+        for cache in iter_caches():
+            cache.clear_local()
+
+    def close(self) -> None:
+        self.emulator.shutdown()
+
+
+# ========================= Casos ==========================
+def bench_current_track(env: BenchEnv, quick: bool) -> Dict[str, Any]:
+    repeat = 5 if quick else 20
+    headers = {"Authorization": "Bearer bench-user-1"}
+
+    def request_once(token_headers=headers):
+        response = env.client.get("/api/current-track", headers=token_headers)
+        assert response.status_code == 200, response.status_code
+
+    cold = measure(request_once, repeat, warmup=1, before=env.clear_caches)
+    warm = measure(request_once, repeat * 5, warmup=2)
+
+    # Throughput con varios usuarios a la vez (caches calientes)
+    concurrency = 4 if quick else 16
+    total = concurrency * (5 if quick else 20)
+    users = [{"Authorization": f"Bearer bench-user-{i}"} for i in range(concurrency)]
+    for user in users:
+        request_once(user)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda i: request_once(users[i % concurrency]), range(total)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "cold": cold,
+        "warm": warm,
+        "concurrent": {"concurrency": concurrency, "requests": total,
+                       "throughput_rps": round(total / elapsed, 2)},
+    }
+
+
+def bench_stages(env: BenchEnv, quick: bool) -> Dict[str, Any]:
+    """Tiempo medio por etapa en N llamadas frías a get_current_track_enhanced"""
+    from utils.metrics import STAGE_LATENCY, UPSTREAM_LATENCY
+
+    repeat = 3 if quick else 10
+    before_stage, before_upstream = STAGE_LATENCY.snapshot(), UPSTREAM_LATENCY.snapshot()
+    total = measure(lambda: env.service.get_current_track_enhanced("bench-stages"), repeat,
+                    warmup=0, before=env.clear_caches)
+
+    def deltas(histogram, before) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for key, (total_s, count) in histogram.snapshot().items():
+            prev_sum, prev_count = before.get(key, (0.0, 0))
+            calls = count - prev_count
+            if calls:
+                out[key[0]] = {"calls_per_run": round(calls / repeat, 2),
+                               "mean_ms": round((total_s - prev_sum) / calls * 1000, 3)}
+        return out
+
+    return {"total": total, "stages": deltas(STAGE_LATENCY, before_stage),
+            "upstream": deltas(UPSTREAM_LATENCY, before_upstream)}
+
+
+def _quantizers(extractor) -> Dict[str, Callable]:
+    import numpy as np
+    from PIL import Image
+
+    def pil_quantize(method):
+        def run(img, n_colors=8):
+            small = img.resize((150, 150))
+            quantized = small.quantize(colors=n_colors, method=method)
+            palette = quantized.getpalette()[: n_colors * 3]
+            counts = sorted(quantized.getcolors(), reverse=True)
+            return [tuple(palette[i * 3:i * 3 + 3]) for _, i in counts]
+        return run
+
+    def histogram_bins(img, n_colors=8):
+        # 4 bits por canal: cuenta cubos de color y se queda con los más poblados
+        pixels = np.asarray(img.resize((150, 150))).reshape(-1, 3) >> 4
+        codes = (pixels[:, 0].astype(np.int32) << 8) | (pixels[:, 1] << 4) | pixels[:, 2]
+        counts = np.bincount(codes, minlength=4096)
+        top = np.argsort(counts)[::-1][:n_colors]
+        return [(int(c >> 8) * 16 + 8, int((c >> 4) & 15) * 16 + 8, int(c & 15) * 16 + 8) for c in top]
+
+    def minibatch_kmeans(img, n_colors=8):
+        from sklearn.cluster import MiniBatchKMeans
+        pixels = np.asarray(img.resize((150, 150))).reshape(-1, 3)
+        model = MiniBatchKMeans(n_clusters=n_colors, n_init=3, random_state=42, batch_size=2048).fit(pixels)
+        return [tuple(int(v) for v in c) for c in model.cluster_centers_]
+
+    return {
+        "kmeans_sklearn (actual)": extractor.extract_dominant_colors_kmeans,
+        "minibatch_kmeans": minibatch_kmeans,
+        "pil_median_cut": pil_quantize(Image.Quantize.MEDIANCUT),
+        "pil_fast_octree": pil_quantize(Image.Quantize.FASTOCTREE),
+        "numpy_histogram": histogram_bins,
+    }
+
+
+def bench_quantizers(env: BenchEnv, quick: bool) -> Dict[str, Any]:
+    import io
+    from PIL import Image
+    from tools.spotify_emulator import render_cover
+
+    sizes = [64, 300, 640] if quick else [64, 150, 300, 640, 1280]
+    repeat = 2 if quick else 5
+    album_id = "bench-cover"
+    results: Dict[str, Dict[str, Any]] = {}
+
+    for name, quantize in _quantizers(env.extractor).items():
+        results[name] = {}
+        for size in sizes:
+            img = Image.open(io.BytesIO(render_cover(album_id, size))).convert("RGB")
+            results[name][str(size)] = measure(lambda: quantize(img, 8), repeat, warmup=1)
+    return results
+
+
+def bench_serialization(env: BenchEnv, quick: bool) -> Dict[str, Any]:
+    import numpy as np
+    from tools.spotify_emulator import SyntheticCatalog
+
+    catalog = SyntheticCatalog(n_tracks=50)
+    # La canción más larga del catálogo: el peor caso de tamaño de análisis
+    track = max(catalog.tracks, key=lambda t: t["duration_ms"])
+    analysis = catalog.audio_analysis(track["id"])
+
+    # Mismo análisis con tipos NumPy dentro (como sale de los cálculos del servicio)
+    numpy_analysis = {
+        key: [{k: (np.float64(v) if isinstance(v, float) else np.asarray(v) if isinstance(v, list) else v)
+               for k, v in item.items()} for item in value] if isinstance(value, list) else value
+        for key, value in analysis.items()
+    }
+
+    repeat = 5 if quick else 20
+    encoder = env.app.NumpyJSONEncoder
+    converted = env.service._convert_numpy_types(numpy_analysis)
+    return {
+        "segments": len(analysis["segments"]),
+        "json_bytes": len(json.dumps(analysis)),
+        "convert_numpy_types": measure(lambda: env.service._convert_numpy_types(numpy_analysis), repeat),
+        "json_dumps_plain": measure(lambda: json.dumps(analysis), repeat),
+        "json_dumps_converted": measure(lambda: json.dumps(converted), repeat),
+        "json_dumps_numpy_encoder": measure(lambda: json.dumps(numpy_analysis, cls=encoder), repeat),
+    }
+
+
+BENCHMARKS = {
+    "current_track": bench_current_track,
+    "stages": bench_stages,
+    "quantizers": bench_quantizers,
+    "serialization": bench_serialization,
+}
+
+
+# ========================= Informe ==========================
+def run_suite(cases: List[str], quick: bool = False) -> Dict[str, Any]:
+    env = BenchEnv()
+    results: Dict[str, Any] = {}
+    try:
+        for case in cases:
+            print(f"⏱️  {case}...")
+            started = time.perf_counter()
+            results[case] = BENCHMARKS[case](env, quick)
+            print(f"   ✅ {case} en {time.perf_counter() - started:.1f}s")
+    finally:
+        env.close()
+
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def _flatten_latencies(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """{ "current_track.warm": p50_ms, ... } para comparar dos ejecuciones"""
+    flat: Dict[str, float] = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            if "p50_ms" in value:
+                flat[path] = value["p50_ms"]
+            elif "mean_ms" in value and "calls_per_run" in value:
+                flat[path] = value["mean_ms"]
+            else:
+                flat.update(_flatten_latencies(value, path))
+    return flat
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold_pct: float) -> List[Dict[str, Any]]:
+    """Casos cuya latencia empeora más de threshold_pct respecto a la referencia"""
+    now = _flatten_latencies(current["results"])
+    before = _flatten_latencies(baseline.get("results", {}))
+    regressions = []
+    for key, value in sorted(now.items()):
+        previous = before.get(key)
+        if not previous:
+            continue
+        change = (value - previous) / previous * 100
+        if change > threshold_pct:
+            regressions.append({"case": key, "baseline_ms": previous, "current_ms": value,
+                                "change_pct": round(change, 1)})
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks offline del pipeline de la canción actual")
+    parser.add_argument("--only", help=f"Casos separados por comas ({', '.join(CASES)})")
+    parser.add_argument("--quick", action="store_true", help="Menos repeticiones (humo / CI)")
+    parser.add_argument("--out", help="Guardar los resultados en este JSON")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument("--threshold", type=float, default=20.0, help="%% de empeoramiento que cuenta como regresión")
+    args = parser.parse_args(argv)
+
+    cases = [c.strip() for c in args.only.split(",")] if args.only else CASES
+    unknown = [c for c in cases if c not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Casos desconocidos: {', '.join(unknown)}")
+
+    report = run_suite(cases, args.quick)
+    print(json.dumps(report["results"], indent=2))
+
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"💾 Resultados guardados en {args.out}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(report, json.load(fh), args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regresiones (> {args.threshold}%):")
+            for row in regressions:
+                print(f"   {row['case']}: {row['baseline_ms']} → {row['current_ms']} ms (+{row['change_pct']}%)")
+            return 1
+        print("✅ Sin regresiones respecto a la referencia")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
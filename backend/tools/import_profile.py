@@ -0,0 +1,133 @@
+# backend/tools/import_profile.py
+
+"""
+Informe de tiempo de importación del backend.
+Lanza procesos limpios con `python -X importtime`, mide el arranque en frío
+de un módulo (por defecto `app`) y lista los módulos más caros y qué
+dependencias pesadas quedan cargadas tras importarlo.
+
+Uso (desde backend/):
+    python -m tools.import_profile
+    python -m tools.import_profile --module app --runs 5 --top 15 --json report.json
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, Any, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["numpy", "sklearn", "PIL", "scipy"]
+
+_PROBE = """
+import sys, time, json
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"wall_s": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _run_once(module: str) -> Dict[str, Any]:
+    code = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Fallo importando {module}:\n{proc.stderr[-2000:]}")
+
+    probe = json.loads(proc.stdout.strip().splitlines()[-1])
+    probe["imports"] = _parse_importtime(proc.stderr)
+    return probe
+
+
+def _parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Líneas 'import time: self [us] | cumulative | imported package'"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|").split("|")]
+            rows.append({"module": name, "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+        except ValueError:
+            continue
+    return rows
+
+
+def build_report(module: str = "app", runs: int = 3, top: int = 15) -> Dict[str, Any]:
+    results = [_run_once(module) for _ in range(max(1, runs))]
+    wall = [r["wall_s"] * 1000 for r in results]
+
+    # Top de módulos por tiempo acumulado (del último run; los anteriores calientan la caché del SO)
+    imports = sorted(results[-1]["imports"], key=lambda r: -r["cumulative_us"])
+    by_package: Dict[str, int] = {}
+    for row in results[-1]["imports"]:
+        package = row["module"].split(".")[0]
+        by_package[package] = by_package.get(package, 0) + row["self_us"]
+
+    return {
+        "module": module,
+        "python": sys.version.split()[0],
+        "runs": len(results),
+        "wall_ms": {
+            "min": round(min(wall), 1),
+            "median": round(statistics.median(wall), 1),
+            "max": round(max(wall), 1),
+        },
+        "heavy_modules_loaded": results[-1]["loaded"],
+        "top_cumulative": [
+            {"module": r["module"].strip(), "cumulative_ms": round(r["cumulative_us"] / 1000, 1)}
+            for r in imports[:top]
+        ],
+        "top_packages_self": [
+            {"package": name, "self_ms": round(us / 1000, 1)}
+            for name, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]
+        ],
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"📦 Import de '{report['module']}' (Python {report['python']}, {report['runs']} runs)")
+    wall = report["wall_ms"]
+    print(f"⏱️  Arranque en frío: min {wall['min']}ms | mediana {wall['median']}ms | max {wall['max']}ms")
+    loaded = report["heavy_modules_loaded"]
+    print(f"🏋️  Dependencias pesadas cargadas: {', '.join(loaded) if loaded else 'ninguna ✓'}")
+    print("=" * 50)
+    print("Top módulos (tiempo acumulado):")
+    for row in report["top_cumulative"]:
+        print(f"  {row['cumulative_ms']:>9.1f} ms  {row['module']}")
+    print("Top paquetes (tiempo propio):")
+    for row in report["top_packages_self"]:
+        print(f"  {row['self_ms']:>9.1f} ms  {row['package']}")
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Informe de tiempo de importación")
+    parser.add_argument("--module", default="app", help="Módulo a importar (relativo a backend/)")
+    parser.add_argument("--runs", type=int, default=3, help="Procesos limpios a medir")
+    parser.add_argument("--top", type=int, default=15, help="Filas en los rankings")
+    parser.add_argument("--json", dest="json_path", help="Guardar el informe en este fichero JSON")
+    args = parser.parse_args(argv)
+
+    report = build_report(args.module, args.runs, args.top)
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"💾 Informe guardado en {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
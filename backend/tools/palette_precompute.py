@@ -0,0 +1,255 @@
+# backend/tools/palette_precompute.py
+
+"""
+Precalcula paletas de portadas fuera de horas punta, con todos los núcleos.
+
+Entradas:
+    --images DIR   imágenes locales (jpg, png, webp...; recorre subcarpetas)
+    --urls FILE    una entrada por línea: URL de imagen o id de álbum de
+                   Spotify (las portadas de los álbumes se piden por lotes
+                   con --token / SPOTIFY_ACCESS_TOKEN). Líneas vacías y las
+                   que empiezan por # se ignoran.
+
+La descarga, decodificación y cuantización (K-Means) van en un pool de
+procesos; el proceso principal es el único que escribe en el almacén
+persistente de paletas (el L2 de utils/shared_cache.py: --store o
+CACHE_BACKEND_URL, sqlite:// o redis://), a través del mismo índice por
+portada que usa el servicio (utils/artwork_index.py).
+
+Cada paleta se guarda en cuanto termina: si se interrumpe, volver a lanzar
+el mismo comando continúa donde se quedó. Las entradas que ya tienen paleta
+(por URL, álbum o ruta) se saltan sin descargar nada, y una portada que ya
+estaba con otra URL se reutiliza sin guardarla dos veces.
+
+Uso (desde backend/):
+    python -m tools.palette_precompute --urls catalog.txt --store sqlite:///data/cache.db
+    python -m tools.palette_precompute --images ./covers --workers 8
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import get_context
+from typing import Dict, Any, List, Iterator
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+# Los ids de Spotify son base62 de 22 caracteres
+SPOTIFY_ID_LENGTH = 22
+PROGRESS_EVERY_S = 2.0
+
+
+# ========================= Entradas ==========================
+def iter_image_files(directory: str) -> Iterator[Dict[str, Any]]:
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                path = os.path.abspath(os.path.join(root, name))
+                # La ruta hace de URL en el índice (file://...): así se reanuda
+                yield {"path": path, "image_url": "file://" + path, "album_id": None}
+
+
+def _is_spotify_id(line: str) -> bool:
+    return len(line) == SPOTIFY_ID_LENGTH and line.isalnum()
+
+
+def read_url_file(path: str) -> tuple:
+    """(URLs de imagen, ids de álbum) en el orden del fichero"""
+    urls, album_ids = [], []
+    with open(path) as fh:
+        for raw in fh:
+            line = raw.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("spotify:album:"):
+                line = line.rsplit(":", 1)[1]
+            if _is_spotify_id(line):
+                album_ids.append(line)
+            else:
+                urls.append(line)
+    return urls, album_ids
+
+
+def resolve_albums(album_ids: List[str], access_token: str) -> tuple:
+    """Portada más grande de cada álbum (por lotes de 20); devuelve (trabajos, ids sin portada)"""
+    from services.spotify_service import get_spotify_service
+
+    albums = get_spotify_service().get_albums_bulk(album_ids, access_token)
+    jobs, missing = [], []
+    for album_id in album_ids:
+        images = (albums.get(album_id) or {}).get("images") or []
+        if images and images[0].get("url"):
+            jobs.append({"path": None, "image_url": images[0]["url"], "album_id": album_id})
+        else:
+            missing.append(album_id)
+    return jobs, missing
+
+
+# ========================= Pool ==========================
+def _init_worker() -> None:
+    # Los procesos del pool solo cuantizan: sin L2 (el principal es el único que escribe)
+    os.environ["CACHE_BACKEND_URL"] = "memory://"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def _quantize(job: Dict[str, Any]) -> Dict[str, Any]:
+    """En un proceso del pool: descarga / abre, decodifica y cuantiza"""
+    from PIL import Image
+    from utils.album_color_extractor import get_color_extractor
+    from utils.artwork_index import Fingerprint
+
+    extractor = get_color_extractor()
+    started = time.perf_counter()
+    try:
+        if job["path"]:
+            img = Image.open(job["path"]).convert("RGB")
+        else:
+            img = extractor.download_image(job["image_url"])
+            if img is None:
+                return dict(job, error="download failed")
+        return dict(job, fingerprint=Fingerprint(img), palette=extractor.build_palette(img),
+                    seconds=time.perf_counter() - started)
+    except Exception as e:
+        return dict(job, error=str(e))
+
+
+# ========================= Ejecución ==========================
+class Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.counts = {"computed": 0, "deduplicated": 0, "skipped": 0, "failed": 0}
+        self.started = time.monotonic()
+        self._last_print = 0.0
+
+    @property
+    def done(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, outcome: str) -> None:
+        self.counts[outcome] += 1
+        now = time.monotonic()
+        if now - self._last_print >= PROGRESS_EVERY_S:
+            self._last_print = now
+            self.print()
+
+    def print(self) -> None:
+        elapsed = time.monotonic() - self.started
+        processed = self.done - self.counts["skipped"]
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "?"
+        pct = 100.0 * self.done / self.total if self.total else 100.0
+        details = " · ".join(f"{k} {v}" for k, v in self.counts.items())
+        print(f"🎨 {self.done}/{self.total} ({pct:.0f}%) · {rate:.1f}/s · ETA {eta} · {details}", flush=True)
+
+
+def _save(extractor, result: Dict[str, Any]) -> str:
+    """En el proceso principal: guarda la paleta (o reutiliza la de la misma portada)"""
+    fingerprint = result["fingerprint"]
+    art_id = extractor.artwork.match(fingerprint)
+    if art_id is not None and extractor.palette_for_artwork(art_id) is not None:
+        extractor.artwork.remember(art_id, result["image_url"], result["album_id"])
+        return "deduplicated"
+    extractor.index_palette(fingerprint, result["palette"], result["image_url"], result["album_id"],
+                            art_id=art_id)
+    return "computed"
+
+
+def run(jobs: List[Dict[str, Any]], workers: int) -> Dict[str, int]:
+    from utils.album_color_extractor import get_color_extractor
+
+    extractor = get_color_extractor()
+    progress = Progress(len(jobs))
+
+    # Reanudar: lo que ya tiene paleta completa no se vuelve a descargar
+    pending = []
+    for job in jobs:
+        if extractor.cached_palette(job["image_url"], job["album_id"]) is not None:
+            progress.add("skipped")
+        else:
+            pending.append(job)
+    if progress.counts["skipped"]:
+        print(f"⏭️  {progress.counts['skipped']} entradas ya tenían paleta")
+
+    # Como mucho 2 trabajos en vuelo por proceso: la cola no crece con el catálogo
+    queue = iter(pending)
+    in_flight = set()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                             initializer=_init_worker) as pool:
+        try:
+            while True:
+                while len(in_flight) < 2 * workers:
+                    job = next(queue, None)
+                    if job is None:
+                        break
+                    in_flight.add(pool.submit(_quantize, job))
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    if "error" in result:
+                        print(f"⚠️ {result['image_url']}: {result['error']}")
+                        progress.add("failed")
+                    else:
+                        progress.add(_save(extractor, result))
+        except KeyboardInterrupt:
+            for future in in_flight:
+                future.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+            progress.print()
+            print("⏸️  Interrumpido: lo guardado se conserva; relanza el mismo comando para continuar")
+            raise
+
+    progress.print()
+    return progress.counts
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Precalcula paletas de portadas en el almacén persistente")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--images", help="Carpeta de imágenes (recorre subcarpetas)")
+    source.add_argument("--urls", help="Fichero con URLs de imagen o ids de álbum, uno por línea")
+    parser.add_argument("--store", default=os.getenv("CACHE_BACKEND_URL"),
+                        help="Almacén de paletas: sqlite:///ruta/db o redis://... (por defecto CACHE_BACKEND_URL)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Procesos del pool")
+    parser.add_argument("--token", default=os.getenv("SPOTIFY_ACCESS_TOKEN"),
+                        help="Token de la Web API para resolver ids de álbum")
+    args = parser.parse_args(argv)
+
+    if not args.store or args.store.startswith("memory://"):
+        parser.error("Hace falta un almacén persistente: --store sqlite:///... o redis://... (o CACHE_BACKEND_URL)")
+    # Antes de importar el extractor: sus caches se crean contra este backend
+    os.environ["CACHE_BACKEND_URL"] = args.store
+
+    if args.images:
+        if not os.path.isdir(args.images):
+            parser.error(f"No existe la carpeta {args.images}")
+        jobs = list(iter_image_files(args.images))
+    else:
+        urls, album_ids = read_url_file(args.urls)
+        jobs = [{"path": None, "image_url": url, "album_id": None} for url in urls]
+        if album_ids:
+            if not args.token:
+                parser.error(f"{len(album_ids)} ids de álbum necesitan --token o SPOTIFY_ACCESS_TOKEN")
+            album_jobs, missing = resolve_albums(album_ids, args.token)
+            jobs += album_jobs
+            if missing:
+                print(f"⚠️ {len(missing)} álbumes sin portada o no encontrados (p.ej. {missing[0]})")
+
+    print(f"🚀 {len(jobs)} portadas · {args.workers} procesos · almacén {args.store}")
+    try:
+        counts = run(jobs, max(1, args.workers))
+    except KeyboardInterrupt:
+        return 130
+    print(f"✅ Hecho: {counts['computed']} calculadas, {counts['deduplicated']} reutilizadas, "
+          f"{counts['skipped']} ya estaban, {counts['failed']} fallidas")
+    return 1 if counts["failed"] and not (counts["computed"] or counts["deduplicated"] or counts["skipped"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
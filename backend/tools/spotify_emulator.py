@@ -0,0 +1,621 @@
+# backend/tools/spotify_emulator.py
+
+"""
+Emulador local de la Web API de Spotify (y de accounts.spotify.com) para
+pruebas de carga y benchmarks sin tocar Spotify.
+
+Cubre lo que usan EnhancedSpotifyService y spotify_oauth:
+    GET  /v1/me, /v1/me/player/currently-playing, /v1/me/player/queue
+    GET  /v1/me/top/tracks, /v1/me/top/artists, /v1/me/player/recently-played
+    GET  /v1/audio-features?ids=, /v1/audio-features/<id>, /v1/audio-analysis/<id>
+    GET  /v1/artists?ids=, /v1/albums?ids=
+    GET  /authorize (redirige con ?code=), POST /api/token
+    GET  /images/<album_id>.jpg (portadas sintéticas)
+
+Los datos son sintéticos pero deterministas (semilla): cada token es un
+usuario que "escucha" una lista de canciones que avanza con el reloj real.
+
+Inyección de fallos y latencia (CLI o en caliente con POST /_emulator/config):
+    latency_ms / latency_dist (fixed | uniform | lognormal) / latency_sigma
+    error_429 (+ retry_after_s), error_403, error_404, error_500, timeout (+ timeout_s)
+    paths: { "/v1/audio-analysis": { "latency_ms": 300 } }   overrides por prefijo
+
+Uso (desde backend/):
+    python -m tools.spotify_emulator --port 8900 --latency-ms 60 --error-429 0.02
+    SPOTIFY_API_URL=http://127.0.0.1:8900/v1 SPOTIFY_ACCOUNTS_URL=http://127.0.0.1:8900 python app.py
+"""
+
+from __future__ import annotations
+
+import io
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from typing import Dict, Any, List
+
+from flask import Flask, request, jsonify, redirect, Response
+
+_BASE62 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+GENRES = ["indie pop", "synthwave", "latin", "reggaeton", "techno", "house", "jazz", "lo-fi",
+          "rock", "metal", "hip hop", "trap", "r&b", "soul", "classical", "flamenco", "k-pop", "ambient"]
+WORDS = ["Noche", "Luz", "Fuego", "Mar", "Ciudad", "Sueño", "Eco", "Cristal", "Neón", "Lluvia",
+         "Sol", "Norte", "Viento", "Azul", "Ritmo", "Camino", "Espejo", "Oro", "Humo", "Río"]
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "latency_ms": 0.0,
+    "latency_dist": "fixed",      # fixed | uniform | lognormal
+    "latency_sigma": 0.5,         # lognormal: sigma; uniform: ± fracción de latency_ms
+    "error_429": 0.0,
+    "retry_after_s": 1,
+    "error_403": 0.0,
+    "error_404": 0.0,
+    "error_500": 0.0,
+    "timeout": 0.0,               # probabilidad de colgar la respuesta timeout_s segundos
+    "timeout_s": 30.0,
+    "idle_ratio": 0.0,            # fracción de usuarios sin reproducción (204)
+    "track_duration_scale": 1.0,  # <1 para que las canciones cambien más a menudo
+    "paths": {},
+}
+
+
+def spotify_id(kind: str, n: int, seed: int) -> str:
+    """Id estable de 22 caracteres base62 (como los de Spotify)"""
+    value = int.from_bytes(hashlib.sha1(f"{seed}:{kind}:{n}".encode()).digest(), "big")
+    chars = []
+    for _ in range(22):
+        value, rem = divmod(value, 62)
+        chars.append(_BASE62[rem])
+    return "".join(chars)
+
+
+class SyntheticCatalog:
+    """Artistas, álbumes y canciones generados de forma determinista"""
+
+    def __init__(self, n_tracks: int = 500, seed: int = 7):
+        self.seed = seed
+        rng = random.Random(seed)
+        n_artists = max(10, n_tracks // 4)
+        n_albums = max(10, n_tracks // 3)
+
+        self.artists: List[Dict] = []
+        for i in range(n_artists):
+            self.artists.append({
+                "id": spotify_id("artist", i, seed),
+                "name": f"{rng.choice(WORDS)} {rng.choice(WORDS)}",
+                "genres": rng.sample(GENRES, rng.randint(1, 3)),
+                "popularity": rng.randint(5, 95),
+                "followers": {"href": None, "total": rng.randint(100, 5_000_000)},
+                "type": "artist",
+            })
+
+        self.albums: List[Dict] = []
+        for i in range(n_albums):
+            artist = self.artists[rng.randrange(n_artists)]
+            self.albums.append({
+                "id": spotify_id("album", i, seed),
+                "name": f"{rng.choice(WORDS)} de {rng.choice(WORDS)}",
+                "release_date": f"{rng.randint(1970, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "artists": [{"id": artist["id"], "name": artist["name"], "type": "artist"}],
+                "album_type": "album",
+            })
+
+        self.tracks: List[Dict] = []
+        for i in range(n_tracks):
+            album_index = rng.randrange(n_albums)
+            album = self.albums[album_index]
+            main_artist = album["artists"][0]
+            featured = self.artists[rng.randrange(n_artists)]
+            artists = [main_artist] + ([{"id": featured["id"], "name": featured["name"], "type": "artist"}]
+                                       if rng.random() < 0.25 and featured["id"] != main_artist["id"] else [])
+            self.tracks.append({
+                "id": spotify_id("track", i, seed),
+                "name": f"{rng.choice(WORDS)} {rng.choice(WORDS).lower()}",
+                "duration_ms": rng.randint(120_000, 300_000),
+                "popularity": rng.randint(0, 100),
+                "explicit": rng.random() < 0.2,
+                "album_index": album_index,
+                "artists": artists,
+                "type": "track",
+            })
+
+        self.track_by_id = {t["id"]: t for t in self.tracks}
+        self.artist_by_id = {a["id"]: a for a in self.artists}
+        self.album_by_id = {a["id"]: a for a in self.albums}
+
+    def album_json(self, album: Dict, base_url: str) -> Dict:
+        images = [{"url": f"{base_url}/images/{album['id']}.jpg?size={size}", "height": size, "width": size}
+                  for size in (640, 300, 64)]
+        return dict(album, images=images)
+
+    def track_json(self, track: Dict, base_url: str, duration_scale: float = 1.0) -> Dict:
+        data = {k: v for k, v in track.items() if k != "album_index"}
+        data["duration_ms"] = int(track["duration_ms"] * duration_scale)
+        data["album"] = self.album_json(self.albums[track["album_index"]], base_url)
+        data["uri"] = f"spotify:track:{track['id']}"
+        return data
+
+    # ---------- Features / análisis ----------
+    def _rng_for(self, kind: str, track_id: str) -> random.Random:
+        return random.Random(f"{self.seed}:{kind}:{track_id}")
+
+    def audio_features(self, track_id: str) -> Dict | None:
+        track = self.track_by_id.get(track_id)
+        if track is None:
+            return None
+        rng = self._rng_for("features", track_id)
+        return {
+            "id": track_id,
+            "danceability": round(rng.random(), 3),
+            "energy": round(rng.random(), 3),
+            "key": rng.randint(0, 11),
+            "loudness": round(rng.uniform(-20, -2), 3),
+            "mode": rng.randint(0, 1),
+            "speechiness": round(rng.random() * 0.4, 4),
+            "acousticness": round(rng.random(), 4),
+            "instrumentalness": round(rng.random() ** 3, 4),
+            "liveness": round(rng.random() * 0.6, 4),
+            "valence": round(rng.random(), 3),
+            "tempo": round(rng.uniform(70, 180), 3),
+            "duration_ms": track["duration_ms"],
+            "time_signature": rng.choice([3, 4, 4, 4, 5]),
+            "type": "audio_features",
+        }
+
+    def audio_analysis(self, track_id: str) -> Dict | None:
+        """Análisis con el tamaño y la forma de los reales (cientos de segmentos)"""
+        features = self.audio_features(track_id)
+        if features is None:
+            return None
+        rng = self._rng_for("analysis", track_id)
+        duration = features["duration_ms"] / 1000
+        beat = 60.0 / features["tempo"]
+
+        def intervals(step: float, jitter: float = 0.0) -> List[Dict]:
+            items, start = [], 0.0
+            while start < duration:
+                length = step * (1 + rng.uniform(-jitter, jitter))
+                items.append({"start": round(start, 5), "duration": round(length, 5),
+                              "confidence": round(rng.random(), 3)})
+                start += length
+            return items
+
+        sections = []
+        start = 0.0
+        while start < duration:
+            length = min(duration - start, rng.uniform(15, 45))
+            sections.append({
+                "start": round(start, 5), "duration": round(length, 5), "confidence": round(rng.random(), 3),
+                "loudness": round(rng.uniform(-20, -3), 3), "tempo": features["tempo"],
+                "key": features["key"], "mode": features["mode"], "time_signature": features["time_signature"],
+            })
+            start += length
+
+        segments = []
+        start = 0.0
+        while start < duration:
+            length = rng.uniform(0.1, 0.45)
+            segments.append({
+                "start": round(start, 5), "duration": round(length, 5), "confidence": round(rng.random(), 3),
+                "loudness_start": round(rng.uniform(-40, -10), 3), "loudness_max": round(rng.uniform(-20, -2), 3),
+                "loudness_max_time": round(rng.uniform(0, length), 5),
+                "pitches": [round(rng.random(), 3) for _ in range(12)],
+                "timbre": [round(rng.uniform(-100, 100), 3) for _ in range(12)],
+            })
+            start += length
+
+        return {
+            "meta": {"analyzer_version": "emulator", "platform": "Linux", "status_code": 0},
+            "track": {"duration": duration, "tempo": features["tempo"], "key": features["key"],
+                      "mode": features["mode"], "loudness": features["loudness"],
+                      "time_signature": features["time_signature"]},
+            "bars": intervals(beat * features["time_signature"], 0.02),
+            "beats": intervals(beat, 0.02),
+            "tatums": intervals(beat / 2, 0.02),
+            "sections": sections,
+            "segments": segments,
+        }
+
+
+class PlaybackSimulator:
+    """Cada token es un usuario que escucha su propia lista en bucle, al ritmo del reloj"""
+
+    PLAYLIST_LEN = 40
+
+    def __init__(self, catalog: SyntheticCatalog):
+        self.catalog = catalog
+
+    def user_id(self, token: str) -> str:
+        return "emu-" + hashlib.sha256(token.encode()).hexdigest()[:10]
+
+    def _playlist(self, user_id: str) -> List[Dict]:
+        rng = random.Random(f"{self.catalog.seed}:playlist:{user_id}")
+        return [self.catalog.tracks[rng.randrange(len(self.catalog.tracks))] for _ in range(self.PLAYLIST_LEN)]
+
+    def state(self, token: str, duration_scale: float, now_ms: int | None = None) -> Dict:
+        """Canción actual, posición, instante en que empezó y siguientes en cola"""
+        user_id = self.user_id(token)
+        playlist = self._playlist(user_id)
+        durations = [max(1000, int(t["duration_ms"] * duration_scale)) for t in playlist]
+        total = sum(durations)
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        # Desfase por usuario para que no cambien todos a la vez
+        offset = int(hashlib.sha256(user_id.encode()).hexdigest()[:8], 16) % total
+        position = (now_ms + offset) % total
+
+        index = 0
+        while position >= durations[index]:
+            position -= durations[index]
+            index += 1
+
+        started_at_ms = now_ms - position
+        # Reproducciones anteriores: (canción, instante en que terminó), de la más reciente hacia atrás
+        history = []
+        finished_ms = started_at_ms
+        for k in range(1, len(playlist)):
+            history.append((playlist[(index - k) % len(playlist)], finished_ms))
+            finished_ms -= durations[(index - k) % len(playlist)]
+
+        return {
+            "user_id": user_id,
+            "track": playlist[index],
+            "progress_ms": position,
+            "started_at_ms": started_at_ms,
+            "queue": [playlist[(index + k) % len(playlist)] for k in range(1, 11)],
+            "history": history,
+        }
+
+
+# ========================= Portadas ==========================
+_image_cache: Dict[tuple, bytes] = {}
+_image_lock = threading.Lock()
+
+
+def render_cover(album_id: str, size: int) -> bytes:
+    """JPEG sintético: degradado + formas con colores derivados del id"""
+    key = (album_id, size)
+    with _image_lock:
+        if key in _image_cache:
+            return _image_cache[key]
+
+    from PIL import Image, ImageDraw
+
+    # Se dibuja siempre a 640 px y se escala: como en Spotify, los tamaños
+    # de una portada son la misma imagen
+    base = 640
+    rng = random.Random(album_id)
+    colors = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(4)]
+    img = Image.new("RGB", (base, base), colors[0])
+    draw = ImageDraw.Draw(img)
+    for y in range(0, base, base // 64):
+        t = y / base
+        color = tuple(int(colors[0][c] * (1 - t) + colors[1][c] * t) for c in range(3))
+        draw.rectangle([0, y, base, y + base // 64], fill=color)
+    for _ in range(6):
+        x, y = rng.randrange(base), rng.randrange(base)
+        r = rng.randint(base // 10, base // 3)
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=rng.choice(colors[2:]))
+    if size != base:
+        img = img.resize((size, size), Image.Resampling.LANCZOS)
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=85)
+    data = out.getvalue()
+    with _image_lock:
+        _image_cache[key] = data
+    return data
+
+
+# ========================= Servidor ==========================
+def create_emulator_app(config: Dict[str, Any] | None = None, n_tracks: int = 500, seed: int = 7) -> Flask:
+    app = Flask("spotify_emulator")
+    app.config["EMULATOR"] = dict(DEFAULT_CONFIG, **(config or {}))
+    catalog = SyntheticCatalog(n_tracks, seed)
+    playback = PlaybackSimulator(catalog)
+    stats: Dict[str, int] = {}
+    stats_lock = threading.Lock()
+    fault_rng = random.Random()
+
+    def settings() -> Dict[str, Any]:
+        cfg = app.config["EMULATOR"]
+        for prefix, override in cfg.get("paths", {}).items():
+            if request.path.startswith(prefix):
+                return dict(cfg, **override)
+        return cfg
+
+    def base_url() -> str:
+        return request.host_url.rstrip("/")
+
+    def bearer_token() -> str | None:
+        header = request.headers.get("Authorization", "")
+        return header[7:].strip() if header.startswith("Bearer ") else None
+
+    def error(status: int, message: str, headers: Dict | None = None):
+        return jsonify({"error": {"status": status, "message": message}}), status, headers or {}
+
+    @app.before_request
+    def inject_faults():
+        if request.path.startswith("/_emulator"):
+            return None
+        cfg = settings()
+
+        latency = float(cfg["latency_ms"])
+        if latency > 0:
+            if cfg["latency_dist"] == "lognormal":
+                latency = fault_rng.lognormvariate(math.log(latency), float(cfg["latency_sigma"]))
+            elif cfg["latency_dist"] == "uniform":
+                spread = latency * float(cfg["latency_sigma"])
+                latency = fault_rng.uniform(max(0.0, latency - spread), latency + spread)
+            time.sleep(latency / 1000)
+
+        roll = fault_rng.random()
+        for key, status in (("timeout", 0), ("error_429", 429), ("error_403", 403),
+                            ("error_404", 404), ("error_500", 500)):
+            probability = float(cfg.get(key) or 0)
+            if roll < probability:
+                if status == 0:
+                    time.sleep(float(cfg["timeout_s"]))
+                    return error(504, "Emulated timeout")
+                if status == 429:
+                    return error(429, "API rate limit exceeded", {"Retry-After": str(cfg["retry_after_s"])})
+                return error(status, "Emulated error")
+            roll -= probability
+
+        if request.path.startswith("/v1/") and not bearer_token():
+            return error(401, "No token provided")
+        return None
+
+    @app.after_request
+    def count(response):
+        key = f"{request.method} {request.url_rule.rule if request.url_rule else request.path} {response.status_code}"
+        with stats_lock:
+            stats[key] = stats.get(key, 0) + 1
+        return response
+
+    # ---------- Control del emulador ----------
+    @app.route("/_emulator/config", methods=["GET", "POST"])
+    def emulator_config():
+        if request.method == "POST":
+            app.config["EMULATOR"] = dict(app.config["EMULATOR"], **(request.get_json(silent=True) or {}))
+        return jsonify(app.config["EMULATOR"])
+
+    @app.route("/_emulator/stats")
+    def emulator_stats():
+        with stats_lock:
+            return jsonify(dict(stats))
+
+    @app.route("/_emulator/state")
+    def emulator_state():
+        """Lo que 'suena' para un token (referencia para medir frescura)"""
+        token = request.args.get("token", "")
+        state = playback.state(token, settings()["track_duration_scale"])
+        return jsonify({"user_id": state["user_id"], "track_id": state["track"]["id"],
+                        "started_at_ms": state["started_at_ms"], "progress_ms": state["progress_ms"]})
+
+    # ---------- Cuentas ----------
+    @app.route("/authorize")
+    def authorize():
+        redirect_uri = request.args.get("redirect_uri", "")
+        code = hashlib.sha256(f"{time.time()}:{random.random()}".encode()).hexdigest()[:24]
+        state = request.args.get("state")
+        target = f"{redirect_uri}?code={code}" + (f"&state={state}" if state else "")
+        return redirect(target)
+
+    @app.route("/api/token", methods=["POST"])
+    def token():
+        grant_type = request.form.get("grant_type")
+        if grant_type == "authorization_code":
+            seed_value = request.form.get("code", "")
+            refresh = "emu-refresh-" + hashlib.sha256(seed_value.encode()).hexdigest()[:24]
+        elif grant_type == "refresh_token":
+            refresh = request.form.get("refresh_token", "")
+            if not refresh:
+                return jsonify({"error": "invalid_request"}), 400
+        else:
+            return jsonify({"error": "unsupported_grant_type"}), 400
+
+        # El usuario va ligado al refresh token: mismo usuario tras refrescar
+        access = f"emu-{hashlib.sha256(refresh.encode()).hexdigest()[:16]}-{int(time.time())}"
+        tokens = {"access_token": access, "token_type": "Bearer", "expires_in": 3600,
+                  "scope": "user-read-currently-playing user-top-read"}
+        if grant_type == "authorization_code":
+            tokens["refresh_token"] = refresh
+        return jsonify(tokens)
+
+    def user_token() -> str:
+        # Los tokens emitidos por /api/token llevan el usuario antes del timestamp
+        token_value = bearer_token() or ""
+        parts = token_value.split("-")
+        return "-".join(parts[:2]) if len(parts) == 3 and parts[0] == "emu" else token_value
+
+    # ---------- Web API ----------
+    @app.route("/v1/me")
+    def me():
+        user_id = playback.user_id(user_token())
+        return jsonify({"id": user_id, "display_name": f"Usuario {user_id[-4:]}",
+                        "email": f"{user_id}@emulator.local", "images": [], "country": "ES",
+                        "product": "premium", "type": "user"})
+
+    @app.route("/v1/me/player/currently-playing")
+    def currently_playing():
+        cfg = settings()
+        token_value = user_token()
+        user_hash = int(hashlib.sha256(token_value.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        if user_hash < float(cfg["idle_ratio"]):
+            return Response(status=204)
+
+        scale = float(cfg["track_duration_scale"])
+        state = playback.state(token_value, scale)
+        return jsonify({
+            "timestamp": state["started_at_ms"],
+            "progress_ms": state["progress_ms"],
+            "is_playing": True,
+            "currently_playing_type": "track",
+            "item": catalog.track_json(state["track"], base_url(), scale),
+            "context": None,
+        })
+
+    @app.route("/v1/me/player/queue")
+    def player_queue():
+        scale = float(settings()["track_duration_scale"])
+        state = playback.state(user_token(), scale)
+        return jsonify({
+            "currently_playing": catalog.track_json(state["track"], base_url(), scale),
+            "queue": [catalog.track_json(t, base_url(), scale) for t in state["queue"]],
+        })
+
+    def paged(items: List[Dict], limit: int, offset: int) -> Dict:
+        page = items[offset:offset + limit]
+        has_next = offset + limit < len(items)
+        return {"items": page, "total": len(items), "limit": limit, "offset": offset,
+                "next": f"{request.base_url}?offset={offset + limit}&limit={limit}" if has_next else None,
+                "previous": None, "href": request.url}
+
+    def top_for(kind: str) -> List[Dict]:
+        user_id = playback.user_id(user_token())
+        rng = random.Random(f"{catalog.seed}:top:{kind}:{user_id}:{request.args.get('time_range', 'medium_term')}")
+        pool = catalog.tracks if kind == "tracks" else catalog.artists
+        picks = rng.sample(pool, min(50, len(pool)))
+        if kind == "tracks":
+            return [catalog.track_json(t, base_url()) for t in picks]
+        return picks
+
+    @app.route("/v1/me/top/<kind>")
+    def top(kind: str):
+        if kind not in ("tracks", "artists"):
+            return error(404, "Not found")
+        limit = min(50, request.args.get("limit", 20, type=int))
+        offset = request.args.get("offset", 0, type=int)
+        return jsonify(paged(top_for(kind), limit, offset))
+
+    @app.route("/v1/me/player/recently-played")
+    def recently_played():
+        limit = min(50, request.args.get("limit", 20, type=int))
+        before = request.args.get("before", type=int)
+        after = request.args.get("after", type=int)
+        state = playback.state(user_token(), float(settings()["track_duration_scale"]))
+
+        plays = []
+        for track, finished_ms in state["history"]:
+            if before is not None and finished_ms >= before:
+                continue
+            if after is not None and finished_ms <= after:
+                continue
+            played_at = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(finished_ms / 1000))
+            plays.append({"track": catalog.track_json(track, base_url()),
+                          "played_at": f"{played_at}.{finished_ms % 1000:03d}Z", "_ms": finished_ms})
+        page = plays[:limit]
+        cursors = {"before": str(page[-1]["_ms"]), "after": str(page[0]["_ms"])} if page else None
+        for play in page:
+            play.pop("_ms")
+        return jsonify({"items": page, "limit": limit, "cursors": cursors, "next": None, "href": request.url})
+
+    def ids_param(max_ids: int):
+        ids = [i for i in request.args.get("ids", "").split(",") if i]
+        if not ids or len(ids) > max_ids:
+            return None
+        return ids
+
+    @app.route("/v1/audio-features")
+    def audio_features_bulk():
+        ids = ids_param(100)
+        if ids is None:
+            return error(400, "invalid ids")
+        return jsonify({"audio_features": [catalog.audio_features(i) for i in ids]})
+
+    @app.route("/v1/audio-features/<track_id>")
+    def audio_features(track_id: str):
+        features = catalog.audio_features(track_id)
+        return jsonify(features) if features else error(404, "Track not found")
+
+    @app.route("/v1/audio-analysis/<track_id>")
+    def audio_analysis(track_id: str):
+        analysis = catalog.audio_analysis(track_id)
+        return jsonify(analysis) if analysis else error(404, "Track not found")
+
+    @app.route("/v1/artists")
+    def artists_bulk():
+        ids = ids_param(50)
+        if ids is None:
+            return error(400, "invalid ids")
+        return jsonify({"artists": [catalog.artist_by_id.get(i) for i in ids]})
+
+    @app.route("/v1/albums")
+    def albums_bulk():
+        ids = ids_param(20)
+        if ids is None:
+            return error(400, "invalid ids")
+        albums = [catalog.album_by_id.get(i) for i in ids]
+        return jsonify({"albums": [catalog.album_json(a, base_url()) if a else None for a in albums]})
+
+    @app.route("/images/<album_id>.jpg")
+    def cover(album_id: str):
+        if album_id not in catalog.album_by_id:
+            return error(404, "Image not found")
+        size = max(16, min(1280, request.args.get("size", 640, type=int)))
+        return Response(render_cover(album_id, size), mimetype="image/jpeg",
+                        headers={"Cache-Control": "public, max-age=86400"})
+
+    return app
+
+
+def start_emulator_thread(config: Dict[str, Any] | None = None, host: str = "127.0.0.1", port: int = 0,
+                          n_tracks: int = 500, seed: int = 7):
+    """
+    Arranca el emulador en un hilo (port=0: puerto libre). Para benchmarks y
+    pruebas de carga en el mismo proceso. Devuelve (url_base, servidor);
+    servidor.shutdown() lo para.
+    """
+    from werkzeug.serving import make_server
+
+    # Sin una línea de log por petición (las pruebas hacen miles)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server(host, port, create_emulator_app(config, n_tracks, seed), threaded=True)
+    threading.Thread(target=server.serve_forever, name="spotify-emulator", daemon=True).start()
+    return f"http://{host}:{server.server_port}", server
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Emulador local de la Web API de Spotify")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--tracks", type=int, default=500, help="Canciones en el catálogo sintético")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia (mediana) por petición")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-429", type=float, default=0.0, help="Probabilidad de 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After de los 429 (s)")
+    parser.add_argument("--error-403", type=float, default=0.0)
+    parser.add_argument("--error-404", type=float, default=0.0)
+    parser.add_argument("--error-500", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=0.0, help="Probabilidad de colgar la respuesta")
+    parser.add_argument("--timeout-s", type=float, default=30.0)
+    parser.add_argument("--idle-ratio", type=float, default=0.0, help="Fracción de usuarios sin reproducción")
+    parser.add_argument("--track-duration-scale", type=float, default=1.0)
+    parser.add_argument("--paths", help='Overrides por prefijo en JSON: {"/v1/audio-analysis": {"latency_ms": 300}}')
+    args = parser.parse_args(argv)
+
+    config = {
+        "latency_ms": args.latency_ms, "latency_dist": args.latency_dist, "latency_sigma": args.latency_sigma,
+        "error_429": args.error_429, "retry_after_s": args.retry_after, "error_403": args.error_403,
+        "error_404": args.error_404, "error_500": args.error_500, "timeout": args.timeout,
+        "timeout_s": args.timeout_s, "idle_ratio": args.idle_ratio,
+        "track_duration_scale": args.track_duration_scale,
+        "paths": json.loads(args.paths) if args.paths else {},
+    }
+    app = create_emulator_app(config, args.tracks, args.seed)
+    print(f"🧪 Emulador de Spotify en http://{args.host}:{args.port}")
+    print(f"   SPOTIFY_API_URL=http://{args.host}:{args.port}/v1 SPOTIFY_ACCOUNTS_URL=http://{args.host}:{args.port}")
+    app.run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
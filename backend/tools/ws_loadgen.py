@@ -0,0 +1,445 @@
+# backend/tools/ws_loadgen.py
+
+"""
+Generador de carga para el visualizador en vivo (websockets/live_visualizer.py).
+
+Abre clientes Socket.IO por escalones (p.ej. 10, 50, 100, 500...), registra un
+token por cliente y en cada escalón mide:
+- emit_rate:     eventos current_track recibidos por segundo (todos los clientes)
+- freshness:     desde que la canción cambia "en Spotify" hasta que el cliente
+                 recibe el push con la nueva (p50/p95/p99)
+- servidor:      CPU (%) y memoria (RSS) del proceso del backend
+- push_loop_lag: retraso del hilo de fondo respecto a los polls previstos
+                 (histograma live_push_loop_lag_seconds de /metrics)
+
+Por defecto todo es local: levanta el emulador de Spotify en este proceso
+(canciones acortadas para que cambien a menudo) y el backend en un
+subproceso apuntando a él. Para a la primera que un escalón se satura
+(lag, frescura o errores de conexión por encima de los umbrales): ese es el
+número de conexiones en el que el worker actual se cae.
+
+Uso (desde backend/):
+    python -m tools.ws_loadgen --steps 10,50,100,250 --step-duration 20 --out ws.json
+    python -m tools.ws_loadgen --server http://127.0.0.1:8080 --server-pid 1234 \\
+        --emulator http://127.0.0.1:8900 --steps 100,500,1000
+
+Los clientes van siempre por WebSocket (python-socketio[client] y
+websocket-client, en requirements-dev.txt). Sin websocket-client la prueba no
+arranca: con long-polling se mediría otro transporte, bastante más caro por
+cliente en ambos lados. --allow-polling la deja correr así a propósito.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ========================= Utilidades ==========================
+def _percentile(sorted_values: List[float], q: float) -> float | None:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return round(sorted_values[index], 1)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _now_ms() -> float:
+    return time.time() * 1000
+
+
+def scrape_metrics(server_url: str) -> Dict[str, float]:
+    """/metrics del backend -> { 'nombre{labels}': valor } (sin buckets)"""
+    text = requests.get(f"{server_url}/metrics", timeout=10).text
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#") or "_bucket{" in line:
+            continue
+        name, _, value = line.rpartition(" ")
+        try:
+            samples[name] = float(value)
+        except ValueError:
+            continue
+    return samples
+
+
+class ProcessSampler:
+    """CPU y RSS de un proceso leyendo /proc (solo Linux)"""
+
+    def __init__(self, pid: int | None):
+        self.pid = pid
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._last: tuple | None = None
+
+    def _cpu_seconds(self) -> float | None:
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                # El nombre del proceso va entre paréntesis y puede tener espacios
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / self._ticks
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def rss_mb(self) -> float | None:
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            return None
+        return None
+
+    def start(self) -> None:
+        if self.pid:
+            self._last = (time.monotonic(), self._cpu_seconds())
+
+    def cpu_percent(self) -> float | None:
+        """CPU usada desde start() (100 = un núcleo entero)"""
+        if not self.pid or not self._last or self._last[1] is None:
+            return None
+        cpu = self._cpu_seconds()
+        if cpu is None:
+            return None
+        elapsed = time.monotonic() - self._last[0]
+        return round((cpu - self._last[1]) / elapsed * 100, 1) if elapsed > 0 else None
+
+
+# ========================= Clientes ==========================
+class ClientPool:
+    """Clientes Socket.IO que registran un token y cuentan los pushes recibidos"""
+
+    def __init__(self, server_url: str, emulator_url: str, clients_per_user: int = 1,
+                 transports: List[str] | None = None):
+        self.server_url = server_url
+        self.transports = transports or ["websocket"]
+        self.emulator_url = emulator_url
+        self.clients_per_user = max(1, clients_per_user)
+        self.clients: List[Any] = []
+        self.lock = threading.Lock()
+        # Por ventana de medida
+        self.events = 0
+        self.freshness_ms: List[float] = []
+        # Totales
+        self.connect_errors = 0
+        self.registration_errors = 0
+        self.disconnects = 0
+        # Inicio de cada canción: { (token, track_id): started_at_ms }
+        self._track_started: Dict[tuple, float] = {}
+
+    def _token(self, index: int) -> str:
+        return f"load-{index // self.clients_per_user:06d}"
+
+    def _track_started_ms(self, token: str, track_id: str) -> float | None:
+        key = (token, track_id)
+        if key not in self._track_started:
+            try:
+                state = requests.get(f"{self.emulator_url}/_emulator/state",
+                                     params={"token": token}, timeout=5).json()
+            except Exception:
+                return None
+            if state.get("track_id") != track_id:
+                # Ya ha cambiado otra vez: el push llegó tardísimo o es de la anterior
+                return None
+            self._track_started[key] = state["started_at_ms"]
+        return self._track_started[key]
+
+    def _on_track(self, token: str, seen: Dict[str, Any], data: Dict) -> None:
+        received_ms = _now_ms()
+        track_id = ((data or {}).get("item") or {}).get("id")
+        with self.lock:
+            self.events += 1
+        previous = seen.get("track_id")
+        seen["track_id"] = track_id
+        # El primer push tras conectar no es un cambio de canción
+        if previous is None or track_id is None or track_id == previous:
+            return
+        started_ms = self._track_started_ms(token, track_id)
+        if started_ms is not None:
+            with self.lock:
+                self.freshness_ms.append(received_ms - started_ms)
+
+    def _connect_one(self, index: int):
+        import socketio
+
+        token = self._token(index)
+        client = socketio.Client(reconnection=False)
+        seen: Dict[str, Any] = {}
+
+        client.on("current_track", lambda data: self._on_track(token, seen, data))
+        client.on("registration_error", lambda data: self._count("registration_errors"))
+        client.on("disconnect", lambda *args: self._count("disconnects"))
+
+        try:
+            client.connect(self.server_url, transports=self.transports, wait_timeout=15)
+            client.emit("register_access_token", {"access_token": token})
+        except Exception:
+            self._count("connect_errors")
+            return None
+        return client
+
+    def _count(self, attr: str) -> None:
+        with self.lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def grow_to(self, target: int, parallel: int = 32) -> float:
+        """Conecta clientes hasta tener `target`; devuelve los segundos que tardó"""
+        started = time.perf_counter()
+        first = len(self.clients)
+        if target > first:
+            with ThreadPoolExecutor(max_workers=parallel) as pool:
+                for client in pool.map(self._connect_one, range(first, target)):
+                    if client is not None:
+                        self.clients.append(client)
+        return time.perf_counter() - started
+
+    def reset_window(self) -> None:
+        with self.lock:
+            self.events = 0
+            self.freshness_ms = []
+
+    def close(self) -> None:
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            list(pool.map(lambda c: c.disconnect(), self.clients))
+        self.clients = []
+
+
+# ========================= Servidor bajo prueba ==========================
+def start_backend(port: int, emulator_url: str) -> subprocess.Popen:
+    """Backend real (app.py) en un subproceso apuntando al emulador"""
+    env = dict(os.environ,
+               SPOTIFY_API_URL=f"{emulator_url}/v1",
+               SPOTIFY_ACCOUNTS_URL=emulator_url,
+               CACHE_BACKEND_URL=os.getenv("CACHE_BACKEND_URL", "memory://"),
+               LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"))
+    return subprocess.Popen([sys.executable, "-m", "tools.ws_loadgen", "serve", "--port", str(port)],
+                            cwd=BACKEND_DIR, env=env)
+
+
+def wait_ready(server_url: str, proc: subprocess.Popen | None, timeout_s: float = 60) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"El backend terminó al arrancar (código {proc.returncode})")
+        try:
+            if requests.get(f"{server_url}/metrics", timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"El backend no respondió en {timeout_s:.0f}s")
+
+
+def serve(port: int) -> None:
+    """Subcomando interno: el backend sin debug ni reloader"""
+    import logging
+    import app as backend_app
+
+    # Sin una línea por petición de long-polling
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    backend_app.socketio.run(backend_app.app, host="127.0.0.1", port=port,
+                             debug=False, use_reloader=False, log_output=False,
+                             allow_unsafe_werkzeug=True)
+
+
+# ========================= Escalones ==========================
+def _metric(samples: Dict[str, float], name: str) -> float:
+    return samples.get(name, 0.0)
+
+
+def run_step(pool: ClientPool, target: int, duration_s: float, server_url: str,
+             sampler: ProcessSampler) -> Dict[str, Any]:
+    connect_s = pool.grow_to(target)
+    # Dejamos que los registros recién hechos entren en el siguiente tick
+    time.sleep(1.0)
+
+    pool.reset_window()
+    before = scrape_metrics(server_url)
+    sampler.start()
+    started = time.monotonic()
+    time.sleep(duration_s)
+    elapsed = time.monotonic() - started
+    after = scrape_metrics(server_url)
+    cpu = sampler.cpu_percent()
+
+    with pool.lock:
+        events, freshness = pool.events, sorted(pool.freshness_ms)
+
+    lag_count = _metric(after, "live_push_loop_lag_seconds_count") - _metric(before, "live_push_loop_lag_seconds_count")
+    lag_sum = _metric(after, "live_push_loop_lag_seconds_sum") - _metric(before, "live_push_loop_lag_seconds_sum")
+    sent = 'live_pushes_total{result="sent"}'
+
+    return {
+        "clients": len(pool.clients),
+        "target": target,
+        "connect_s": round(connect_s, 2),
+        "server_clients": _metric(after, "live_websocket_clients"),
+        "emit_rate": round(events / elapsed, 2),
+        "server_push_rate": round((_metric(after, sent) - _metric(before, sent)) / elapsed, 2),
+        "freshness_ms": {"n": len(freshness), "p50": _percentile(freshness, 0.50),
+                         "p95": _percentile(freshness, 0.95), "p99": _percentile(freshness, 0.99)},
+        "push_loop_lag_ms": round(lag_sum / lag_count * 1000, 1) if lag_count else 0.0,
+        "server_cpu_percent": cpu,
+        "server_rss_mb": sampler.rss_mb(),
+        "connect_errors": pool.connect_errors,
+        "registration_errors": pool.registration_errors,
+        "disconnects": pool.disconnects,
+    }
+
+
+def saturation_reasons(step: Dict[str, Any], args) -> List[str]:
+    reasons = []
+    if step["push_loop_lag_ms"] > args.max_lag_ms:
+        reasons.append(f"lag {step['push_loop_lag_ms']}ms > {args.max_lag_ms}ms")
+    p95 = step["freshness_ms"]["p95"]
+    if p95 is not None and p95 > args.max_freshness_ms:
+        reasons.append(f"frescura p95 {p95}ms > {args.max_freshness_ms}ms")
+    failed = step["connect_errors"] + step["disconnects"]
+    if failed > args.max_error_ratio * max(1, step["target"]):
+        reasons.append(f"{failed} conexiones fallidas / caídas")
+    return reasons
+
+
+def print_step(step: Dict[str, Any]) -> None:
+    fresh = step["freshness_ms"]
+    print(f"📶 {step['clients']:>5} clientes | {step['emit_rate']:>7} ev/s | "
+          f"frescura p50/p95 {fresh['p50']}/{fresh['p95']} ms (n={fresh['n']}) | "
+          f"lag {step['push_loop_lag_ms']} ms | CPU {step['server_cpu_percent']}% | "
+          f"RSS {step['server_rss_mb']} MB | errores {step['connect_errors']}")
+
+
+def websocket_transport_available() -> bool:
+    """python-socketio solo abre WebSockets si websocket-client está instalado"""
+    try:
+        import socketio  # noqa: F401
+        import websocket  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def main(argv: List[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["serve"]:
+        serve_parser = argparse.ArgumentParser(prog="ws_loadgen serve")
+        serve_parser.add_argument("--port", type=int, required=True)
+        serve(serve_parser.parse_args(argv[1:]).port)
+        return 0
+
+    parser = argparse.ArgumentParser(description="Prueba de carga del visualizador en vivo (Socket.IO)")
+    parser.add_argument("--steps", default="10,50,100,250,500", help="Clientes conectados en cada escalón")
+    parser.add_argument("--step-duration", type=float, default=20.0, help="Segundos de medida por escalón")
+    parser.add_argument("--clients-per-user", type=int, default=1, help="Sockets que comparten token")
+    parser.add_argument("--server", help="Backend ya arrancado (por defecto se lanza uno local)")
+    parser.add_argument("--server-pid", type=int, help="PID del backend externo (CPU / memoria)")
+    parser.add_argument("--emulator", help="Emulador ya arrancado que usa ese backend")
+    parser.add_argument("--track-duration-scale", type=float, default=0.05,
+                        help="Acorta las canciones del emulador para que cambien a menudo")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia del emulador por petición")
+    parser.add_argument("--max-lag-ms", type=float, default=1000.0)
+    parser.add_argument("--max-freshness-ms", type=float, default=5000.0)
+    parser.add_argument("--max-error-ratio", type=float, default=0.01)
+    parser.add_argument("--keep-going", action="store_true", help="No parar en el primer escalón saturado")
+    parser.add_argument("--out", help="Guardar los resultados en este JSON")
+    parser.add_argument("--allow-polling", action="store_true",
+                        help="Sin websocket-client, medir con long-polling en vez de abortar")
+    args = parser.parse_args(argv)
+
+    transports = ["websocket"]
+    if not websocket_transport_available():
+        if not args.allow_polling:
+            parser.error("falta websocket-client (pip install -r requirements-dev.txt): "
+                         "sin él se mediría long-polling, no WebSocket")
+        transports = ["polling"]
+        print("⚠️ Sin websocket-client: los clientes usan long-polling")
+
+    if args.server and not args.emulator:
+        parser.error("--server necesita --emulator (para medir la frescura)")
+    steps = sorted(int(s) for s in args.steps.split(",") if s.strip())
+
+    emulator = backend = None
+    emulator_url = args.emulator
+    if not emulator_url:
+        from tools.spotify_emulator import start_emulator_thread
+        emulator_url, emulator = start_emulator_thread({
+            "track_duration_scale": args.track_duration_scale, "latency_ms": args.latency_ms,
+        })
+        print(f"🎧 Emulador de Spotify en {emulator_url}")
+
+    server_url, server_pid = args.server, args.server_pid
+    if not server_url:
+        port = _free_port()
+        server_url = f"http://127.0.0.1:{port}"
+        backend = start_backend(port, emulator_url)
+        server_pid = backend.pid
+        print(f"🚀 Backend en {server_url} (pid {server_pid})")
+
+    pool = ClientPool(server_url, emulator_url, args.clients_per_user, transports)
+    results: List[Dict[str, Any]] = []
+    breaking_point = None
+    try:
+        wait_ready(server_url, backend)
+        sampler = ProcessSampler(server_pid)
+        for target in steps:
+            step = run_step(pool, target, args.step_duration, server_url, sampler)
+            step["saturated"] = saturation_reasons(step, args)
+            results.append(step)
+            print_step(step)
+            if step["saturated"]:
+                print(f"🔥 Saturado con {step['clients']} clientes: {'; '.join(step['saturated'])}")
+                breaking_point = breaking_point or step["clients"]
+                if not args.keep_going:
+                    break
+    except KeyboardInterrupt:
+        print("⏹️  Interrumpido")
+    finally:
+        pool.close()
+        if backend is not None:
+            backend.terminate()
+            backend.wait(timeout=10)
+        if emulator is not None:
+            emulator.shutdown()
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "step_duration_s": args.step_duration,
+            "clients_per_user": args.clients_per_user,
+            "track_duration_scale": args.track_duration_scale if not args.emulator else None,
+        },
+        "breaking_point": breaking_point,
+        "steps": results,
+    }
+    if breaking_point is None:
+        print("✅ Ningún escalón saturado")
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"💾 Resultados guardados en {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
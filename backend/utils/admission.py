@@ -0,0 +1,218 @@
+# backend/utils/admission.py
+
+"""
+Control de admisión por clase de endpoint.
+Cada clase tiene un límite de peticiones en curso y una cola corta con plazo:
+- Hay hueco: la petición entra directamente.
+- No hay hueco: espera en cola (FIFO) como mucho ADMISSION_QUEUE_TIMEOUT_MS.
+- Cola llena o plazo agotado: 503 inmediato con Retry-After.
+
+Así, ante una ráfaga se rechazan unas pocas peticiones en vez de que todas
+(fan-out a Spotify + KMeans) se degraden a la vez.
+
+Configuración por clase (p.ej. TRACK):
+    ADMISSION_TRACK_CONCURRENCY   peticiones simultáneas (0 = sin límite)
+    ADMISSION_TRACK_QUEUE         peticiones en espera como mucho
+"""
+
+from __future__ import annotations
+
+import os
+import math
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import jsonify, make_response
+
+from utils.metrics import registry
+
+QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "2000")) / 1000
+
+# Controladores por nombre de clase (para las métricas)
+_controllers: dict[str, "AdmissionController"] = {}
+
+QUEUE_WAIT = registry.histogram(
+    "admission_queue_wait_seconds",
+    "Tiempo en cola de las peticiones admitidas",
+    ["endpoint_class"],
+)
+REJECTIONS = registry.counter(
+    "admission_rejections_total",
+    "Peticiones rechazadas con 503 por clase y motivo (queue_full / deadline)",
+    ["endpoint_class", "reason"],
+)
+registry.gauge("admission_in_flight", "Peticiones en curso por clase", ["endpoint_class"]).set_function(
+    lambda: {(name, ): c.in_flight for name, c in _controllers.items()}
+)
+registry.gauge("admission_queue_depth", "Peticiones esperando turno por clase", ["endpoint_class"]).set_function(
+    lambda: {(name, ): c.queue_depth for name, c in _controllers.items()}
+)
+
+
+class Overloaded(Exception):
+    """No hay hueco ni sitio en la cola: responder 503"""
+
+    def __init__(self, reason: str, retry_after_s: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionController:
+    """Semáforo con cola FIFO acotada y plazo de espera"""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout_s: float = QUEUE_TIMEOUT_S):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters: deque[threading.Event] = deque()
+        # Media móvil del tiempo de servicio, para estimar Retry-After
+        self._avg_service_s = 0.5
+        _controllers[name] = self
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._active
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Segundos estimados hasta que se vacíe lo que hay por delante"""
+        pending = self._active + len(self._waiters)
+        return max(1, math.ceil(self._avg_service_s * pending / max(1, self.max_concurrent)))
+
+    def _reject(self, reason: str) -> Overloaded:
+        REJECTIONS.inc(endpoint_class=self.name, reason=reason)
+        return Overloaded(reason, self.retry_after())
+
+    def acquire(self) -> None:
+        """Entra o espera turno; lanza Overloaded si no hay sitio o vence el plazo"""
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                QUEUE_WAIT.observe(0.0, endpoint_class=self.name)
+                return
+            if len(self._waiters) >= self.max_queue:
+                raise self._reject("queue_full")
+            turn = threading.Event()
+            self._waiters.append(turn)
+
+        started = time.perf_counter()
+        granted = turn.wait(self.queue_timeout_s)
+        if not granted:
+            with self._lock:
+                # release() pudo cedernos el hueco justo al vencer el plazo
+                granted = turn.is_set()
+                if not granted:
+                    self._waiters.remove(turn)
+            if not granted:
+                raise self._reject("deadline")
+        QUEUE_WAIT.observe(time.perf_counter() - started, endpoint_class=self.name)
+
+    def release(self, service_s: float | None = None) -> None:
+        with self._lock:
+            if service_s is not None:
+                self._avg_service_s = 0.8 * self._avg_service_s + 0.2 * service_s
+            if self._waiters:
+                # El hueco pasa directamente al primero de la cola
+                self._waiters.popleft().set()
+            else:
+                self._active -= 1
+
+    @contextmanager
+    def slot(self):
+        if not self.enabled:
+            yield
+            return
+        self.acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+
+def _controller_from_env(name: str, default_concurrency: int, default_queue: int) -> AdmissionController:
+    prefix = f"ADMISSION_{name.upper()}"
+    return AdmissionController(
+        name,
+        max_concurrent=int(os.getenv(f"{prefix}_CONCURRENCY", str(default_concurrency))),
+        max_queue=int(os.getenv(f"{prefix}_QUEUE", str(default_queue))),
+    )
+
+
+# Clases de endpoint:
+# - track: canción actual y similares (fan-out a Spotify + extracción de colores)
+# - api:   el resto de endpoints que consultan Spotify o el histórico
+_CPUS = os.cpu_count() or 2
+track_admission = _controller_from_env("track", max(2, _CPUS), 2 * max(2, _CPUS))
+api_admission = _controller_from_env("api", 16, 32)
+
+
+def _overloaded_response(e: Overloaded):
+    response = jsonify({"error": "Server overloaded, retry later", "reason": e.reason})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after_s)
+    return response
+
+
+def limit_concurrency(controller: AdmissionController):
+    """
+    Decorador de vistas Flask:
+        @app.route("/api/current-track")
+        @limit_concurrency(track_admission)
+        def current_track(): ...
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                with controller.slot():
+                    return view(*args, **kwargs)
+            except Overloaded as e:
+                return _overloaded_response(e)
+        return wrapper
+    return decorator
+
+
+def limit_streaming(controller: AdmissionController):
+    """
+    Como limit_concurrency, para vistas que devuelven una respuesta en
+    streaming: el trabajo ocurre mientras se envía el cuerpo, así que el hueco
+    se libera al cerrarse la respuesta (call_on_close), no al volver la vista.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not controller.enabled:
+                return view(*args, **kwargs)
+            try:
+                controller.acquire()
+            except Overloaded as e:
+                return _overloaded_response(e)
+
+            started = time.perf_counter()
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                controller.release(time.perf_counter() - started)
+                raise
+            if response.is_streamed:
+                response.call_on_close(lambda: controller.release(time.perf_counter() - started))
+            else:
+                controller.release(time.perf_counter() - started)
+            return response
+        return wrapper
+    return decorator
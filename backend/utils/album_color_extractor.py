@@ -12,16 +12,43 @@ import io
 import colorsys
 from typing import Tuple, List, Dict
 from collections import Counter
-import numpy as np
 
 import requests
-from PIL import Image
-from sklearn.cluster import KMeans
+
+from utils.lazy_import import lazy_import, is_loaded
+from utils.shared_cache import create_cache
+from utils.track_models import Palette
+from utils.artwork_index import ArtworkIndex, Fingerprint
+from utils.metrics import STAGE_LATENCY, registry
+from utils.log import get_logger
+
+# Dependencias pesadas: se importan en el primer uso (arranque más rápido)
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+log = get_logger("ColorExtractor")
+
+PALETTE_LOOKUPS = registry.counter(
+    "palette_lookups_total",
+    "Paletas servidas por origen (url / album / content = reutilizada, computed = cuantizada)",
+    ["source"],
+)
 
 
 class AdvancedColorExtractor:
+    # Si la descarga falla, la paleta por defecto se recuerda poco tiempo
+    FAILED_PALETTE_TTL_S = 600
+    # Las paletas rápidas (modo degradado) se guardan aparte y caducan antes,
+    # para que la de K-Means las sustituya cuando baje la carga
+    FAST_PALETTE_TTL_S = 3600
+    FAST_KEY_PREFIX = "fast:"
+    ART_KEY_PREFIX = "art:"
+
     def __init__(self):
-        self.cache = {}  # Cache simple para no repetir extracciones
+        # Paletas por id de portada (L1 en proceso + L2 compartido entre workers)
+        self.cache = create_cache("palette", l1_max_entries=512)
+        # URL / álbum / huella -> id de portada
+        self.artwork = ArtworkIndex()
 
     def download_image(self, url: str) -> Image.Image | None:
         """Descarga imagen con manejo robusto de errores"""
@@ -34,14 +61,14 @@ class AdvancedColorExtractor:
 
             # Verificar que sea una imagen
             if 'image' not in response.headers.get('Content-Type', ''):
-                print(f"[ColorExtractor] ❌ URL no es imagen: {url}")
+                log.warning("❌ URL no es imagen: %s", url)
                 return None
 
             img = Image.open(io.BytesIO(response.content)).convert("RGB")
             return img
 
         except Exception as e:
-            print(f"[ColorExtractor] Error descargando {url}: {e}")
+            log.warning("Error descargando %s: %s", url, e)
             return None
 
     def extract_dominant_colors_kmeans(self, img: Image.Image, n_colors: int = 8) -> List[Tuple[int, int, int]]:
@@ -56,7 +83,8 @@ class AdvancedColorExtractor:
         img_array = np.array(img_small)
         pixels = img_array.reshape(-1, 3)
 
-        # Aplicar K-Means
+        # Aplicar K-Means (sklearn se importa aquí, solo cuando hay que cuantizar)
+        from sklearn.cluster import KMeans
         kmeans = KMeans(n_clusters=n_colors, n_init=10, random_state=42)
         kmeans.fit(pixels)
 
@@ -76,6 +104,19 @@ class AdvancedColorExtractor:
 
         return result
 
+    def extract_dominant_colors_fast(self, img: Image.Image, n_colors: int = 8) -> List[Tuple[int, int, int]]:
+        """
+        Cuantización por octree de PIL: un orden de magnitud más barata que
+        K-Means y algo menos precisa. Se usa cuando el servicio va cargado.
+        """
+        img_small = img.resize((150, 150))
+        quantized = img_small.quantize(colors=n_colors, method=Image.Quantize.FASTOCTREE)
+        palette = quantized.getpalette()[: n_colors * 3]
+
+        # Ordenar por frecuencia: getcolors() -> [(píxeles, índice)]
+        counts = sorted(quantized.getcolors(n_colors), reverse=True)
+        return [tuple(palette[i * 3:i * 3 + 3]) for _, i in counts]
+
     def rgb_to_hsl(self, rgb: Tuple[int, int, int]) -> Tuple[float, float, float]:
         """Convierte RGB a HSL (Hue, Saturation, Lightness)"""
         r, g, b = [x / 255.0 for x in rgb]
@@ -212,39 +253,87 @@ class AdvancedColorExtractor:
         """Convierte RGB a hexadecimal"""
         return f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"
 
-    def extract_album_colors(self, image_url: str, use_cache: bool = True) -> Dict:
+    # ---------- Cache por portada ----------
+    def _cached(self, cache_key: str) -> Dict | None:
+        # Las paletas completas se guardan como Palette (colores en bytes)
+        cached = self.cache.get(cache_key)
+        return cached.to_json() if isinstance(cached, Palette) else cached
+
+    def palette_for_artwork(self, art_id: str, fast: bool = False) -> Dict | None:
+        """Paleta de una portada por su id; con fast=True vale también la rápida"""
+        cached = self._cached(self.ART_KEY_PREFIX + art_id)
+        if cached is None and fast:
+            cached = self._cached(self.FAST_KEY_PREFIX + self.ART_KEY_PREFIX + art_id)
+        return cached
+
+    def store_palette(self, art_id: str, result: Dict, fast: bool = False) -> None:
+        """Guarda la paleta de una portada (compacta si se puede)"""
+        compact = Palette.from_result(result) or result
+        if fast:
+            self.cache.set(self.FAST_KEY_PREFIX + self.ART_KEY_PREFIX + art_id, compact,
+                           ttl_s=self.FAST_PALETTE_TTL_S)
+        else:
+            self.cache[self.ART_KEY_PREFIX + art_id] = compact
+
+    def index_palette(self, fingerprint: Fingerprint, result: Dict, image_url: str | None = None,
+                      album_id: str | None = None, fast: bool = False, art_id: str | None = None) -> str:
         """
-        Función principal: extrae colores avanzados de una portada
+        Guarda una paleta recién calculada y la deja encontrable por huella,
+        URL y álbum. art_id: portada ya indexada (si match() la encontró).
         """
-        # Verificar cache
-        cache_key = hash(image_url)
-        if use_cache and cache_key in self.cache:
-            print(f"[ColorExtractor] ♻️ Usando colores en cache para: {image_url[:50]}...")
-            return self.cache[cache_key]
-
-        print(f"[ColorExtractor] 🎨 Procesando imagen: {image_url[:50]}...")
-
-        # 1. Descargar imagen
-        img = self.download_image(image_url)
-        if img is None:
-            print(f"[ColorExtractor] ❌ No se pudo descargar imagen")
-            default = self.get_default_palette()
-            self.cache[cache_key] = default
-            return default
-
-        # 2. Extraer colores dominantes con K-Means
+        if art_id is None:
+            art_id = fingerprint.art_id
+            self.artwork.add(fingerprint, art_id)
+        self.store_palette(art_id, result, fast)
+        self.artwork.remember(art_id, image_url, album_id)
+        return art_id
+
+    def _lookup(self, image_url: str, album_id: str | None, fast: bool) -> Dict | None:
+        # Entradas por URL de antes del índice (y paletas por defecto de descargas fallidas)
+        cached = self._cached(image_url)
+        if cached is None and fast:
+            cached = self._cached(self.FAST_KEY_PREFIX + image_url)
+        if cached is not None:
+            PALETTE_LOOKUPS.inc(source="url")
+            return cached
+
+        art_id, source = self.artwork.lookup(image_url, album_id)
+        if art_id is not None:
+            cached = self.palette_for_artwork(art_id, fast)
+            if cached is not None:
+                PALETTE_LOOKUPS.inc(source=source)
+                if source == "album":
+                    self.artwork.remember(art_id, image_url)
+        return cached
+
+    def cached_album_colors(self, image_url: str, album_id: str | None = None) -> Dict | None:
+        """Paleta ya calculada (K-Means o rápida) sin descargar nada; None si no hay"""
+        return self._lookup(image_url, album_id, fast=True)
+
+    def cached_palette(self, image_url: str, album_id: str | None = None) -> Dict | None:
+        """Como cached_album_colors, pero solo la paleta K-Means"""
+        return self._lookup(image_url, album_id, fast=False)
+
+    # ---------- Extracción ----------
+    def build_palette(self, img: Image.Image, fast: bool = False) -> Dict:
+        """Cuantiza una portada ya decodificada y genera la paleta completa"""
+        # 1. Extraer colores dominantes con K-Means (u octree en modo rápido)
         try:
-            dominant_colors = self.extract_dominant_colors_kmeans(img, n_colors=8)
-            print(f"[ColorExtractor] ✅ {len(dominant_colors)} colores extraídos")
+            with STAGE_LATENCY.time(stage="quantization_fast" if fast else "quantization"):
+                if fast:
+                    dominant_colors = self.extract_dominant_colors_fast(img, n_colors=8)
+                else:
+                    dominant_colors = self.extract_dominant_colors_kmeans(img, n_colors=8)
+            log.debug("✅ %s colores extraídos", len(dominant_colors))
         except Exception as e:
-            print(f"[ColorExtractor] ❌ Error en K-Means: {e}")
+            log.warning("❌ Error cuantizando: %s", e)
             dominant_colors = []
 
-        # 3. Generar paleta completa
+        # 2. Generar paleta completa
         palette = self.generate_color_palette(dominant_colors)
 
-        # 4. Convertir a formatos útiles
-        final_result = {
+        # 3. Convertir a formatos útiles
+        return {
             "dominant_rgb": palette["dominant"],
             "dominant_hex": self.rgb_to_hex(palette["dominant"]),
             "accent_rgb": palette["accent"],
@@ -265,10 +354,50 @@ class AdvancedColorExtractor:
             "contrast_ratio": self._calculate_contrast(palette["dominant"], palette["accent"])
         }
 
-        # Guardar en cache
-        self.cache[cache_key] = final_result
+    def extract_album_colors(self, image_url: str, use_cache: bool = True, fast: bool = False,
+                             album_id: str | None = None) -> Dict:
+        """
+        Función principal: extrae colores avanzados de una portada.
+        fast=True usa el cuantizador barato (si no hay ya una paleta en cache).
 
-        print(f"[ColorExtractor] 🎨 Paleta generada - Mood: {palette['mood']}")
+        Las paletas se guardan por portada, no por URL (utils/artwork_index.py):
+            URL / id de álbum / huella de la imagen -> id de portada -> paleta
+        La huella se calcula sobre la imagen que se descarga de todas formas:
+        una portada ya cuantizada con otra URL no cuesta otro viaje.
+        """
+        if use_cache:
+            cached = self._lookup(image_url, album_id, fast)
+            if cached is not None:
+                log.debug("♻️ Usando colores en cache para: %s...", image_url[:50])
+                return cached
+
+        log.debug("🎨 Procesando imagen: %s...", image_url[:50])
+
+        # 1. Descargar imagen
+        with STAGE_LATENCY.time(stage="image_download"):
+            img = self.download_image(image_url)
+        if img is None:
+            log.warning("❌ No se pudo descargar imagen")
+            default = self.get_default_palette()
+            cache_key = self.FAST_KEY_PREFIX + image_url if fast else image_url
+            self.cache.set(cache_key, default, ttl_s=self.FAILED_PALETTE_TTL_S)
+            return default
+
+        # 2. Misma portada ya cuantizada con otra URL
+        fingerprint = Fingerprint(img)
+        art_id = self.artwork.match(fingerprint) if use_cache else None
+        cached = self.palette_for_artwork(art_id, fast) if art_id else None
+        if cached is not None:
+            PALETTE_LOOKUPS.inc(source="content")
+            self.artwork.remember(art_id, image_url, album_id)
+            return cached
+
+        # 3. Cuantizar y guardar
+        final_result = self.build_palette(img, fast)
+        PALETTE_LOOKUPS.inc(source="computed")
+        self.index_palette(fingerprint, final_result, image_url, album_id, fast, art_id)
+
+        log.debug("🎨 Paleta generada - Mood: %s", final_result["color_mood"])
         return final_result
 
     def _calculate_contrast(self, color1: Tuple[int, int, int], color2: Tuple[int, int, int]) -> float:
@@ -290,13 +419,29 @@ class AdvancedColorExtractor:
         return float((lighter + 0.05) / (darker + 0.05))
 
 
+# Extractor compartido: así el cache de paletas sobrevive entre llamadas
+_default_extractor = AdvancedColorExtractor()
+
+
+def get_color_extractor() -> AdvancedColorExtractor:
+    """Devuelve el extractor compartido (y su cache)"""
+    return _default_extractor
+
+
 # Función conveniente para compatibilidad
-def get_album_colors_from_url(image_url: str, num_colors: int = 5) -> dict:
+def get_album_colors_from_url(image_url: str, num_colors: int = 5, fast: bool = False,
+                              cached_only: bool = False, album_id: str | None = None) -> dict | None:
     """
-    Función wrapper para compatibilidad con código existente
+    Función wrapper para compatibilidad con código existente.
+    cached_only=True no descarga ni cuantiza: devuelve None si no hay paleta.
+    album_id: ver AdvancedColorExtractor.extract_album_colors.
     """
-    extractor = AdvancedColorExtractor()
-    result = extractor.extract_album_colors(image_url)
+    if cached_only:
+        result = _default_extractor.cached_album_colors(image_url, album_id)
+        if result is None:
+            return None
+    else:
+        result = _default_extractor.extract_album_colors(image_url, fast=fast, album_id=album_id)
 
     # Asegurar que todos los valores sean serializables
     def make_serializable(obj):
@@ -306,9 +451,9 @@ def get_album_colors_from_url(image_url: str, num_colors: int = 5) -> dict:
             return [make_serializable(item) for item in obj]
         elif isinstance(obj, dict):
             return {k: make_serializable(v) for k, v in obj.items()}
-        elif isinstance(obj, (np.integer, np.int64)):
+        elif is_loaded("numpy") and isinstance(obj, (np.integer, np.int64)):
             return int(obj)
-        elif isinstance(obj, (np.floating, np.float64)):
+        elif is_loaded("numpy") and isinstance(obj, (np.floating, np.float64)):
             return float(obj)
         else:
             return obj
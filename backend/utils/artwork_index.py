@@ -0,0 +1,130 @@
+# backend/utils/artwork_index.py
+
+"""
+Índice de portadas por contenido, para no cuantizar dos veces la misma.
+La misma portada llega con URLs distintas: tamaños (640/300/64), reediciones,
+recopilatorios, singles... Las paletas se guardan por id de portada y este
+índice resuelve ese id:
+
+    url:<url>          -> id de portada
+    album:<album_id>   -> id de portada
+    phash:<16 hex>     -> [[id de portada, huella], ...]
+
+La huella es la portada reducida a 16x16 RGB (768 bytes); el id es su SHA-1.
+Para encontrar una portada parecida se usa un dHash de 64 bits como clave
+de cubo; los bits con un gradiente casi nulo (los que cambian con el tamaño o
+el JPEG) se prueban en las dos posiciones. Un candidato solo vale si ninguna
+celda de su huella se aparta más de MATCH_MAX_DIFF: la diferencia media no
+distingue dos portadas que solo cambian en una zona pequeña (un círculo rojo
+o azul sobre el mismo fondo), la peor celda sí.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from itertools import product
+from typing import Dict, List
+
+from utils.lazy_import import lazy_import
+from utils.shared_cache import create_cache
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+# Lado de la huella (celdas de 40 px en una portada de 640)
+THUMB_SIZE = 16
+# Diferencia máxima por celda y canal (0-255) para considerarlas la misma portada.
+# La misma portada a 64/300/640 px y en JPEG no pasa de ~30; portadas distintas,
+# aunque solo cambie un círculo pequeño, superan 90
+MATCH_MAX_DIFF = 48
+# Gradientes de gris por debajo de esto cuentan como 0 en el dHash
+GRADIENT_MARGIN = 3
+# Bits dudosos que se prueban en las dos posiciones (2^n claves por búsqueda)
+PROBE_BITS = 6
+# Portadas distintas que se guardan como mucho bajo el mismo dHash
+MAX_PER_BUCKET = 8
+
+
+class Fingerprint:
+    """dHash + huella 16x16 RGB de una portada ya decodificada"""
+
+    __slots__ = ("phash", "weak_bits", "thumb")
+
+    def __init__(self, img: Image.Image):
+        gray = np.asarray(img.convert("L").resize((9, 8), Image.Resampling.BOX), dtype=np.int16)
+        gradients = (gray[:, :-1] - gray[:, 1:]).ravel()
+        self.phash = int("".join("1" if g > GRADIENT_MARGIN else "0" for g in gradients.tolist()), 2)
+        # Posiciones (desde el bit más alto) de los bits más cerca del umbral
+        margins = np.abs(gradients - GRADIENT_MARGIN - 0.5)
+        self.weak_bits = np.argsort(margins, kind="stable")[:PROBE_BITS].tolist()
+        self.thumb = img.convert("RGB").resize((THUMB_SIZE, THUMB_SIZE), Image.Resampling.BOX).tobytes()
+
+    @property
+    def art_id(self) -> str:
+        return hashlib.sha1(self.thumb).hexdigest()[:16]
+
+    def bucket_keys(self) -> List[str]:
+        """La clave del dHash y sus variantes con los bits dudosos cambiados"""
+        keys = []
+        for flips in product((0, 1), repeat=len(self.weak_bits)):
+            value = self.phash
+            for flip, position in zip(flips, self.weak_bits):
+                if flip:
+                    value ^= 1 << (63 - position)
+            keys.append(f"phash:{value:016x}")
+        return keys
+
+    def distance(self, thumb_hex: str) -> float:
+        """Peor diferencia por celda y canal (las huellas antiguas, de otro tamaño, no casan)"""
+        other = np.frombuffer(bytes.fromhex(thumb_hex), dtype=np.uint8)
+        mine = np.frombuffer(self.thumb, dtype=np.uint8)
+        if other.shape != mine.shape:
+            return float("inf")
+        return float(np.abs(mine.astype(np.int16) - other).max())
+
+
+class ArtworkIndex:
+    def __init__(self, namespace: str = "artwork_index"):
+        # Entradas de pocos bytes: caben muchas en L1
+        self.cache = create_cache(namespace, l1_max_entries=8192)
+
+    @staticmethod
+    def _ref_keys(image_url: str | None, album_id: str | None) -> List[str]:
+        keys = ["url:" + image_url] if image_url else []
+        if album_id:
+            keys.append("album:" + album_id)
+        return keys
+
+    def lookup(self, image_url: str, album_id: str | None = None) -> tuple:
+        """(id de portada, "url" | "album") si esta URL o este álbum ya se vieron; (None, None) si no"""
+        keys = self._ref_keys(image_url, album_id)
+        found = self.cache.get_many(keys)
+        for key in keys:
+            if key in found:
+                return found[key], key.split(":", 1)[0]
+        return None, None
+
+    def match(self, fingerprint: Fingerprint) -> str | None:
+        """Id de una portada ya indexada que es la misma imagen (a otro tamaño, otra URL...)"""
+        best_id, best_diff = None, MATCH_MAX_DIFF
+        for entries in self.cache.get_many(fingerprint.bucket_keys()).values():
+            for art_id, thumb_hex in entries:
+                diff = fingerprint.distance(thumb_hex)
+                if diff <= best_diff:
+                    best_id, best_diff = art_id, diff
+        return best_id
+
+    def add(self, fingerprint: Fingerprint, art_id: str) -> None:
+        """Indexa la huella para que match() encuentre la portada con otras URLs"""
+        key = f"phash:{fingerprint.phash:016x}"
+        entries: List = list(self.cache.get(key) or [])
+        if any(existing_id == art_id for existing_id, _ in entries):
+            return
+        entries.append([art_id, fingerprint.thumb.hex()])
+        self.cache.set(key, entries[-MAX_PER_BUCKET:])
+
+    def remember(self, art_id: str, image_url: str | None = None, album_id: str | None = None) -> None:
+        """URL y álbum -> id de portada (la próxima vez, sin descargar nada)"""
+        entries: Dict[str, str] = {key: art_id for key in self._ref_keys(image_url, album_id)}
+        if entries:
+            self.cache.set_many(entries)
@@ -0,0 +1,40 @@
+# backend/utils/lazy_import.py
+
+"""
+Importaciones diferidas para dependencias pesadas (NumPy, PIL, sklearn).
+El módulo real se importa en el primer acceso a un atributo, así importar
+app.py (o hacer fork de un worker) no paga su coste hasta que se usan.
+"""
+
+from __future__ import annotations
+
+import sys
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    """Proxy que importa el módulo real en el primer acceso a un atributo"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_target"] = name
+
+    def _load(self) -> types.ModuleType:
+        module = importlib.import_module(self.__dict__["_lazy_target"])
+        # Copiar los atributos: los siguientes accesos ya no pasan por __getattr__
+        self.__dict__.update(module.__dict__)
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name: str) -> LazyModule:
+    """np = lazy_import("numpy") en lugar de import numpy as np"""
+    return LazyModule(name)
+
+
+def is_loaded(name: str) -> bool:
+    """True si el módulo ya se importó (por nosotros o por otra dependencia)"""
+    return name in sys.modules
@@ -0,0 +1,150 @@
+# backend/utils/log.py
+
+"""
+Logging estructurado del backend (sustituye a los print del camino caliente).
+- Niveles (LOG_LEVEL, por defecto INFO). Los mensajes por petición van en
+  DEBUG: a nivel de producción cuestan una comparación de enteros.
+- Muestreo por mensaje: log.info(..., extra=sampled(0.01)) emite ~1 de cada 100.
+- Handler no bloqueante: los registros van a una cola y un hilo aparte los
+  formatea y escribe en stdout.
+- Id de correlación por petición / ciclo de push (X-Request-Id) en cada
+  línea; es el mismo que se devuelve en la respuesta.
+
+Formato (LOG_FORMAT): "text" (como los print: [Modulo] mensaje) o "json".
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import uuid
+import queue
+import random
+import atexit
+import logging
+import threading
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+
+from utils.metrics import registry
+
+# Id de correlación de la petición / ciclo en curso
+request_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_id", default=None)
+
+_ROOT_NAME = "spoty"
+_setup_lock = threading.Lock()
+_listener: QueueListener | None = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def set_request_id(request_id: str | None = None) -> contextvars.Token:
+    """Fija el id de correlación del contexto actual (genera uno si no se pasa)"""
+    return request_id_var.set(request_id or new_request_id())
+
+
+def current_request_id() -> str | None:
+    return request_id_var.get()
+
+
+def sampled(rate: float) -> dict:
+    """extra= para emitir solo una fracción de un mensaje repetitivo"""
+    return {"sample_rate": rate}
+
+
+class _ContextFilter(logging.Filter):
+    """Muestreo + id de correlación (se evalúa en el hilo que loguea)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        if rate is not None and random.random() >= rate:
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        prefix = f"[{record.name[len(_ROOT_NAME) + 1:] or _ROOT_NAME}]"
+        request_id = getattr(record, "request_id", None)
+        line = f"{prefix} {record.getMessage()}"
+        if request_id:
+            line += f" (req={request_id})"
+        if record.levelno >= logging.WARNING:
+            line = f"{record.levelname} {line}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name[len(_ROOT_NAME) + 1:] or _ROOT_NAME,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _setup() -> logging.Logger:
+    global _listener
+    root = logging.getLogger(_ROOT_NAME)
+    with _setup_lock:
+        if _listener is not None:
+            return root
+
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        root.propagate = False
+
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(_JSONFormatter() if os.getenv("LOG_FORMAT", "text") == "json" else _TextFormatter())
+
+        # Cola acotada: si el escritor no da abasto se descartan líneas, nunca
+        # se bloquea una petición
+        log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        handler = _NonBlockingQueueHandler(log_queue)
+        handler.addFilter(_ContextFilter())
+        root.addHandler(handler)
+
+        _listener = QueueListener(log_queue, stream, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_listener.stop)
+    return root
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _NonBlockingQueueHandler.dropped += 1
+
+
+def get_logger(name: str) -> logging.Logger:
+    """log = get_logger("SpotifyService") -> líneas "[SpotifyService] ..." """
+    _setup()
+    return logging.getLogger(f"{_ROOT_NAME}.{name}")
+
+
+def dropped_log_records() -> int:
+    return _NonBlockingQueueHandler.dropped
+
+
+registry.counter("log_records_dropped_total", "Líneas de log descartadas por cola llena").set_function(
+    lambda: {(): dropped_log_records()}
+)
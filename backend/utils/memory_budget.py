@@ -0,0 +1,172 @@
+# backend/utils/memory_budget.py
+
+"""
+Presupuesto de memoria común a todos los L1 de utils/shared_cache.py.
+- Tamaño aproximado de cada entrada (recorriendo el valor una vez al guardarlo).
+- Expulsión compartida con LRU segmentado (SLRU): las entradas nuevas entran
+  en "probation"; las que se vuelven a leer pasan a "protected" (hasta el 80%
+  del presupuesto). Al pasarse del presupuesto se expulsa primero lo menos
+  reciente de probation, así un barrido de claves de un solo uso no echa a
+  las que se usan de verdad (p.ej. paletas frente a análisis enormes).
+
+CACHE_MEMORY_BUDGET_MB fija el total (por defecto 256 MB por proceso).
+
+El presupuesto nunca toma el lock de un cache: devuelve las víctimas y cada
+cache las quita de su L1 después, con su propio lock.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from utils.lazy_import import lazy_import, is_loaded
+
+np = lazy_import("numpy")
+
+# Sobrecoste fijo de un ndarray aparte de sus datos
+_NDARRAY_OVERHEAD = 112
+
+
+def approx_size(value: Any) -> int:
+    """Bytes aproximados de un valor y todo lo que contiene (sin contar dos veces lo compartido)"""
+    size = 0
+    seen = set()
+    stack = [value]
+    numpy_loaded = is_loaded("numpy")
+
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        if numpy_loaded and isinstance(obj, np.ndarray):
+            size += obj.nbytes + _NDARRAY_OVERHEAD
+            continue
+
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+            continue
+        else:
+            # Objetos propios: atributos en __dict__ o en __slots__
+            if hasattr(obj, "__dict__"):
+                stack.append(vars(obj))
+            for slot in getattr(type(obj), "__slots__", ()):
+                if hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+    return size
+
+
+class MemoryBudget:
+    PROTECTED_FRACTION = 0.8
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # { (cache, clave): (bytes, token) } en orden LRU
+        self._probation: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._protected: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._probation_bytes = 0
+        self._protected_bytes = 0
+        self._bytes_by_owner: Dict[Any, int] = {}
+        self.evictions = 0
+
+    @property
+    def used_bytes(self) -> int:
+        return self._probation_bytes + self._protected_bytes
+
+    def bytes_for(self, owner: Any) -> int:
+        return self._bytes_by_owner.get(owner, 0)
+
+    # ---------- Contabilidad (con el lock tomado) ----------
+    def _account(self, owner: Any, size: int) -> None:
+        self._bytes_by_owner[owner] = self._bytes_by_owner.get(owner, 0) + size
+
+    def _remove(self, entry_key: tuple) -> None:
+        for segment, attr in ((self._probation, "_probation_bytes"), (self._protected, "_protected_bytes")):
+            entry = segment.pop(entry_key, None)
+            if entry is not None:
+                setattr(self, attr, getattr(self, attr) - entry[0])
+                self._account(entry_key[0], -entry[0])
+                return
+
+    def _evict(self) -> List[Tuple[Any, str, Any]]:
+        victims = []
+        while self.used_bytes > self.max_bytes and (self._probation or self._protected):
+            if self._probation:
+                entry_key, (size, token) = self._probation.popitem(last=False)
+                self._probation_bytes -= size
+            else:
+                entry_key, (size, token) = self._protected.popitem(last=False)
+                self._protected_bytes -= size
+            self._account(entry_key[0], -size)
+            victims.append((entry_key[0], entry_key[1], token))
+        self.evictions += len(victims)
+        return victims
+
+    # ---------- API para los caches ----------
+    def charge(self, owner: Any, key: str, size: int, token: Any) -> List[Tuple[Any, str, Any]]:
+        """Registra una entrada nueva; devuelve las (cache, clave, token) a expulsar"""
+        entry_key = (owner, key)
+        with self._lock:
+            self._remove(entry_key)
+            self._probation[entry_key] = (size, token)
+            self._probation_bytes += size
+            self._account(owner, size)
+            return self._evict()
+
+    def touch(self, owner: Any, key: str) -> None:
+        """Acierto: la entrada pasa a (o sube en) el segmento protegido"""
+        entry_key = (owner, key)
+        with self._lock:
+            entry = self._probation.pop(entry_key, None)
+            if entry is None:
+                if entry_key in self._protected:
+                    self._protected.move_to_end(entry_key)
+                return
+            self._probation_bytes -= entry[0]
+            self._protected[entry_key] = entry
+            self._protected_bytes += entry[0]
+
+            # Si protected crece de más, lo menos reciente vuelve a probation
+            limit = self.PROTECTED_FRACTION * self.max_bytes
+            while self._protected_bytes > limit and len(self._protected) > 1:
+                demoted_key, demoted = self._protected.popitem(last=False)
+                self._protected_bytes -= demoted[0]
+                self._probation[demoted_key] = demoted
+                self._probation_bytes += demoted[0]
+
+    def release(self, owner: Any, key: str) -> None:
+        """La entrada ya no está en el L1 (borrada, caducada o expulsada por el cache)"""
+        with self._lock:
+            self._remove((owner, key))
+
+    def release_owner(self, owner: Any) -> None:
+        with self._lock:
+            for segment in (self._probation, self._protected):
+                for entry_key in [k for k in segment if k[0] is owner]:
+                    self._remove(entry_key)
+            self._bytes_by_owner.pop(owner, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_bytes": self.max_bytes,
+                "used_bytes": self.used_bytes,
+                "probation_bytes": self._probation_bytes,
+                "protected_bytes": self._protected_bytes,
+                "entries": len(self._probation) + len(self._protected),
+                "evictions": self.evictions,
+            }
+
+
+memory_budget = MemoryBudget(int(float(os.getenv("CACHE_MEMORY_BUDGET_MB", "256")) * 1024 * 1024))
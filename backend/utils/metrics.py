@@ -0,0 +1,232 @@
+# backend/utils/metrics.py
+
+"""
+Métricas en memoria con exposición en formato de texto de Prometheus
+(GET /metrics). Sin dependencias: contadores, gauges e histogramas con
+etiquetas, más valores calculados al vuelo en cada scrape (callbacks) para estado que ya
+vive en otro sitio (caches, clientes de websockets).
+
+Las métricas son por proceso; con varios workers, Prometheus las agrega
+por instancia.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Buckets por defecto (segundos): de 5 ms a 10 s
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: Dict[str, str] | None = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], Dict[LabelValues, float]]] = []
+
+    def set_function(self, fn: Callable[[], Dict[LabelValues, float]]) -> None:
+        """fn() -> { (valores de etiquetas,): valor }, se evalúa en cada scrape"""
+        self._callbacks.append(fn)
+
+    def _collect(self, values: Dict[LabelValues, float]) -> Dict[LabelValues, float]:
+        for fn in list(self._callbacks):
+            try:
+                values.update(fn())
+            except Exception as e:
+                # Import tardío: utils.log importa este módulo
+                from utils.log import get_logger
+                get_logger("Metrics").error("❌ Error calculando %s: %s", self.name, e)
+        return values
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+                for key, v in sorted(self._collect(values).items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+                for key, v in sorted(self._collect(values).items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # { etiquetas: [cuentas por bucket..., suma, total] }
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self) -> Dict[LabelValues, tuple]:
+        """{ etiquetas: (suma, total) } para calcular deltas (benchmarks)"""
+        with self._lock:
+            return {key: (state[-2], state[-1]) for key, state in self._values.items()}
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for i, upper in enumerate(self.buckets):
+                cumulative += state[i]
+                le = {"le": _format_value(upper)}
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Módulos recargados (tests, debug de Flask): reutilizar la métrica
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+# Registro global del proceso
+registry = MetricsRegistry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ========================= Métricas comunes ==========================
+UPSTREAM_LATENCY = registry.histogram(
+    "spotify_upstream_request_seconds",
+    "Latencia de las llamadas a la Web API de Spotify",
+    ["endpoint"],
+)
+UPSTREAM_RESPONSES = registry.counter(
+    "spotify_upstream_responses_total",
+    "Respuestas de la Web API de Spotify por código de estado",
+    ["endpoint", "status"],
+)
+STAGE_LATENCY = registry.histogram(
+    "track_pipeline_stage_seconds",
+    "Duración de cada etapa al construir la canción actual",
+    ["stage"],
+)
+PUSH_LOOP_LAG = registry.histogram(
+    "live_push_loop_lag_seconds",
+    "Retraso de cada poll del visualizador en vivo respecto a su hora prevista",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+# Ids de Spotify (22 caracteres base62) fuera de las etiquetas: cardinalidad acotada
+_SPOTIFY_ID_RE = re.compile(r"/[0-9A-Za-z]{22}(?=/|$)")
+
+
+def endpoint_label(path: str) -> str:
+    """/audio-analysis/4uLU6hMC... -> /audio-analysis/{id}"""
+    return _SPOTIFY_ID_RE.sub("/{id}", path)
@@ -0,0 +1,87 @@
+# backend/utils/playback_clock.py
+
+"""
+Reloj de reproducción del servidor.
+Adjunta un timestamp a cada muestra de posición y responde intercambios de
+sincronización estilo NTP para que los clientes puedan extrapolar
+`progress_ms` localmente entre polls espaciados.
+
+Los timestamps (server_ts_ms, server_time_ms, los de clock_sync) son de reloj
+de pared: con varios nodos, la muestra y el ping de sincronización pueden
+venir de máquinas distintas y time.monotonic() no es comparable entre ellas.
+Para intervalos dentro del proceso se sigue usando time.monotonic().
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Dict, Any
+
+
+def server_now_ms() -> float:
+    """Tiempo del servidor (epoch) en milisegundos, comparable entre nodos"""
+    return time.time() * 1000.0
+
+
+def build_position_sample(raw_data: Dict, requested_at_ms: float, received_at_ms: float) -> Dict[str, Any]:
+    """
+    Construye una muestra de posición a partir de la respuesta de currently-playing.
+    El instante de la muestra se toma como el punto medio de la petición,
+    que es la mejor estimación de cuándo Spotify leyó `progress_ms`.
+    """
+    item = raw_data.get("item") or {}
+    return {
+        "progress_ms": int(raw_data.get("progress_ms") or 0),
+        "duration_ms": int(item.get("duration_ms") or 0),
+        "is_playing": bool(raw_data.get("is_playing", False)),
+        "track_id": item.get("id"),
+        "server_ts_ms": float((requested_at_ms + received_at_ms) / 2),
+        "uncertainty_ms": float(max(0.0, received_at_ms - requested_at_ms) / 2),
+    }
+
+
+def extrapolate_progress(sample: Dict | None, now_ms: float | None = None) -> int:
+    """Estima la posición actual a partir de una muestra previa"""
+    if not sample:
+        return 0
+
+    progress = sample.get("progress_ms", 0)
+    if not sample.get("is_playing"):
+        return int(progress)
+
+    if now_ms is None:
+        now_ms = server_now_ms()
+
+    elapsed = max(0.0, now_ms - sample.get("server_ts_ms", now_ms))
+    duration = sample.get("duration_ms") or 0
+    estimated = progress + elapsed
+    if duration:
+        estimated = min(estimated, duration)
+    return int(estimated)
+
+
+def remaining_ms(sample: Dict | None, now_ms: float | None = None) -> float | None:
+    """Milisegundos que faltan para que termine la canción (None si no se sabe)"""
+    if not sample or not sample.get("is_playing") or not sample.get("duration_ms"):
+        return None
+    return float(sample["duration_ms"] - extrapolate_progress(sample, now_ms))
+
+
+def clock_sync_reply(client_ts: Any, server_recv_ms: float) -> Dict[str, Any]:
+    """
+    Respuesta a un ping de sincronización (estilo NTP).
+    El cliente calcula con t0 (envío), t1 (recepción servidor),
+    t2 (envío servidor) y t3 (recepción cliente):
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        rtt    = (t3 - t0) - (t2 - t1)
+    """
+    try:
+        client_ts = float(client_ts)
+    except (TypeError, ValueError):
+        client_ts = None
+
+    return {
+        "client_ts": client_ts,
+        "server_recv_ts": float(server_recv_ms),
+        "server_send_ts": float(server_now_ms()),
+    }
@@ -0,0 +1,141 @@
+# backend/utils/quality_tiers.py
+
+"""
+Niveles de calidad del enriquecimiento de la canción actual.
+Cuando falta CPU o presupuesto de Spotify, el servicio recorta trabajo en vez
+de ir más lento:
+
+    0 full           todo (artista, paleta K-Means, audio analysis)
+    1 no_artist      sin pedir info del artista (se usa la del cache si la hay)
+    2 fast_palette   además, paleta con el cuantizador rápido (o la del cache)
+    3 features_only  además, sin audio analysis (movimiento solo con features)
+                     y paleta solo del cache o la por defecto
+
+El nivel se elige en cada respuesta a partir de señales de carga en vivo
+(cada una normalizada a 1.0 = saturado):
+- cpu:       fracción de un núcleo que usa este proceso (el GIL limita a ~1)
+- admission: ocupación del control de admisión de la clase "track"
+- upstream:  latencia reciente de Spotify frente a QUALITY_UPSTREAM_BUDGET_MS,
+             o 1.0 mientras dura un 429 (Retry-After)
+
+Un cliente puede pedir un nivel más bajo (X-Quality-Tier / ?quality= o
+"quality" al registrarse por websocket); nunca uno más alto que el de la carga.
+QUALITY_TIER fija el nivel para todo el proceso (por defecto "auto").
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import threading
+
+from utils.admission import track_admission, AdmissionController
+from utils.metrics import registry
+
+TIERS = ["full", "no_artist", "fast_palette", "features_only"]
+FULL, NO_ARTIST, FAST_PALETTE, FEATURES_ONLY = range(len(TIERS))
+
+TIER_SERVED = registry.counter(
+    "track_quality_tier_total",
+    "Respuestas de canción actual por nivel de calidad servido",
+    ["tier", "reason"],
+)
+
+
+def parse_tier(value) -> int | None:
+    """'2' / 2 / 'fast_palette' -> 2; None si no es un nivel válido"""
+    if value is None or value == "":
+        return None
+    text = str(value).strip().lower()
+    if text.isdigit():
+        tier = int(text)
+        return tier if 0 <= tier < len(TIERS) else None
+    return TIERS.index(text) if text in TIERS else None
+
+
+def _thresholds_from_env() -> tuple:
+    raw = os.getenv("QUALITY_THRESHOLDS", "0.6,0.8,0.95")
+    values = tuple(float(v) for v in raw.split(","))
+    if len(values) != len(TIERS) - 1:
+        raise ValueError(f"QUALITY_THRESHOLDS necesita {len(TIERS) - 1} valores: {raw}")
+    return values
+
+
+class QualityGovernor:
+    """Elige el nivel de calidad según la carga actual"""
+
+    # Cada cuánto se recalcula el uso de CPU del proceso
+    CPU_WINDOW_S = 1.0
+    # Suavizado de las señales (media móvil exponencial)
+    SMOOTHING = 0.3
+
+    def __init__(self, admission: AdmissionController = track_admission):
+        self.admission = admission
+        self.forced = parse_tier(os.getenv("QUALITY_TIER", "auto"))
+        self.thresholds = _thresholds_from_env()
+        self.upstream_budget_s = float(os.getenv("QUALITY_UPSTREAM_BUDGET_MS", "800")) / 1000
+
+        self._lock = threading.Lock()
+        self._upstream_latency_s = 0.0
+        self._throttled_until = 0.0
+        self._cpu_load = 0.0
+        self._cpu_sample = (time.monotonic(), time.process_time())
+
+    # ---------- Señales ----------
+    def record_upstream(self, status: int | None, elapsed_s: float, retry_after: str | None = None) -> None:
+        """Lo llama el servicio tras cada petición a Spotify"""
+        with self._lock:
+            self._upstream_latency_s += self.SMOOTHING * (elapsed_s - self._upstream_latency_s)
+            if status == 429:
+                try:
+                    wait_s = float(retry_after) if retry_after else 5.0
+                except ValueError:
+                    wait_s = 5.0
+                self._throttled_until = max(self._throttled_until, time.monotonic() + wait_s)
+
+    def _cpu(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            last_wall, last_cpu = self._cpu_sample
+            if now - last_wall >= self.CPU_WINDOW_S:
+                cpu = time.process_time()
+                load = (cpu - last_cpu) / (now - last_wall)
+                self._cpu_load += self.SMOOTHING * (load - self._cpu_load)
+                self._cpu_sample = (now, cpu)
+            return self._cpu_load
+
+    def signals(self) -> dict:
+        admission = 0.0
+        if self.admission.enabled:
+            capacity = self.admission.max_concurrent + self.admission.max_queue
+            admission = (self.admission.in_flight + self.admission.queue_depth) / max(1, capacity)
+
+        if time.monotonic() < self._throttled_until:
+            upstream = 1.0
+        else:
+            upstream = self._upstream_latency_s / self.upstream_budget_s if self.upstream_budget_s else 0.0
+
+        return {"cpu": round(self._cpu(), 3), "admission": round(admission, 3), "upstream": round(upstream, 3)}
+
+    # ---------- Elección ----------
+    def choose(self, requested: int | None = None) -> dict:
+        """
+        { "tier": 2, "name": "fast_palette", "reason": "cpu" }
+        reason: la señal que decidió, "forced" (QUALITY_TIER) o "client".
+        """
+        if self.forced is not None:
+            tier, reason = self.forced, "forced"
+        else:
+            signals = self.signals()
+            reason = max(signals, key=signals.get)
+            pressure = signals[reason]
+            tier = sum(1 for limit in self.thresholds if pressure >= limit)
+            if tier == FULL:
+                reason = "normal"
+
+        if requested is not None and requested > tier:
+            tier, reason = requested, "client"
+        return {"tier": tier, "name": TIERS[tier], "reason": reason}
+
+
+quality_governor = QualityGovernor()
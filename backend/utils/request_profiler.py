@@ -0,0 +1,147 @@
+# backend/utils/request_profiler.py
+
+"""
+Perfilado bajo demanda de una petición concreta (o un push de websockets).
+Solo para operadores: la petición debe traer el token de administración
+(ADMIN_TOKEN) además del flag de perfilado:
+
+    GET /api/current-track?profile=1
+    X-Admin-Token: <ADMIN_TOKEN>          (o X-Profile: 1 en lugar del query)
+
+Se usa cProfile (determinista) solo durante esa petición; el resto de
+peticiones no pagan nada. Los perfiles se guardan como ficheros .prof
+(formato pstats) en PROFILE_DIR y se descargan desde /api/admin/profiles.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import re
+import hmac
+import time
+import uuid
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List
+
+from utils.log import get_logger
+
+log = get_logger("Profiler")
+
+_DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "profiles")
+_PROFILE_ID_RE = re.compile(r"^[0-9]{13}-[a-z0-9_-]{1,40}-[0-9a-f]{8}$")
+
+
+def admin_token_valid(token: str | None) -> bool:
+    """Compara con ADMIN_TOKEN (sin ADMIN_TOKEN configurado no hay acceso)"""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+def profiling_requested(flask_request) -> bool:
+    """True si la petición pide perfilado y viene de un operador autorizado"""
+    flag = flask_request.headers.get("X-Profile") or flask_request.args.get("profile")
+    if str(flag).lower() not in ("1", "true", "yes"):
+        return False
+    return admin_token_valid(flask_request.headers.get("X-Admin-Token"))
+
+
+class RequestProfiler:
+    def __init__(self, directory: str | None = None, max_profiles: int | None = None):
+        self.directory = directory or os.getenv("PROFILE_DIR", _DEFAULT_DIR)
+        self.max_profiles = max_profiles or int(os.getenv("PROFILE_MAX_FILES", "50"))
+        # cProfile no admite dos perfiles activos a la vez: uno cada vez
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, label: str):
+        """
+        Perfila el bloque. Cede un dict que al salir lleva el "id" del perfil
+        guardado (o None si ya había otro perfil en curso).
+        """
+        run: Dict[str, Any] = {"id": None}
+        if not self._lock.acquire(blocking=False):
+            log.warning("⚠️ Ya hay un perfil en curso, se omite este")
+            yield run
+            return
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                yield run
+            finally:
+                profiler.disable()
+            run["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            run["id"] = self._save(profiler, label)
+            log.info("🔬 Perfil %s guardado (%s ms)", run["id"], run["duration_ms"])
+        finally:
+            self._lock.release()
+
+    def _save(self, profiler: cProfile.Profile, label: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        safe_label = re.sub(r"[^a-z0-9_-]", "-", label.lower())[:40] or "request"
+        profile_id = f"{int(time.time() * 1000)}-{safe_label}-{uuid.uuid4().hex[:8]}"
+        profiler.dump_stats(os.path.join(self.directory, f"{profile_id}.prof"))
+        self._prune()
+        return profile_id
+
+    def _prune(self) -> None:
+        profiles = self.list_profiles()
+        for entry in profiles[self.max_profiles:]:
+            try:
+                os.remove(self.path_for(entry["id"]))
+            except OSError:
+                pass
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Perfiles guardados, del más reciente al más antiguo"""
+        if not os.path.isdir(self.directory):
+            return []
+
+        profiles = []
+        for name in os.listdir(self.directory):
+            profile_id, ext = os.path.splitext(name)
+            if ext != ".prof" or not _PROFILE_ID_RE.match(profile_id):
+                continue
+            created_ms, rest = profile_id.split("-", 1)
+            label = rest.rsplit("-", 1)[0]
+            profiles.append({
+                "id": profile_id,
+                "label": label,
+                "created_ms": int(created_ms),
+                "size_bytes": os.path.getsize(os.path.join(self.directory, name)),
+            })
+        profiles.sort(key=lambda p: p["created_ms"], reverse=True)
+        return profiles
+
+    def path_for(self, profile_id: str) -> str | None:
+        """Ruta del perfil (None si el id no es válido o no existe)"""
+        if not _PROFILE_ID_RE.match(profile_id or ""):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.prof")
+        return path if os.path.isfile(path) else None
+
+    def render_text(self, profile_id: str, sort: str = "cumulative", limit: int = 50) -> str | None:
+        """Resumen legible (pstats) de un perfil"""
+        path = self.path_for(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(path, stream=out)
+        try:
+            stats.sort_stats(sort)
+        except KeyError:
+            stats.sort_stats("cumulative")
+        stats.print_stats(limit)
+        return out.getvalue()
+
+
+# Instancia global
+request_profiler = RequestProfiler()
@@ -0,0 +1,486 @@
+# backend/utils/shared_cache.py
+
+"""
+Cache compartido con dos niveles:
+- L1: LRU en proceso con TTL (objetos ya decodificados, sin copias).
+- L2: backend compartido entre workers (CACHE_BACKEND_URL):
+    memory://              sin L2 (solo L1; un proceso)
+    sqlite:///ruta/db      varios procesos en la misma máquina
+    redis://host:6379/0    varios nodos (requiere el paquete `redis`)
+
+Todos los L1 comparten un presupuesto de memoria (utils/memory_budget.py):
+además de su límite de entradas, cada cache puede perder entradas cuando el
+total del proceso pasa de CACHE_MEMORY_BUDGET_MB.
+
+Los valores se serializan con un códec propio: JSON para la estructura y los
+arrays de NumPy como bloques binarios crudos (sin pasar por listas), que se
+reconstruyen con np.frombuffer sin copiar. Las clases registradas con
+register_model() (utils/track_models.py) se guardan con su to_state().
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import struct
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List
+
+from utils.lazy_import import lazy_import, is_loaded
+from utils.metrics import registry
+from utils.tracing import span
+from utils.log import get_logger
+from utils.memory_budget import memory_budget, approx_size
+
+np = lazy_import("numpy")
+
+_MAGIC = b"SPC1"
+_MISSING = object()
+
+
+# ========================= Códec ==========================
+# Clases con to_state()/from_state() que el códec guarda como {"__model__": nombre, "state": ...}
+_MODELS: Dict[str, type] = {}
+
+
+def register_model(cls: type) -> type:
+    _MODELS[cls.__name__] = cls
+    return cls
+
+
+def encode_value(value: Any) -> bytes:
+    """Estructura en JSON + arrays de NumPy como bloques binarios al final"""
+    blobs: List[bytes] = []
+
+    def strip_arrays(obj):
+        if _MODELS.get(type(obj).__name__) is type(obj):
+            return {"__model__": type(obj).__name__, "state": strip_arrays(obj.to_state())}
+        if is_loaded("numpy"):
+            if isinstance(obj, np.ndarray):
+                array = np.ascontiguousarray(obj)
+                blobs.append(array.tobytes())
+                return {"__nd__": len(blobs) - 1, "dtype": array.dtype.str, "shape": list(array.shape)}
+            if isinstance(obj, np.generic):
+                return obj.item()
+        if isinstance(obj, dict):
+            return {str(k): strip_arrays(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [strip_arrays(v) for v in obj]
+        return obj
+
+    header = json.dumps(strip_arrays(value), separators=(",", ":")).encode()
+    lengths = struct.pack(f"<{len(blobs)}Q", *(len(b) for b in blobs))
+    return b"".join([_MAGIC, struct.pack("<II", len(header), len(blobs)), header, lengths] + blobs)
+
+
+def decode_value(data: bytes) -> Any:
+    if data[:4] != _MAGIC:
+        raise ValueError("Formato de cache desconocido")
+
+    header_len, n_blobs = struct.unpack_from("<II", data, 4)
+    offset = 12
+    header = json.loads(data[offset:offset + header_len])
+    offset += header_len
+    lengths = struct.unpack_from(f"<{n_blobs}Q", data, offset)
+    offset += 8 * n_blobs
+
+    buffer = memoryview(data)
+    arrays = []
+    for length in lengths:
+        arrays.append(buffer[offset:offset + length])
+        offset += length
+
+    def restore(obj):
+        if isinstance(obj, dict):
+            if "__nd__" in obj and "dtype" in obj and len(obj) == 3:
+                raw = arrays[obj["__nd__"]]
+                return np.frombuffer(raw, dtype=np.dtype(obj["dtype"])).reshape(obj["shape"])
+            if "__model__" in obj and len(obj) == 2 and obj["__model__"] in _MODELS:
+                return _MODELS[obj["__model__"]].from_state(restore(obj["state"]))
+            return {k: restore(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [restore(v) for v in obj]
+        return obj
+
+    has_models = b'"__model__"' in data[12:12 + header_len]
+    return restore(header) if n_blobs or has_models else header
+
+
+# ========================= Backends L2 ==========================
+class CacheBackend:
+    """Interfaz del nivel compartido (valores ya serializados)"""
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        raise NotImplementedError
+
+    def set_many(self, items: Dict[str, bytes], ttl_s: float | None = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class SQLiteCacheBackend(CacheBackend):
+    _PURGE_EVERY = 500
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        self._writes = 0
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        now = time.time()
+        result = {}
+        with self._lock:
+            # SQLite limita el número de parámetros: consultar por tandas
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({','.join('?' for _ in chunk)}) "
+                    f"AND (expires_at IS NULL OR expires_at > ?)",
+                    (*chunk, now),
+                ).fetchall()
+                result.update({key: bytes(value) for key, value in rows})
+        return result
+
+    def set_many(self, items, ttl_s=None):
+        expires_at = time.time() + ttl_s if ttl_s else None
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                [(key, value, expires_at) for key, value in items.items()],
+            )
+            self._writes += len(items)
+            if self._writes >= self._PURGE_EVERY:
+                self._writes = 0
+                self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                                   (time.time(),))
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class RedisCacheBackend(CacheBackend):
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND_URL=redis:// requiere `pip install redis`") from e
+        self._redis = redis.Redis.from_url(url)
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        return {key: value for key, value in zip(keys, self._redis.mget(keys)) if value is not None}
+
+    def set_many(self, items, ttl_s=None):
+        pipe = self._redis.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(key, value, px=int(ttl_s * 1000) if ttl_s else None)
+        pipe.execute()
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+
+_backend_lock = threading.Lock()
+_shared_backend: CacheBackend | None = None
+_shared_backend_url: str | None = None
+
+
+def get_shared_backend(url: str | None = None) -> CacheBackend | None:
+    """Backend L2 del proceso (uno por URL); None para memory://"""
+    global _shared_backend, _shared_backend_url
+    url = url or os.getenv("CACHE_BACKEND_URL", "memory://")
+
+    if url.startswith("memory://"):
+        return None
+
+    with _backend_lock:
+        if _shared_backend is None or _shared_backend_url != url:
+            if url.startswith("sqlite:///"):
+                _shared_backend = SQLiteCacheBackend(url[len("sqlite:///"):])
+            elif url.startswith(("redis://", "rediss://")):
+                _shared_backend = RedisCacheBackend(url)
+            else:
+                raise ValueError(f"CACHE_BACKEND_URL no soportada: {url}")
+            _shared_backend_url = url
+        return _shared_backend
+
+
+# ========================= Cache por niveles ==========================
+class TieredCache:
+    """
+    Cache con espacio de nombres: L1 en proceso delante de un L2 compartido.
+    Se comporta también como un dict (get / [] / in / pop) para que el código
+    que usaba diccionarios simples no tenga que cambiar.
+    """
+
+    def __init__(self, namespace: str, l2: CacheBackend | None = None, ttl_s: float | None = None,
+                 l1_max_entries: int = 1024, l1_ttl_s: float | None = None):
+        self.namespace = namespace
+        self.log = get_logger(f"SharedCache:{namespace}")
+        self.l2 = l2
+        self.ttl_s = ttl_s
+        self.l1_max_entries = l1_max_entries
+        self.l1_ttl_s = l1_ttl_s if l1_ttl_s is not None else ttl_s
+
+        self._lock = threading.Lock()
+        # { key: (expira_en | None, valor) } en orden LRU
+        self._l1: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "sets": 0}
+        # Salidas del L1: por el presupuesto común, por su límite de entradas o por TTL
+        self.evictions = {"budget": 0, "max_entries": 0, "expired": 0}
+        _live_caches.add(self)
+
+    def _l2_key(self, key: str) -> str:
+        return f"v1:{self.namespace}:{key}"
+
+    # ---------- L1 ----------
+    # Orden de locks: cache -> presupuesto (el presupuesto nunca toma el de un cache)
+    def _l1_get(self, key: str):
+        entry = self._l1.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._l1[key]
+            memory_budget.release(self, key)
+            self.evictions["expired"] += 1
+            return _MISSING
+        self._l1.move_to_end(key)
+        memory_budget.touch(self, key)
+        return value
+
+    def _l1_set(self, key: str, value: Any, ttl_s: float | None, size: int) -> list:
+        """Guarda en L1; devuelve las víctimas del presupuesto (ver _drop_victims)"""
+        expires_at = time.monotonic() + ttl_s if ttl_s else None
+        entry = (expires_at, value)
+        self._l1[key] = entry
+        self._l1.move_to_end(key)
+        victims = memory_budget.charge(self, key, size, entry)
+        while len(self._l1) > self.l1_max_entries:
+            old_key, _ = self._l1.popitem(last=False)
+            memory_budget.release(self, old_key)
+            self.evictions["max_entries"] += 1
+        return victims
+
+    @staticmethod
+    def _drop_victims(victims: list) -> None:
+        """Quita del L1 lo que expulsó el presupuesto (llamar sin ningún lock tomado)"""
+        for cache, key, token in victims:
+            cache._drop_l1(key, token)
+
+    def _drop_l1(self, key: str, token: tuple) -> None:
+        with self._lock:
+            # Solo si sigue siendo la misma entrada (pudo reescribirse entretanto)
+            if self._l1.get(key) is token:
+                del self._l1[key]
+                self.evictions["budget"] += 1
+
+    # ---------- API ----------
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = [k for k in dict.fromkeys(keys) if k is not None]
+        with span("cache.get", cache=self.namespace, keys=len(keys)) as s:
+            found = self._get_many(keys)
+            if s is not None:
+                s.set_attribute("hits", len(found))
+        return found
+
+    def _get_many(self, keys: List[str]) -> Dict[str, Any]:
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+
+        with self._lock:
+            for key in keys:
+                value = self._l1_get(key)
+                if value is _MISSING:
+                    missing.append(key)
+                else:
+                    found[key] = value
+            self.stats["l1_hits"] += len(found)
+
+        if missing and self.l2 is not None:
+            try:
+                raw = self.l2.get_many([self._l2_key(k) for k in missing])
+            except Exception as e:
+                self.log.warning("❌ Error leyendo L2: %s", e)
+                raw = {}
+
+            decoded = {}
+            for key in missing:
+                data = raw.get(self._l2_key(key))
+                if data is not None:
+                    try:
+                        decoded[key] = decode_value(data)
+                    except Exception as e:
+                        self.log.warning("⚠️ Entrada corrupta %s: %s", key, e)
+
+            sizes = {key: approx_size(value) for key, value in decoded.items()}
+            victims = []
+            with self._lock:
+                for key, value in decoded.items():
+                    victims += self._l1_set(key, value, self.l1_ttl_s, sizes[key])
+                self.stats["l2_hits"] += len(decoded)
+            self._drop_victims(victims)
+            found.update(decoded)
+
+        with self._lock:
+            self.stats["misses"] += len(keys) - len(found)
+        return found
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def set_many(self, items: Dict[str, Any], ttl_s: float | None = None) -> None:
+        ttl_s = ttl_s if ttl_s is not None else self.ttl_s
+        l1_ttl_s = min(ttl_s, self.l1_ttl_s or ttl_s) if ttl_s else self.l1_ttl_s
+        # Medir fuera del lock: recorrer un análisis grande cuesta milisegundos
+        sizes = {key: approx_size(value) for key, value in items.items()}
+        victims = []
+        with self._lock:
+            for key, value in items.items():
+                victims += self._l1_set(key, value, l1_ttl_s, sizes[key])
+            self.stats["sets"] += len(items)
+        self._drop_victims(victims)
+
+        if self.l2 is not None and items:
+            try:
+                self.l2.set_many({self._l2_key(k): encode_value(v) for k, v in items.items()}, ttl_s)
+            except Exception as e:
+                self.log.warning("❌ Error escribiendo L2: %s", e)
+
+    def set(self, key: str, value: Any, ttl_s: float | None = None) -> None:
+        self.set_many({key: value}, ttl_s)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if self._l1.pop(key, None) is not None:
+                memory_budget.release(self, key)
+        if self.l2 is not None:
+            try:
+                self.l2.delete(self._l2_key(key))
+            except Exception as e:
+                self.log.warning("❌ Error borrando en L2: %s", e)
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._l1.clear()
+            memory_budget.release_owner(self)
+
+    # ---------- Compatibilidad con dict ----------
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.set(key, value)
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        value = self.get(key, default)
+        self.delete(key)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._l1)
+
+    def hit_ratio(self) -> float:
+        hits = self.stats["l1_hits"] + self.stats["l2_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+
+# Caches vivos del proceso (para métricas)
+_live_caches: "weakref.WeakSet[TieredCache]" = weakref.WeakSet()
+
+
+def iter_caches() -> List[TieredCache]:
+    return list(_live_caches)
+
+
+def _stats_by_namespace() -> Dict[str, Dict[str, int]]:
+    totals: Dict[str, Dict[str, int]] = {}
+    for cache in iter_caches():
+        entry = totals.setdefault(cache.namespace, {
+            "l1_hits": 0, "l2_hits": 0, "misses": 0, "sets": 0, "l1_entries": 0, "l1_bytes": 0,
+            "evicted_budget": 0, "evicted_max_entries": 0, "evicted_expired": 0,
+        })
+        for key, value in cache.stats.items():
+            entry[key] += value
+        for reason, count in cache.evictions.items():
+            entry[f"evicted_{reason}"] += count
+        entry["l1_entries"] += len(cache)
+        entry["l1_bytes"] += memory_budget.bytes_for(cache)
+    return totals
+
+
+def cache_report() -> Dict[str, Any]:
+    """Presupuesto común + tamaño, aciertos y expulsiones por cache (endpoint de administración)"""
+    caches = {}
+    for namespace, stats in sorted(_stats_by_namespace().items()):
+        total = stats["l1_hits"] + stats["l2_hits"] + stats["misses"]
+        caches[namespace] = dict(stats, hit_ratio=round((stats["l1_hits"] + stats["l2_hits"]) / total, 4)
+                                 if total else 0.0)
+    return {"budget": memory_budget.stats(), "caches": caches}
+
+
+def _hit_ratios():
+    ratios = {}
+    for namespace, stats in _stats_by_namespace().items():
+        total = stats["l1_hits"] + stats["l2_hits"] + stats["misses"]
+        ratios[(namespace,)] = (stats["l1_hits"] + stats["l2_hits"]) / total if total else 0.0
+    return ratios
+
+
+def _lookups():
+    return {
+        (namespace, result): stats[result]
+        for namespace, stats in _stats_by_namespace().items()
+        for result in ("l1_hits", "l2_hits", "misses")
+    }
+
+
+registry.gauge("cache_hit_ratio", "Aciertos (L1 + L2) / consultas por cache", ["cache"]).set_function(_hit_ratios)
+registry.counter("cache_lookups_total", "Consultas a cada cache por resultado", ["cache", "result"]).set_function(_lookups)
+registry.gauge("cache_l1_entries", "Entradas en el L1 de cada cache", ["cache"]).set_function(
+    lambda: {(ns,): stats["l1_entries"] for ns, stats in _stats_by_namespace().items()}
+)
+registry.gauge("cache_l1_bytes", "Bytes aproximados en el L1 de cada cache", ["cache"]).set_function(
+    lambda: {(ns,): stats["l1_bytes"] for ns, stats in _stats_by_namespace().items()}
+)
+registry.counter("cache_evictions_total", "Entradas que salen del L1 por cache y motivo",
+                 ["cache", "reason"]).set_function(
+    lambda: {
+        (ns, reason): stats[f"evicted_{reason}"]
+        for ns, stats in _stats_by_namespace().items()
+        for reason in ("budget", "max_entries", "expired")
+    }
+)
+registry.gauge("cache_memory_budget_bytes", "Presupuesto común de los L1 y cuánto se usa",
+               ["kind"]).set_function(
+    lambda: {("budget",): memory_budget.max_bytes, ("used",): memory_budget.used_bytes}
+)
+
+
+def create_cache(namespace: str, ttl_s: float | None = None, l1_max_entries: int = 1024,
+                 l1_ttl_s: float | None = None) -> TieredCache:
+    """Cache con el backend L2 configurado en CACHE_BACKEND_URL"""
+    return TieredCache(namespace, get_shared_backend(), ttl_s, l1_max_entries, l1_ttl_s)
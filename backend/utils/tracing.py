@@ -0,0 +1,254 @@
+# backend/utils/tracing.py
+
+"""
+Trazas por petición / ciclo de push con spans anidados (estilo OpenTelemetry).
+- Span raíz: la petición HTTP o el ciclo de push de websockets.
+- Hijos: llamadas a Spotify, lecturas de cache, extracción de colores,
+  modelo derivado, serialización...
+
+Exportación (TRACE_EXPORT):
+    (vacío)                         desactivado: span() no hace nada
+    file:///ruta/traces.jsonl       una línea OTLP/JSON por traza
+    http://collector:4318/v1/traces OTLP/HTTP JSON (p.ej. un OpenTelemetry Collector)
+
+TRACE_SAMPLE_RATE (0..1) decide qué fracción de raíces se trazan. Los spans
+se exportan en un hilo aparte al cerrar la raíz.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import queue
+import random
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List
+
+import requests
+
+from utils.log import get_logger, current_request_id
+
+log = get_logger("Tracing")
+
+# Tipos de span de OTLP
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "spoty-backend")
+
+_current_span: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+_NOOP = nullcontext()
+
+
+class Span:
+    __slots__ = ("trace", "name", "kind", "span_id", "parent_id", "start_ns", "end_ns", "attributes",
+                 "status", "status_message")
+
+    def __init__(self, trace: "_Trace", name: str, kind: int, parent_id: str | None, attributes: Dict):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes = dict(attributes)
+        self.status = _STATUS_OK
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        self.status = _STATUS_ERROR
+        self.status_message = message
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+            "status": {"code": self.status, "message": self.status_message},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans", "lock")
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+# ========================= Exportador ==========================
+class TraceExporter:
+    """Cola + hilo que escribe las trazas terminadas (nunca bloquea la petición)"""
+
+    def __init__(self, target: str):
+        self.target = target
+        self._queue: queue.Queue = queue.Queue(maxsize=1000)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+        self.dropped = 0
+
+    def submit(self, trace: _Trace) -> None:
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    @staticmethod
+    def build_payload(traces: List[_Trace]) -> Dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "spoty.tracing"},
+                    "spans": [span.to_otlp() for trace in traces for span in trace.spans],
+                }],
+            }]
+        }
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            # Juntar lo que haya pendiente en un solo envío
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._export(batch)
+            except Exception as e:
+                log.warning("❌ Error exportando %s trazas: %s", len(batch), e)
+
+    def _export(self, traces: List[_Trace]) -> None:
+        if self.target.startswith("file://"):
+            path = self.target[len("file://"):]
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                for trace in traces:
+                    f.write(json.dumps(self.build_payload([trace]), separators=(",", ":")) + "\n")
+        else:
+            requests.post(self.target, json=self.build_payload(traces), timeout=5)
+
+
+def _create_exporter() -> TraceExporter | None:
+    target = os.getenv("TRACE_EXPORT", "").strip()
+    if not target:
+        return None
+    if not target.startswith(("file://", "http://", "https://")):
+        raise ValueError(f"TRACE_EXPORT no soportado: {target}")
+    log.info("🛰️ Exportando trazas a %s", target)
+    return TraceExporter(target)
+
+
+_exporter = _create_exporter()
+SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+
+def tracing_enabled() -> bool:
+    return _exporter is not None
+
+
+# ========================= API ==========================
+def start_root_span(name: str, kind: int = KIND_SERVER, **attributes) -> tuple | None:
+    """
+    Abre un span raíz (petición o ciclo de push). Devuelve un handle para
+    end_root_span(), o None si no se traza (desactivado o fuera de muestreo).
+    """
+    if _exporter is None or random.random() >= SAMPLE_RATE:
+        return None
+
+    attributes.setdefault("request.id", current_request_id())
+    root = Span(_Trace(), name, kind, None, attributes)
+    return root, _current_span.set(root)
+
+
+def end_root_span(handle: tuple | None, error: str | None = None, **attributes) -> None:
+    if handle is None:
+        return
+    root, token = handle
+    root.attributes.update(attributes)
+    if error:
+        root.set_error(error)
+    root.end_ns = time.time_ns()
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # Cerrado desde otro contexto (p.ej. teardown de Flask): basta con limpiar
+        _current_span.set(None)
+
+    with root.trace.lock:
+        root.trace.spans.append(root)
+    _exporter.submit(root.trace)
+
+
+@contextmanager
+def _child_span(parent: Span, name: str, kind: int, attributes: Dict):
+    span = Span(parent.trace, name, kind, parent.span_id, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.set_error(str(e))
+        raise
+    finally:
+        span.end_ns = time.time_ns()
+        _current_span.reset(token)
+        with parent.trace.lock:
+            parent.trace.spans.append(span)
+
+
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """
+    with span("spotify GET /me/player", http_status=...) as s: ...
+    Fuera de una traza (o con el trazado desactivado) no hace nada: cede None.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP
+    return _child_span(parent, name, kind, attributes)
+
+
+@contextmanager
+def root_span(name: str, kind: int = KIND_SERVER, **attributes):
+    """Versión context manager de start_root_span / end_root_span"""
+    handle = start_root_span(name, kind, **attributes)
+    error = None
+    try:
+        yield handle[0] if handle else None
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        end_root_span(handle, error)
@@ -0,0 +1,415 @@
+# backend/utils/track_models.py
+
+"""
+Modelos compactos para lo que se guarda por canción en los caches:
+- AudioFeatures: los campos de /audio-features en __slots__ (sin dict por
+  instancia). Acceso por atributo en los cálculos y .get()/[] como un dict.
+- AudioAnalysis: cada bloque del análisis (bars, beats, tatums, sections,
+  segments) como una matriz float64 por columnas en vez de miles de dicts;
+  pitches/timbre como matrices (n, 12).
+- Palette: la paleta de la portada con los colores empaquetados en bytes.
+
+Todos vuelven al JSON de siempre con to_json() (mismas claves y tipos), y se
+guardan en el L2 con to_state()/from_state() a través del códec del cache
+(utils/shared_cache.py), con los arrays como bloques binarios.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Tuple
+
+from utils.lazy_import import lazy_import
+from utils.shared_cache import register_model
+
+np = lazy_import("numpy")
+
+_MISSING = object()
+
+# Las tuplas de claves se repiten en todas las respuestas: una sola copia
+_interned: Dict[tuple, tuple] = {}
+
+
+def _intern(keys) -> tuple:
+    keys = tuple(keys)
+    return _interned.setdefault(keys, keys)
+
+
+# ========================= Audio features ==========================
+@register_model
+class AudioFeatures:
+    """Audio features de un track; los campos que falten valen None"""
+
+    FIELDS = (
+        "danceability", "energy", "key", "loudness", "mode", "speechiness", "acousticness",
+        "instrumentalness", "liveness", "valence", "tempo", "type", "id", "uri", "track_href",
+        "analysis_url", "duration_ms", "time_signature",
+    )
+
+    # Valores que usan los cálculos del servicio cuando Spotify no da el campo
+    DEFAULTS = {
+        "energy": 0.5, "tempo": 120, "danceability": 0.5, "valence": 0.5, "acousticness": 0.5,
+        "instrumentalness": 0, "liveness": 0.2, "speechiness": 0.1, "loudness": -10,
+        "key": 0, "mode": 1, "duration_ms": 180000,
+    }
+
+    __slots__ = FIELDS + ("_keys", "_extra")
+
+    EMPTY: "AudioFeatures"
+
+    def __init__(self, data: Dict | None = None):
+        data = data or {}
+        for name in self.FIELDS:
+            setattr(self, name, data.get(name))
+        # Orden original de las claves (para devolver el mismo JSON)
+        self._keys = _intern(data)
+        extra = {k: v for k, v in data.items() if k not in self.FIELDS}
+        self._extra = extra or None
+
+    @classmethod
+    def coerce(cls, value) -> "AudioFeatures":
+        """Modelo a partir de un modelo, un dict (entradas antiguas del cache) o None"""
+        if isinstance(value, cls):
+            return value
+        return cls(value) if value else cls.EMPTY
+
+    # ---------- Compatibilidad con dict ----------
+    def _lookup(self, name: str):
+        if name not in self._keys:
+            return _MISSING
+        if self._extra is not None and name in self._extra:
+            return self._extra[name]
+        return getattr(self, name)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        value = self._lookup(name)
+        return default if value is _MISSING or value is None else value
+
+    def __getitem__(self, name: str) -> Any:
+        value = self._lookup(name)
+        if value is _MISSING:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._keys
+
+    def __bool__(self) -> bool:
+        return bool(self._keys)
+
+    def __repr__(self) -> str:
+        return f"AudioFeatures({self.id!r})"
+
+    # ---------- Cálculos ----------
+    def filled(self) -> "AudioFeatures":
+        """Copia con DEFAULTS donde falte un valor (f.energy, f.tempo... nunca None)"""
+        data = self.to_json()
+        for name, default in self.DEFAULTS.items():
+            if data.get(name) is None:
+                data[name] = default
+        return AudioFeatures(data)
+
+    # ---------- Serialización ----------
+    def to_json(self) -> Dict[str, Any]:
+        return {key: self._lookup(key) for key in self._keys}
+
+    def to_state(self) -> Dict[str, Any]:
+        return self.to_json()
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "AudioFeatures":
+        return cls(state)
+
+
+AudioFeatures.EMPTY = AudioFeatures()
+
+
+# ========================= Audio analysis ==========================
+class _Block:
+    """
+    Lista de dicts numéricos como matriz (n, campos) float64.
+    NaN marca un campo que esa fila no traía; las columnas que eran enteras
+    vuelven como int. Los campos lista (pitches, timbre) van en su propia
+    matriz (n, longitud).
+    """
+
+    __slots__ = ("fields", "ints", "values", "vectors", "sparse")
+
+    def __init__(self, fields: tuple, ints: tuple, values, vectors: Dict[str, Any], sparse: bool):
+        self.fields = fields
+        self.ints = ints
+        self.values = values
+        self.vectors = vectors
+        self.sparse = sparse
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def pack(cls, rows: List[Dict]) -> "_Block | None":
+        """None si la lista no tiene la forma esperada (se guarda tal cual)"""
+        fields: Dict[str, None] = {}
+        vector_lengths: Dict[str, int] = {}
+        non_int = set()
+        for row in rows:
+            if not isinstance(row, dict):
+                return None
+            for key, value in row.items():
+                if isinstance(value, list):
+                    if vector_lengths.setdefault(key, len(value)) != len(value) or key in fields:
+                        return None
+                elif type(value) is int:
+                    fields.setdefault(key)
+                elif type(value) is float:
+                    fields.setdefault(key)
+                    non_int.add(key)
+                else:
+                    return None
+        if set(vector_lengths) & set(fields):
+            return None
+
+        names = _intern(fields)
+        values = np.full((len(rows), len(names)), np.nan)
+        vectors = {name: np.empty((len(rows), length)) for name, length in vector_lengths.items()}
+        try:
+            for i, row in enumerate(rows):
+                for name in vectors:
+                    vectors[name][i] = row[name]
+                values[i] = [row.get(name, math.nan) for name in names]
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        ints = tuple(j for j, name in enumerate(names) if name not in non_int)
+        return cls(names, ints, values, vectors, bool(np.isnan(values).any()))
+
+    def column(self, name: str) -> List:
+        """Valores de un campo (None donde falte)"""
+        if name not in self.fields:
+            return [None] * len(self)
+        j = self.fields.index(name)
+        cast = int if j in self.ints else float
+        return [None if v != v else cast(v) for v in self.values[:, j].tolist()]
+
+    def to_json(self) -> List[Dict[str, Any]]:
+        rows = []
+        vectors = {name: matrix.tolist() for name, matrix in self.vectors.items()}
+        for i, row in enumerate(self.values.tolist()):
+            for j in self.ints:
+                if row[j] == row[j]:
+                    row[j] = int(row[j])
+            if self.sparse:
+                item = {name: v for name, v in zip(self.fields, row) if v == v}
+            else:
+                item = dict(zip(self.fields, row))
+            for name, matrix in vectors.items():
+                item[name] = matrix[i]
+            rows.append(item)
+        return rows
+
+    def to_state(self) -> Dict[str, Any]:
+        return {"fields": list(self.fields), "ints": list(self.ints), "values": self.values,
+                "vectors": self.vectors, "sparse": self.sparse}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "_Block":
+        return cls(_intern(state["fields"]), tuple(state["ints"]), state["values"],
+                   state["vectors"], state["sparse"])
+
+
+@register_model
+class AudioAnalysis:
+    """Audio analysis con los bloques por tiempo como matrices"""
+
+    BLOCKS = ("bars", "beats", "tatums", "sections", "segments")
+
+    __slots__ = ("_keys", "_blocks", "_other")
+
+    EMPTY: "AudioAnalysis"
+
+    def __init__(self, keys: tuple, blocks: Dict[str, Any], other: Dict[str, Any]):
+        self._keys = keys
+        # Cada bloque es un _Block o, si no se pudo empaquetar, la lista original
+        self._blocks = blocks
+        # meta, track y cualquier otra clave que no sea un bloque
+        self._other = other
+
+    @classmethod
+    def from_json(cls, data: Dict | None) -> "AudioAnalysis":
+        if not data:
+            return cls.EMPTY
+        blocks, other = {}, {}
+        for key, value in data.items():
+            if key in cls.BLOCKS and isinstance(value, list):
+                blocks[key] = _Block.pack(value) or value
+            else:
+                other[key] = value
+        return cls(_intern(data), blocks, other)
+
+    @classmethod
+    def coerce(cls, value) -> "AudioAnalysis":
+        """Modelo a partir de un modelo, un dict (entradas antiguas del cache) o None"""
+        if isinstance(value, cls):
+            return value
+        return cls.from_json(value)
+
+    # ---------- Consultas para los cálculos ----------
+    def count(self, block: str) -> int:
+        return len(self._blocks.get(block, ()))
+
+    def column(self, block: str, field: str) -> List:
+        """p.ej. column("sections", "loudness") -> [-8.2, -5.1, ...] (None donde falte)"""
+        value = self._blocks.get(block)
+        if value is None:
+            return []
+        if isinstance(value, _Block):
+            return value.column(field)
+        return [row.get(field) for row in value]
+
+    # ---------- Compatibilidad con dict ----------
+    def _json_value(self, key: str):
+        if key in self._blocks:
+            value = self._blocks[key]
+            return value.to_json() if isinstance(value, _Block) else value
+        return self._other[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._json_value(key) if key in self._keys else default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._json_value(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def __bool__(self) -> bool:
+        return bool(self._keys)
+
+    def __repr__(self) -> str:
+        return f"AudioAnalysis(beats={self.count('beats')}, segments={self.count('segments')})"
+
+    # ---------- Serialización ----------
+    def to_json(self) -> Dict[str, Any]:
+        return {key: self._json_value(key) for key in self._keys}
+
+    def to_state(self) -> Dict[str, Any]:
+        blocks = {
+            key: value.to_state() if isinstance(value, _Block) else {"rows": value}
+            for key, value in self._blocks.items()
+        }
+        return {"keys": list(self._keys), "blocks": blocks, "other": self._other}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "AudioAnalysis":
+        blocks = {
+            key: value["rows"] if "rows" in value else _Block.from_state(value)
+            for key, value in state["blocks"].items()
+        }
+        return cls(_intern(state["keys"]), blocks, state["other"])
+
+
+AudioAnalysis.EMPTY = AudioAnalysis((), {}, {})
+
+
+# ========================= Paleta ==========================
+def _pack_rgb(colors) -> bytes:
+    return bytes(int(c) for rgb in colors for c in rgb)
+
+
+def _unpack_rgb(data: bytes) -> List[Tuple[int, int, int]]:
+    return [tuple(data[i:i + 3]) for i in range(0, len(data), 3)]
+
+
+def _hex(rgb) -> str:
+    return f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"
+
+
+@register_model
+class Palette:
+    """Resultado de AdvancedColorExtractor.extract_album_colors con los colores en bytes"""
+
+    # Campos lista de colores RGB, empaquetados 3 bytes por color
+    COLOR_FIELDS = ("dominant_rgb", "accent_rgb", "palette_rgb", "analogous_colors",
+                    "triadic_colors", "monochromatic_colors")
+
+    __slots__ = ("_colors", "gradient", "text_color", "color_mood", "color_vibrancy", "contrast_ratio")
+
+    KEYS = ("dominant_rgb", "dominant_hex", "accent_rgb", "accent_hex", "palette_rgb", "palette_hex",
+            "analogous_colors", "triadic_colors", "monochromatic_colors", "background_gradient",
+            "text_color", "color_mood", "color_vibrancy", "contrast_ratio")
+
+    def __init__(self, colors: Dict[str, bytes], gradient: bytes, text_color: str, color_mood: str,
+                 color_vibrancy: str, contrast_ratio: float):
+        self._colors = colors
+        self.gradient = gradient
+        self.text_color = text_color
+        self.color_mood = color_mood
+        self.color_vibrancy = color_vibrancy
+        self.contrast_ratio = contrast_ratio
+
+    @classmethod
+    def from_result(cls, result: Dict) -> "Palette | None":
+        """None si el dict no es una paleta completa (p.ej. la de error)"""
+        if not isinstance(result, dict) or tuple(result) != cls.KEYS:
+            return None
+        try:
+            colors = {
+                "dominant_rgb": _pack_rgb([result["dominant_rgb"]]),
+                "accent_rgb": _pack_rgb([result["accent_rgb"]]),
+            }
+            for name in cls.COLOR_FIELDS[2:]:
+                colors[name] = _pack_rgb(result[name])
+            gradient = bytes.fromhex("".join(h.lstrip("#") for h in result["background_gradient"]))
+        except (TypeError, ValueError, AttributeError):
+            return None
+
+        palette = cls(colors, gradient, result["text_color"], result["color_mood"],
+                      result["color_vibrancy"], float(result["contrast_ratio"]))
+        # Solo si vuelve exactamente igual (colores fuera de 0-255, hex distintos...)
+        return palette if _as_lists(palette.to_json()) == _as_lists(result) else None
+
+    def to_json(self) -> Dict[str, Any]:
+        dominant = _unpack_rgb(self._colors["dominant_rgb"])[0]
+        accent = _unpack_rgb(self._colors["accent_rgb"])[0]
+        palette_rgb = _unpack_rgb(self._colors["palette_rgb"])
+        return {
+            "dominant_rgb": dominant,
+            "dominant_hex": _hex(dominant),
+            "accent_rgb": accent,
+            "accent_hex": _hex(accent),
+            "palette_rgb": palette_rgb,
+            "palette_hex": [_hex(c) for c in palette_rgb],
+            "analogous_colors": _unpack_rgb(self._colors["analogous_colors"]),
+            "triadic_colors": _unpack_rgb(self._colors["triadic_colors"]),
+            "monochromatic_colors": _unpack_rgb(self._colors["monochromatic_colors"]),
+            "background_gradient": [_hex(c) for c in _unpack_rgb(self.gradient)],
+            "text_color": self.text_color,
+            "color_mood": self.color_mood,
+            "color_vibrancy": self.color_vibrancy,
+            "contrast_ratio": self.contrast_ratio,
+        }
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "colors": {name: data.hex() for name, data in self._colors.items()},
+            "gradient": self.gradient.hex(),
+            "text": [self.text_color, self.color_mood, self.color_vibrancy],
+            "contrast_ratio": self.contrast_ratio,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "Palette":
+        colors = {name: bytes.fromhex(data) for name, data in state["colors"].items()}
+        text_color, color_mood, color_vibrancy = state["text"]
+        return cls(colors, bytes.fromhex(state["gradient"]), text_color, color_mood,
+                   color_vibrancy, state["contrast_ratio"])
+
+
+def _as_lists(obj):
+    """Tuplas y listas como listas (para comparar con lo que vuelve de JSON)"""
+    if isinstance(obj, (list, tuple)):
+        return [_as_lists(v) for v in obj]
+    if isinstance(obj, dict):
+        return {k: _as_lists(v) for k, v in obj.items()}
+    return obj
@@ -0,0 +1,365 @@
+# backend/websockets/cluster.py
+
+"""
+Estado compartido del visualizador en vivo para varios procesos / nodos.
+- Registro de clientes (sid -> token, usuario y nodo dueño del socket).
+- Elección de líder por usuario con leases: solo un nodo hace poll a
+  Spotify para un usuario dado y emite a todos sus sockets (vía la cola
+  de mensajes de Socket.IO).
+
+Backends (CLUSTER_BACKEND_URL):
+- memory://              un solo proceso (por defecto, y para tests)
+- sqlite:///ruta/db      varios procesos en la misma máquina (fichero)
+- redis://host:6379/0    varios nodos (requiere el paquete `redis`)
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from typing import Dict, Any, List
+
+CLIENT_TTL_S = float(os.getenv("CLUSTER_CLIENT_TTL", "30"))
+
+
+def default_node_id() -> str:
+    return os.getenv("NODE_ID") or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class ClusterBackend:
+    """Interfaz común de los backends"""
+
+    def register_client(self, sid: str, node_id: str, access_token: str, user_key: str) -> None:
+        raise NotImplementedError
+
+    def unregister_client(self, sid: str) -> None:
+        raise NotImplementedError
+
+    def update_token(self, user_key: str, access_token: str) -> None:
+        """Sustituye el token de todos los sockets de un usuario"""
+        raise NotImplementedError
+
+    def heartbeat(self, node_id: str, sids: List[str]) -> None:
+        """Mantiene vivos los clientes de este nodo"""
+        raise NotImplementedError
+
+    def list_clients(self) -> List[Dict[str, Any]]:
+        """Clientes vivos de todos los nodos: [{sid, node_id, access_token, user_key, registered_at}]"""
+        raise NotImplementedError
+
+    def has_clients(self, user_key: str) -> bool:
+        """Si el usuario tiene algún cliente vivo en cualquier nodo (sin recorrer todo el registro)"""
+        raise NotImplementedError
+
+    def acquire_lease(self, key: str, node_id: str, ttl_s: float) -> bool:
+        """Toma o renueva el lease `key`. True si este nodo es el líder"""
+        raise NotImplementedError
+
+    def release_lease(self, key: str, node_id: str) -> None:
+        raise NotImplementedError
+
+    def clients_by_user(self) -> Dict[str, List[Dict[str, Any]]]:
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for client in self.list_clients():
+            grouped.setdefault(client["user_key"], []).append(client)
+        return grouped
+
+
+class InMemoryClusterBackend(ClusterBackend):
+    """Stand-in en proceso: mismo comportamiento, sin compartir nada"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[str, Dict[str, Any]] = {}
+        self._leases: Dict[str, tuple] = {}
+
+    def register_client(self, sid, node_id, access_token, user_key):
+        now = time.time()
+        with self._lock:
+            self._clients[sid] = {
+                "sid": sid, "node_id": node_id, "access_token": access_token,
+                "user_key": user_key, "registered_at": now, "heartbeat": now,
+            }
+
+    def unregister_client(self, sid):
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    def update_token(self, user_key, access_token):
+        with self._lock:
+            for client in self._clients.values():
+                if client["user_key"] == user_key:
+                    client["access_token"] = access_token
+
+    def heartbeat(self, node_id, sids):
+        now = time.time()
+        with self._lock:
+            for sid in sids:
+                if sid in self._clients and self._clients[sid]["node_id"] == node_id:
+                    self._clients[sid]["heartbeat"] = now
+
+    def list_clients(self):
+        limit = time.time() - CLIENT_TTL_S
+        with self._lock:
+            return [dict(c) for c in self._clients.values() if c["heartbeat"] >= limit]
+
+    def has_clients(self, user_key):
+        limit = time.time() - CLIENT_TTL_S
+        with self._lock:
+            return any(c["user_key"] == user_key and c["heartbeat"] >= limit for c in self._clients.values())
+
+    def acquire_lease(self, key, node_id, ttl_s):
+        now = time.time()
+        with self._lock:
+            holder = self._leases.get(key)
+            if holder is None or holder[0] == node_id or holder[1] < now:
+                self._leases[key] = (node_id, now + ttl_s)
+                return True
+            return False
+
+    def release_lease(self, key, node_id):
+        with self._lock:
+            if self._leases.get(key, (None,))[0] == node_id:
+                self._leases.pop(key, None)
+
+
+class SQLiteClusterBackend(ClusterBackend):
+    """Backend en fichero: varios procesos de la misma máquina comparten el estado"""
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS clients (
+        sid           TEXT PRIMARY KEY,
+        node_id       TEXT NOT NULL,
+        access_token  TEXT NOT NULL,
+        user_key      TEXT NOT NULL,
+        registered_at REAL NOT NULL,
+        heartbeat     REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS clients_by_user ON clients (user_key);
+    CREATE TABLE IF NOT EXISTS leases (
+        key        TEXT PRIMARY KEY,
+        node_id    TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self._SCHEMA)
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def register_client(self, sid, node_id, access_token, user_key):
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO clients (sid, node_id, access_token, user_key, registered_at, heartbeat) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (sid, node_id, access_token, user_key, now, now),
+        )
+
+    def unregister_client(self, sid):
+        self._execute("DELETE FROM clients WHERE sid = ?", (sid,))
+
+    def update_token(self, user_key, access_token):
+        self._execute("UPDATE clients SET access_token = ? WHERE user_key = ?", (access_token, user_key))
+
+    def heartbeat(self, node_id, sids):
+        if not sids:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE clients SET heartbeat = ? WHERE sid = ? AND node_id = ?",
+                [(now, sid, node_id) for sid in sids],
+            )
+            # Limpieza de clientes de nodos caídos
+            self._conn.execute("DELETE FROM clients WHERE heartbeat < ?", (now - CLIENT_TTL_S * 4,))
+
+    def list_clients(self):
+        rows = self._execute(
+            "SELECT sid, node_id, access_token, user_key, registered_at FROM clients WHERE heartbeat >= ?",
+            (time.time() - CLIENT_TTL_S,),
+        )
+        return [dict(row) for row in rows]
+
+    def has_clients(self, user_key):
+        rows = self._execute(
+            "SELECT 1 FROM clients WHERE user_key = ? AND heartbeat >= ? LIMIT 1",
+            (user_key, time.time() - CLIENT_TTL_S),
+        )
+        return bool(rows)
+
+    def acquire_lease(self, key, node_id, ttl_s):
+        now = time.time()
+        with self._lock:
+            # Atómico en SQLite: solo se escribe si no hay dueño, somos nosotros o expiró
+            self._conn.execute(
+                "INSERT INTO leases (key, node_id, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET node_id = excluded.node_id, expires_at = excluded.expires_at "
+                "WHERE leases.node_id = excluded.node_id OR leases.expires_at < ?",
+                (key, node_id, now + ttl_s, now),
+            )
+            row = self._conn.execute("SELECT node_id FROM leases WHERE key = ?", (key,)).fetchone()
+        return bool(row and row["node_id"] == node_id)
+
+    def release_lease(self, key, node_id):
+        self._execute("DELETE FROM leases WHERE key = ? AND node_id = ?", (key, node_id))
+
+
+class RedisClusterBackend(ClusterBackend):
+    """Backend multi-nodo sobre Redis (paquete `redis` opcional)"""
+
+    _CLIENTS_KEY = "spoty:clients"
+    # Índice sids por usuario (spoty:user_clients:<user_key>) para has_clients
+    _USER_CLIENTS_PREFIX = "spoty:user_clients:"
+    _LEASE_PREFIX = "spoty:lease:"
+    # Renovar / liberar solo si el lease es nuestro
+    _RENEW_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    _RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+    # Leer-modificar-escribir de los clientes dentro de Redis: sin carreras con
+    # register/unregister ni con los heartbeats de otros nodos
+    _UPDATE_TOKEN_SCRIPT = """
+    local updated = 0
+    local entries = redis.call('hgetall', KEYS[1])
+    for i = 1, #entries, 2 do
+        local client = cjson.decode(entries[i + 1])
+        if client['user_key'] == ARGV[1] then
+            client['access_token'] = ARGV[2]
+            redis.call('hset', KEYS[1], entries[i], cjson.encode(client))
+            updated = updated + 1
+        end
+    end
+    return updated
+    """
+    _UNREGISTER_SCRIPT = """
+    local raw = redis.call('hget', KEYS[1], ARGV[1])
+    if raw then
+        local client = cjson.decode(raw)
+        redis.call('srem', ARGV[2] .. client['user_key'], ARGV[1])
+        redis.call('hdel', KEYS[1], ARGV[1])
+    end
+    return 0
+    """
+    _HEARTBEAT_SCRIPT = """
+    for i = 3, #ARGV do
+        local raw = redis.call('hget', KEYS[1], ARGV[i])
+        if raw then
+            local client = cjson.decode(raw)
+            if client['node_id'] == ARGV[1] then
+                client['heartbeat'] = tonumber(ARGV[2])
+                redis.call('hset', KEYS[1], ARGV[i], cjson.encode(client))
+            end
+        end
+    end
+    return 0
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CLUSTER_BACKEND_URL=redis:// requiere `pip install redis`") from e
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._renew = self._redis.register_script(self._RENEW_SCRIPT)
+        self._release = self._redis.register_script(self._RELEASE_SCRIPT)
+        self._update_token = self._redis.register_script(self._UPDATE_TOKEN_SCRIPT)
+        self._heartbeat = self._redis.register_script(self._HEARTBEAT_SCRIPT)
+        self._unregister = self._redis.register_script(self._UNREGISTER_SCRIPT)
+
+    def register_client(self, sid, node_id, access_token, user_key):
+        now = time.time()
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.hset(self._CLIENTS_KEY, sid, json.dumps({
+            "sid": sid, "node_id": node_id, "access_token": access_token,
+            "user_key": user_key, "registered_at": now, "heartbeat": now,
+        }))
+        pipe.sadd(self._USER_CLIENTS_PREFIX + user_key, sid)
+        pipe.execute()
+
+    def unregister_client(self, sid):
+        self._unregister(keys=[self._CLIENTS_KEY], args=[sid, self._USER_CLIENTS_PREFIX])
+
+    def has_clients(self, user_key):
+        index_key = self._USER_CLIENTS_PREFIX + user_key
+        sids = list(self._redis.smembers(index_key))
+        if not sids:
+            return False
+        limit = time.time() - CLIENT_TTL_S
+        gone = []
+        for sid, raw in zip(sids, self._redis.hmget(self._CLIENTS_KEY, sids)):
+            if raw is None:
+                gone.append(sid)
+            elif json.loads(raw)["heartbeat"] >= limit:
+                return True
+        if gone:
+            # Clientes ya purgados del registro (nodos caídos)
+            self._redis.srem(index_key, *gone)
+        return False
+
+    def update_token(self, user_key, access_token):
+        self._update_token(keys=[self._CLIENTS_KEY], args=[user_key, access_token])
+
+    def heartbeat(self, node_id, sids):
+        if not sids:
+            return
+        # repr: sin perder decimales al pasar por el script
+        self._heartbeat(keys=[self._CLIENTS_KEY], args=[node_id, repr(time.time()), *sids])
+
+    def list_clients(self):
+        limit = time.time() - CLIENT_TTL_S
+        clients = []
+        stale = []
+        for sid, raw in self._redis.hgetall(self._CLIENTS_KEY).items():
+            client = json.loads(raw)
+            if client["heartbeat"] >= limit:
+                clients.append(client)
+            elif client["heartbeat"] < limit - CLIENT_TTL_S * 3:
+                stale.append(sid)
+        if stale:
+            self._redis.hdel(self._CLIENTS_KEY, *stale)
+        return clients
+
+    def acquire_lease(self, key, node_id, ttl_s):
+        lease_key = self._LEASE_PREFIX + key
+        ttl_ms = int(ttl_s * 1000)
+        if self._redis.set(lease_key, node_id, nx=True, px=ttl_ms):
+            return True
+        return bool(self._renew(keys=[lease_key], args=[node_id, ttl_ms]))
+
+    def release_lease(self, key, node_id):
+        self._release(keys=[self._LEASE_PREFIX + key], args=[node_id])
+
+
+def create_cluster_backend(url: str | None = None) -> ClusterBackend:
+    """Crea el backend a partir de CLUSTER_BACKEND_URL (memory:// por defecto)"""
+    url = url or os.getenv("CLUSTER_BACKEND_URL", "memory://")
+
+    if url.startswith("memory://"):
+        return InMemoryClusterBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteClusterBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://")):
+        return RedisClusterBackend(url)
+
+    raise ValueError(f"CLUSTER_BACKEND_URL no soportada: {url}")
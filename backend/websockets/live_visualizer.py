@@ -3,26 +3,88 @@
 """
 Servidor de WebSockets usando Flask-SocketIO para enviar al frontend
 la info de la canción actual en "tiempo real" para el visualizador.
+
+Varios procesos / nodos:
+- SOCKETIO_MESSAGE_QUEUE (p.ej. redis://...) para que cualquier nodo pueda
+  emitir a un socket conectado a otro.
+- CLUSTER_BACKEND_URL para el registro compartido de clientes y los leases
+  (ver websockets/cluster.py): solo el nodo líder de un usuario hace poll.
 """
 
 from __future__ import annotations
 
+import os
 import time
+import hashlib
 from threading import Lock
 
 from flask import request
 from flask_socketio import SocketIO, emit, disconnect
 
-from services.spotify_service import EnhancedSpotifyService
+from auth.token_manager import token_manager
+from services.spotify_service import get_spotify_service
+from utils.playback_clock import server_now_ms, remaining_ms, clock_sync_reply
+from websockets.cluster import create_cluster_backend, default_node_id
+from utils.metrics import registry, PUSH_LOOP_LAG
+from utils.request_profiler import request_profiler, admin_token_valid
+from utils.log import get_logger, set_request_id
+from utils.tracing import span, root_span, KIND_INTERNAL
+from utils.quality_tiers import parse_tier
+from websockets.send_queue import LatestOnlySender
+
+log = get_logger("live_visualizer")
 
 # Instancia sin app; se inicializa luego
 socketio = SocketIO(cors_allowed_origins="*")
 
-spotify_service = EnhancedSpotifyService()
+spotify_service = get_spotify_service()
 
-# Diccionario: { session_id: access_token }
+# Envíos con backpressure: a un cliente lento solo le llega el último frame
+sender = LatestOnlySender(socketio)
+
+# Clientes conectados a ESTE proceso: { session_id: access_token }
 connected_clients: dict[str, str] = {}
 
+# Estado compartido entre nodos (registro de clientes + leases de poll)
+NODE_ID = default_node_id()
+cluster = create_cluster_backend()
+
+# Última muestra de posición y próximo poll por usuario (solo de los usuarios
+# de los que este nodo es líder): { user_key: {...} }
+_user_playback: dict[str, dict] = {}
+
+# Intervalos de poll (segundos). Los clientes extrapolan la posición entre polls,
+# así que solo hace falta volver a preguntar a Spotify de vez en cuando o al final
+# de la canción.
+POLL_INTERVAL_S = float(os.getenv("LIVE_POLL_INTERVAL", "10"))
+IDLE_POLL_INTERVAL_S = float(os.getenv("LIVE_IDLE_POLL_INTERVAL", "5"))
+MIN_POLL_INTERVAL_S = 1.0
+TRACK_END_MARGIN_S = 0.5
+
+# El lease de poll de un usuario se renueva en cada tick; si el nodo muere,
+# otro lo toma al expirar
+LEASE_TTL_S = float(os.getenv("CLUSTER_LEASE_TTL", "15"))
+HEARTBEAT_INTERVAL_S = 5.0
+
+# Nivel de calidad pedido por los sockets de este proceso: { sid: tier }.
+# Si el líder del usuario es otro nodo no lo ve y usa el nivel automático.
+_client_quality: dict[str, int] = {}
+
+# Usuario de cada socket de este proceso: { sid: user_key }
+_client_users: dict[str, str] = {}
+
+# Pushes a perfilar (pedidos por un operador): { user_key: sid que lo pidió }
+_profile_requests: dict[str, str] = {}
+
+# Métricas: clientes de este proceso y usuarios de los que somos líder
+registry.gauge("live_websocket_clients", "Sockets con token registrado en este proceso").set_function(
+    lambda: {(): len(connected_clients)}
+)
+registry.gauge("live_polled_users", "Usuarios de los que este proceso hace poll").set_function(
+    lambda: {(): len(_user_playback)}
+)
+_PUSHES = registry.counter("live_pushes_total", "Eventos current_track emitidos", ["result"])
+
 # Control para el hilo de actualización
 _thread = None
 _thread_lock = Lock()
@@ -33,45 +95,176 @@ def init_socketio(app):
     Llamar desde app.py para inicializar SocketIO con la app Flask:
     """
     global socketio
-    socketio.init_app(app, cors_allowed_origins="*")
+    socketio.init_app(
+        app,
+        cors_allowed_origins="*",
+        message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE") or None,
+        channel=os.getenv("SOCKETIO_CHANNEL", "flask-socketio"),
+    )
     return socketio
 
 
+def _user_key(access_token: str) -> str:
+    """Usuario de Spotify del token (o un hash del token si no se puede resolver)"""
+    return spotify_service.get_user_id(access_token) or hashlib.sha256(access_token.encode()).hexdigest()
+
+
+def _on_token_refreshed(user_id: str, access_token: str, previous_token: str | None) -> None:
+    """Cambia el token nuevo en los sockets del usuario sin esperar a un 401"""
+    for sid, token in list(connected_clients.items()):
+        if token == previous_token:
+            connected_clients[sid] = access_token
+    try:
+        cluster.update_token(user_id, access_token)
+    except Exception as e:
+        log.warning("Error actualizando el token de %s: %s", user_id, e)
+
+
+token_manager.add_listener(_on_token_refreshed)
+
+
+def _next_poll_delay(track_data: dict) -> float:
+    """
+    Calcula cuándo volver a consultar Spotify para un cliente:
+    - Sin reproducción: intervalo de reposo.
+    - Reproduciendo: el intervalo normal, o justo después del final de la canción
+      si termina antes.
+    """
+    sample = track_data.get("position_sample")
+    if not track_data.get("is_playing") or not sample:
+        return IDLE_POLL_INTERVAL_S
+
+    left_ms = remaining_ms(sample)
+    if left_ms is None:
+        return POLL_INTERVAL_S
+
+    until_end = left_ms / 1000 + TRACK_END_MARGIN_S
+    return max(MIN_POLL_INTERVAL_S, min(POLL_INTERVAL_S, until_end))
+
+
+def _poll_user(user_key: str, clients: list[dict], now: float) -> None:
+    """Poll a Spotify para un usuario y emisión a todos sus sockets (de cualquier nodo)"""
+    # Cada ciclo de push tiene su propio id de correlación en los logs
+    set_request_id()
+    with root_span("ws.push_cycle", KIND_INTERNAL, user=user_key, clients=len(clients)):
+        _poll_user_cycle(user_key, clients, now)
+
+
+def _poll_user_cycle(user_key: str, clients: list[dict], now: float) -> None:
+    # El token registrado más reciente es el que tiene más vida por delante
+    access_token = max(clients, key=lambda c: c["registered_at"])["access_token"]
+    # Si este proceso gestiona los tokens del usuario, usar el vigente
+    access_token = token_manager.fresh_token_for(access_token) or access_token
+
+    # Se sirve el mejor nivel que pida cualquiera de sus sockets
+    requested = [_client_quality.get(c["sid"]) for c in clients]
+    quality = None if None in requested else min(requested)
+
+    try:
+        track_data = spotify_service.get_current_track_enhanced(access_token, quality)
+        if track_data is None:
+            # Algo falló al consultar Spotify, reintentamos en el intervalo de reposo
+            _user_playback[user_key] = {"next_poll": now + IDLE_POLL_INTERVAL_S}
+            _PUSHES.inc(result="upstream_error")
+            return
+
+        _user_playback[user_key] = {
+            "sample": track_data.get("position_sample"),
+            "next_poll": time.monotonic() + _next_poll_delay(track_data),
+        }
+
+        # Emitimos a cada socket del usuario (room=sid; la cola de mensajes lo
+        # entrega aunque el socket esté en otro nodo). Serializar es parte del emit.
+        # Si un cliente no ha drenado el anterior, este lo sustituye.
+        with span("serialize+emit", sockets=len(clients)):
+            sender.send_many([client["sid"] for client in clients], "current_track", track_data)
+        _PUSHES.inc(len(clients), result="sent")
+
+    except Exception as e:
+        log.warning("Error actualizando usuario %s: %s", user_key, e)
+        _PUSHES.inc(result="error")
+        _user_playback[user_key] = {"next_poll": now + IDLE_POLL_INTERVAL_S}
+
+
 def _background_worker():
     """
-    Hilo de fondo que cada N segundos:
-    - Recorre los clientes conectados.
-    - Pide al servicio de Spotify la canción actual.
-    - Emite un evento 'current_track' a cada cliente.
+    Hilo de fondo (uno por proceso) que:
+    - Mantiene vivos en el registro compartido los clientes de este nodo.
+    - Para cada usuario con clientes, intenta ser su líder (lease); solo el
+      líder pide la canción actual, y solo cuando toca según la última muestra
+      de posición.
+    - Emite un evento 'current_track' a cada socket del usuario.
+    Un error con un usuario no para el hilo; si aun así termina, el siguiente
+    connect lo vuelve a lanzar.
     """
-    print("[live_visualizer] Hilo de fondo iniciado ✅")
+    global _thread
+    log.info("Hilo de fondo iniciado ✅ (nodo %s)", NODE_ID)
+    try:
+        _worker_loop()
+    except Exception as e:
+        log.error("💥 Hilo de fondo terminado: %s", e)
+    finally:
+        with _thread_lock:
+            _thread = None
+
+
+def _worker_loop():
+    last_heartbeat = 0.0
 
     while True:
-        # Pequeño delay para no spamear la API (ajusta a tu gusto)
-        time.sleep(2)
+        # Tick corto: el poll real de cada usuario lo decide su propia agenda
+        time.sleep(MIN_POLL_INTERVAL_S / 2)
+        now = time.monotonic()
 
-        if not connected_clients:
+        try:
+            if connected_clients and now - last_heartbeat >= HEARTBEAT_INTERVAL_S:
+                cluster.heartbeat(NODE_ID, list(connected_clients))
+                last_heartbeat = now
+
+            clients_by_user = cluster.clients_by_user()
+        except Exception as e:
+            log.warning("Error leyendo el registro de clientes: %s", e)
             continue
 
-        # Copia local para evitar problemas mientras se itera
-        clients_snapshot = dict(connected_clients)
+        # Olvidar usuarios sin clientes
+        for user_key in list(_user_playback):
+            if user_key not in clients_by_user:
+                _user_playback.pop(user_key, None)
+                try:
+                    cluster.release_lease(f"poll:{user_key}", NODE_ID)
+                except Exception as e:
+                    log.warning("Error liberando el lease de %s: %s", user_key, e)
 
-        for sid, access_token in clients_snapshot.items():
+        for user_key, clients in clients_by_user.items():
             try:
-                track_data = spotify_service.get_current_track_full(access_token)
-                if track_data is None:
-                    # Algo falló al consultar Spotify, no emitimos nada
-                    continue
-
-                # Emitimos al cliente específico (room=sid)
-                socketio.emit(
-                    "current_track",
-                    track_data,
-                    room=sid,
-                )
-
+                _service_user(user_key, clients, now)
             except Exception as e:
-                print(f"[live_visualizer] Error actualizando cliente {sid}: {e}")
+                log.warning("Error atendiendo al usuario %s: %s", user_key, e)
+
+
+def _service_user(user_key: str, clients: list[dict], now: float) -> None:
+    """Un tick del worker para un usuario: lease, agenda y poll (perfilado si se pidió)"""
+    if not cluster.acquire_lease(f"poll:{user_key}", NODE_ID, LEASE_TTL_S):
+        # Otro nodo es el líder de este usuario
+        _user_playback.pop(user_key, None)
+        return
+
+    playback = _user_playback.get(user_key)
+    if playback and playback.get("next_poll", 0) > now:
+        return
+    if playback:
+        # Cuánto tarde llegamos respecto al poll previsto
+        PUSH_LOOP_LAG.observe(max(0.0, now - playback["next_poll"]))
+
+    requester_sid = _profile_requests.pop(user_key, None)
+    if requester_sid is None:
+        _poll_user(user_key, clients, now)
+        return
+
+    # Push perfilado bajo demanda
+    with request_profiler.profile("ws-push") as run:
+        _poll_user(user_key, clients, now)
+    socketio.emit("profile_ready", {"profile_id": run["id"]}, room=requester_sid)
 
 
 def _ensure_background_thread():
@@ -87,7 +280,7 @@ def handle_connect():
     Evento cuando un cliente WebSocket se conecta.
     """
     sid = request.sid
-    print(f"[live_visualizer] Cliente conectado: {sid}")
+    log.info("Cliente conectado: %s", sid)
     # Lanzamos el hilo de fondo si aún no está corriendo
     _ensure_background_thread()
     emit("connected", {"message": "WebSocket conectado al servidor"})
@@ -99,8 +292,18 @@ def handle_disconnect():
     Evento cuando un cliente se desconecta.
     """
     sid = request.sid
-    print(f"[live_visualizer] Cliente desconectado: {sid}")
+    log.info("Cliente desconectado: %s", sid)
     connected_clients.pop(sid, None)
+    _client_quality.pop(sid, None)
+    sender.forget(sid)
+    user_key = _client_users.pop(sid, None)
+    try:
+        cluster.unregister_client(sid)
+        # Sin más sockets del usuario en ningún nodo: dejar de refrescar sus tokens
+        if user_key and not cluster.has_clients(user_key):
+            token_manager.remove_user(user_key)
+    except Exception as e:
+        log.warning("Error dando de baja el socket %s: %s", sid, e)
 
 
 @socketio.on("register_access_token")
@@ -109,9 +312,11 @@ def handle_register_access_token(data):
     El cliente debe llamar este evento después de conectarse
     mandando algo como:
 
-    socket.emit("register_access_token", { access_token: "..." })
+    socket.emit("register_access_token", { access_token: "...", refresh_token: "..." })
 
-    para que el backend sepa qué token usar para ese cliente.
+    para que el backend sepa qué token usar para ese cliente. El refresh_token
+    es opcional: si llega, el servidor renueva el token antes de que caduque.
+    "quality" (opcional, p.ej. "fast_palette") pide un nivel de calidad más bajo.
     """
     sid = request.sid
     access_token = data.get("access_token")
@@ -122,5 +327,52 @@ def handle_register_access_token(data):
         return
 
     connected_clients[sid] = access_token
-    print(f"[live_visualizer] Registrado access_token para {sid}")
+    quality = parse_tier(data.get("quality"))
+    if quality is not None:
+        _client_quality[sid] = quality
+    user_key = _user_key(access_token)
+    _client_users[sid] = user_key
+    cluster.register_client(sid, NODE_ID, access_token, user_key)
+    if data.get("refresh_token"):
+        token_manager.store_tokens(user_key, {
+            "access_token": access_token,
+            "refresh_token": data["refresh_token"],
+            "expires_in": data.get("expires_in"),
+        })
+    # Forzar un poll inmediato con el nuevo token (si este nodo es el líder)
+    _user_playback.pop(user_key, None)
+    log.debug("Registrado access_token para %s", sid)
     emit("registration_ok", {"success": True})
+
+
+@socketio.on("profile_next_push")
+def handle_profile_next_push(data):
+    """
+    Operadores: perfila el siguiente push del usuario de este socket.
+    socket.emit("profile_next_push", { admin_token: "..." })
+    Responde con 'profile_ready' { profile_id } (descarga en /api/admin/profiles/<id>).
+    Solo funciona en el nodo que hace poll del usuario.
+    """
+    sid = request.sid
+    access_token = connected_clients.get(sid)
+    if not admin_token_valid((data or {}).get("admin_token")) or not access_token:
+        emit("profile_error", {"error": "Forbidden"})
+        return
+
+    user_key = _user_key(access_token)
+    _profile_requests[user_key] = sid
+    # Adelantar el poll para no esperar al siguiente intervalo
+    _user_playback.pop(user_key, None)
+    emit("profile_scheduled", {"success": True})
+
+
+@socketio.on("clock_sync")
+def handle_clock_sync(data):
+    """
+    Intercambio de sincronización de reloj (estilo NTP).
+    El cliente manda { client_ts: <su reloj en ms> } varias veces y se queda
+    con la respuesta de menor RTT para calcular el offset con el servidor.
+    """
+    server_recv_ms = server_now_ms()
+    client_ts = (data or {}).get("client_ts")
+    emit("clock_sync_reply", clock_sync_reply(client_ts, server_recv_ms))
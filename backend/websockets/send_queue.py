@@ -0,0 +1,203 @@
+# backend/websockets/send_queue.py
+
+"""
+Colas de envío por socket con semántica "solo el último".
+
+Socket.IO encola sin límite lo que no ha podido entregar a un cliente lento:
+la memoria crece y los current_track llegan tarde y viejos. Aquí cada socket
+tiene un hueco por evento:
+- Si no hay otro frame del mismo evento sin salir hacia el cliente, se
+  entrega enseguida.
+- Si lo hay, se queda en el hueco; un frame más nuevo del mismo evento
+  sustituye al que no se llegó a entregar (coalesced).
+- Como mucho WS_MAX_OUTSTANDING_BYTES por cliente entregados a Engine.IO y aún
+  sin salir de su cola (siempre se permite uno si no hay ninguno pendiente).
+- Un frame que lleva más de WS_MAX_FRAME_AGE_S esperando se descarta (dropped):
+  el siguiente push traerá datos frescos.
+
+"Sin salir" se mide con la cola de paquetes de Engine.IO del socket, así que
+funciona con los clientes actuales (sin acks). Solo aplica a sockets
+conectados a este proceso; los de otros nodos (cola de mensajes) se emiten
+directamente y los gestiona el nodo que los tiene.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import threading
+from typing import Any, Dict
+
+from utils.metrics import registry
+from utils.log import get_logger
+
+log = get_logger("SendQueue")
+
+MAX_OUTSTANDING_BYTES = int(os.getenv("WS_MAX_OUTSTANDING_BYTES", str(1024 * 1024)))
+MAX_FRAME_AGE_S = float(os.getenv("WS_MAX_FRAME_AGE_S", "30"))
+FLUSH_INTERVAL_S = 0.05
+
+FRAMES = registry.counter(
+    "ws_frames_total",
+    "Frames de websocket por evento y resultado (sent / coalesced / dropped)",
+    ["event", "result"],
+)
+
+
+def frame_size(data: Any) -> int:
+    """Bytes aproximados del frame (el JSON que enviará Socket.IO)"""
+    try:
+        return len(json.dumps(data, separators=(",", ":"), default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class FrameSize:
+    """
+    Tamaño de un frame, medido la primera vez que hace falta. Medir es un
+    json.dumps completo (un current_track con análisis pasa de 400 KB), y solo
+    importa si el cliente ya tiene frames sin salir; el mismo objeto sirve
+    para todos los sockets que reciben el frame.
+    """
+
+    __slots__ = ("_data", "_bytes")
+
+    def __init__(self, data: Any = None, size: int | None = None):
+        self._data = data
+        self._bytes = size
+
+    @property
+    def bytes(self) -> int:
+        if self._bytes is None:
+            self._bytes = frame_size(self._data)
+            self._data = None
+        return self._bytes
+
+
+class LatestOnlySender:
+    def __init__(self, socketio, namespace: str = "/"):
+        self.socketio = socketio
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        # { sid: { event: (data, bytes, encolado_en) } }
+        self._pending: Dict[str, Dict[str, tuple]] = {}
+        # { sid: [[FrameSize], {eventos}] entregados a Engine.IO desde que su cola estuvo vacía }
+        self._outstanding: Dict[str, list] = {}
+        self._flusher = None
+
+        registry.gauge("ws_pending_frames", "Frames esperando a que el cliente drene").set_function(
+            self._pending_frames_metric
+        )
+        registry.gauge("ws_outstanding_bytes", "Bytes entregados a Engine.IO aún en su cola").set_function(
+            self._outstanding_bytes_metric
+        )
+
+    # ---------- Métricas (con el lock: las listas cambian desde send/flush) ----------
+    def _pending_frames_metric(self) -> Dict[tuple, int]:
+        with self._lock:
+            return {(): sum(len(events) for events in self._pending.values())}
+
+    def _outstanding_bytes_metric(self) -> Dict[tuple, int]:
+        with self._lock:
+            return {(): sum(size.bytes for sizes, _ in self._outstanding.values() for size in sizes)}
+
+    # ---------- Estado del transporte ----------
+    def _engine_queue_size(self, sid: str) -> int | None:
+        """
+        Paquetes sin salir de la cola de Engine.IO; None si el socket no está en
+        este proceso. Usa internos de python-socketio/python-engineio (versiones
+        fijadas en requirements.txt; tests/test_send_queue.py avisa si cambian).
+        """
+        server = getattr(self.socketio, "server", None)
+        if server is None:
+            return None
+        try:
+            eio_sid = server.manager.eio_sid_from_sid(sid, self.namespace)
+            eio_socket = server.eio.sockets.get(eio_sid) if eio_sid else None
+        except Exception:
+            return None
+        if eio_socket is None:
+            return None
+        return eio_socket.queue.qsize()
+
+    def _can_send(self, sid: str, event: str, size: FrameSize) -> bool:
+        # Llamar con el lock tomado. Los tamaños solo se miden si hay algo sin salir
+        if self._engine_queue_size(sid) == 0:
+            self._outstanding.pop(sid, None)
+        outstanding = self._outstanding.get(sid)
+        if outstanding is None:
+            return True
+        if event in outstanding[1]:
+            return False
+        return sum(s.bytes for s in outstanding[0]) + size.bytes <= MAX_OUTSTANDING_BYTES
+
+    def _emit(self, sid: str, event: str, data: Any, size: FrameSize) -> None:
+        outstanding = self._outstanding.setdefault(sid, [[], set()])
+        outstanding[0].append(size)
+        outstanding[1].add(event)
+        self.socketio.emit(event, data, room=sid, namespace=self.namespace)
+        FRAMES.inc(event=event, result="sent")
+
+    # ---------- API ----------
+    def send(self, sid: str, event: str, data: Any, size: FrameSize | int | None = None) -> None:
+        """Envía ya si el cliente puede recibir; si no, deja solo este frame pendiente"""
+        if self._engine_queue_size(sid) is None:
+            # Socket de otro nodo (o sin servidor aún): emisión directa
+            self.socketio.emit(event, data, room=sid, namespace=self.namespace)
+            FRAMES.inc(event=event, result="sent")
+            return
+
+        if not isinstance(size, FrameSize):
+            size = FrameSize(data, size)
+        with self._lock:
+            events = self._pending.get(sid)
+            if events and event in events:
+                FRAMES.inc(event=event, result="coalesced")
+            elif not events and self._can_send(sid, event, size):
+                self._emit(sid, event, data, size)
+                return
+            self._pending.setdefault(sid, {})[event] = (data, size, time.monotonic())
+        self._ensure_flusher()
+
+    def send_many(self, sids: list, event: str, data: Any) -> None:
+        """El mismo frame a varios sockets (se mide como mucho una vez)"""
+        size = FrameSize(data)
+        for sid in sids:
+            self.send(sid, event, data, size)
+
+    def forget(self, sid: str) -> None:
+        """Socket desconectado: lo pendiente ya no se entregará"""
+        with self._lock:
+            for event in self._pending.pop(sid, {}):
+                FRAMES.inc(event=event, result="dropped")
+            self._outstanding.pop(sid, None)
+
+    def flush(self) -> None:
+        """Entrega lo pendiente de los clientes que ya han drenado"""
+        now = time.monotonic()
+        with self._lock:
+            for sid in list(self._pending):
+                events = self._pending[sid]
+                for event, (data, size, queued_at) in list(events.items()):
+                    if now - queued_at > MAX_FRAME_AGE_S:
+                        del events[event]
+                        FRAMES.inc(event=event, result="dropped")
+                    elif self._can_send(sid, event, size):
+                        del events[event]
+                        self._emit(sid, event, data, size)
+                if not events:
+                    del self._pending[sid]
+
+    def _flush_loop(self) -> None:
+        while True:
+            self.socketio.sleep(FLUSH_INTERVAL_S)
+            try:
+                self.flush()
+            except Exception as e:
+                log.warning("Error vaciando colas de envío: %s", e)
+
+    def _ensure_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = self.socketio.start_background_task(self._flush_loop)
@@ -414,9 +414,46 @@
 
         let isPolling = false;
         let pollInterval;
+        let progressInterval;
+        let trackEndTimeout;
         let errorCount = 0;
         const MAX_ERRORS = 3;
 
+        const config = window.AppConfig || {};
+        const POLL_INTERVAL_MS = config.pollingIntervalMs || 15000;
+        const PROGRESS_TICK_MS = config.progressTickMs || 1000;
+        const TRACK_END_MARGIN_MS = 500;
+
+        // Reloj de reproducción: extrapola la posición entre polls espaciados
+        const playbackClock = window.PlaybackClock ? new window.PlaybackClock() : null;
+
+        function scheduleTrackEndPoll() {
+            if (trackEndTimeout) {
+                clearTimeout(trackEndTimeout);
+                trackEndTimeout = null;
+            }
+            if (!playbackClock) return;
+
+            // Si la canción termina antes del próximo poll, preguntar justo después
+            const remaining = playbackClock.remainingMs();
+            if (remaining !== null && remaining + TRACK_END_MARGIN_MS < POLL_INTERVAL_MS) {
+                trackEndTimeout = setTimeout(pollData, Math.max(0, remaining) + TRACK_END_MARGIN_MS);
+            }
+        }
+
+        function tickProgress() {
+            if (!playbackClock || !playbackClock.sample || !window.currentVisualizer) return;
+
+            const progressMs = playbackClock.progressMs();
+            const visualizer = window.currentVisualizer;
+            if (visualizer.currentTrackState) {
+                visualizer.currentTrackState.progressMs = progressMs;
+            }
+            if (visualizer.activeVisualizer && typeof visualizer.activeVisualizer.progressMs === 'number') {
+                visualizer.activeVisualizer.progressMs = progressMs;
+            }
+        }
+
         async function pollData() {
             const isAuthenticated = auth.isAuthenticated();
 
@@ -432,6 +469,7 @@
                 // Si no hay canción reproduciéndose
                 if (!currentTrack || currentTrack.is_playing === false) {
                     console.log("⏸️ No hay canción reproduciéndose");
+                    if (playbackClock) playbackClock.setSample(null);
 
                     // Si hay visualizador, poner en estado de espera
                     if (window.currentVisualizer) {
@@ -483,6 +521,12 @@
                 console.log("🔊 Audio features disponibles:", currentTrack.audio_features ? "SÍ" : "NO");
                 console.log("🎨 Visualizer data disponible:", currentTrack.visualizer ? "SÍ" : "NO");
 
+                // Guardar la muestra de posición para extrapolar entre polls
+                if (playbackClock) {
+                    playbackClock.setSample(currentTrack.position_sample);
+                    scheduleTrackEndPoll();
+                }
+
                 // Actualizar UI inmediatamente
                 updateNowPlayingUI(currentTrack);
 
@@ -511,7 +555,9 @@
                             time_signature: audioFeatures.time_signature || 4
                         },
                         durationMs: currentTrack.item.duration_ms || 0,
-                        progressMs: currentTrack.progress_ms || 0,
+                        progressMs: playbackClock && currentTrack.position_sample
+                            ? playbackClock.progressMs()
+                            : (currentTrack.progress_ms || 0),
                         isPlaying: currentTrack.is_playing || false
                     };
 
@@ -634,14 +680,20 @@
             }
         }
 
-        // Iniciar polling cada 5 segundos solo si hay API y está autenticado
+        // Iniciar polling solo si hay API y está autenticado
         if (api && auth.isAuthenticated()) {
-            pollInterval = setInterval(pollData, 5000);
+            pollInterval = setInterval(pollData, POLL_INTERVAL_MS);
+            progressInterval = setInterval(tickProgress, PROGRESS_TICK_MS);
 
-            // Primera llamada inmediata
-            setTimeout(pollData, 1000);
+            // Sincronizar reloj con el servidor y primera llamada
+            if (playbackClock && typeof api.clockSync === 'function') {
+                playbackClock.sync((clientTs) => api.clockSync(clientTs))
+                    .finally(() => setTimeout(pollData, 0));
+            } else {
+                setTimeout(pollData, 1000);
+            }
 
-            console.log("✅ Polling iniciado (cada 5 segundos)");
+            console.log(`✅ Polling iniciado (cada ${POLL_INTERVAL_MS / 1000} segundos)`);
         }
 
         // Limpiar al salir
@@ -650,6 +702,8 @@
                 clearInterval(pollInterval);
                 console.log("🧹 Polling detenido");
             }
+            if (progressInterval) clearInterval(progressInterval);
+            if (trackEndTimeout) clearTimeout(trackEndTimeout);
         });
     }
 
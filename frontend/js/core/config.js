@@ -31,7 +31,8 @@
     // Crear configuración global
     const AppConfig = {
         apiBaseUrl: apiBaseUrl,
-        pollingIntervalMs: 4000,
+        pollingIntervalMs: 15000,   // La posición se extrapola entre polls (PlaybackClock)
+        progressTickMs: 1000,
         statsIntervalMs: 30000,
         visualizer: {
             defaultMode: 'particles',
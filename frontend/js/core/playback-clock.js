@@ -0,0 +1,81 @@
+// frontend/js/core/playback-clock.js
+(function () {
+    "use strict";
+
+    /**
+     * Reloj de reproducción del cliente.
+     * - Sincroniza el reloj local con el reloj del servidor (estilo NTP).
+     * - Guarda la última muestra de posición (`position_sample`) del backend.
+     * - Extrapola `progress_ms` localmente entre polls espaciados.
+     */
+    class PlaybackClock {
+        constructor() {
+            this.offsetMs = 0;          // serverTime ≈ performance.now() + offsetMs
+            this.bestRttMs = Infinity;  // RTT de la mejor muestra de sincronización
+            this.synced = false;
+            this.sample = null;
+        }
+
+        _now() {
+            return (window.performance && performance.now) ? performance.now() : Date.now();
+        }
+
+        /**
+         * Hace varios pings a /api/clock-sync y se queda con el de menor RTT.
+         * `pingFn(clientTs)` debe devolver { client_ts, server_recv_ts, server_send_ts }.
+         */
+        async sync(pingFn, rounds = 5) {
+            for (let i = 0; i < rounds; i++) {
+                try {
+                    const t0 = this._now();
+                    const reply = await pingFn(t0);
+                    const t3 = this._now();
+                    this.addSyncSample(t0, reply.server_recv_ts, reply.server_send_ts, t3);
+                } catch (error) {
+                    console.warn("[PlaybackClock] ⚠️ Ping de sincronización fallido:", error.message);
+                }
+            }
+            console.log(`[PlaybackClock] ⏱️ Offset: ${this.offsetMs.toFixed(1)}ms (RTT ${this.bestRttMs.toFixed(1)}ms)`);
+            return this.synced;
+        }
+
+        addSyncSample(t0, t1, t2, t3) {
+            if (typeof t1 !== 'number' || typeof t2 !== 'number') return;
+
+            const rtt = (t3 - t0) - (t2 - t1);
+            if (rtt < 0 || rtt > this.bestRttMs) return;
+
+            this.bestRttMs = rtt;
+            this.offsetMs = ((t1 - t0) + (t2 - t3)) / 2;
+            this.synced = true;
+        }
+
+        serverNow() {
+            return this._now() + this.offsetMs;
+        }
+
+        setSample(sample) {
+            this.sample = sample || null;
+        }
+
+        /** Posición estimada en ms a partir de la última muestra */
+        progressMs() {
+            const sample = this.sample;
+            if (!sample) return 0;
+            if (!sample.is_playing || !this.synced) return sample.progress_ms || 0;
+
+            const elapsed = Math.max(0, this.serverNow() - sample.server_ts_ms);
+            const estimated = (sample.progress_ms || 0) + elapsed;
+            return sample.duration_ms ? Math.min(estimated, sample.duration_ms) : estimated;
+        }
+
+        /** Milisegundos hasta el final de la canción (null si no se sabe) */
+        remainingMs() {
+            const sample = this.sample;
+            if (!sample || !sample.is_playing || !sample.duration_ms) return null;
+            return sample.duration_ms - this.progressMs();
+        }
+    }
+
+    window.PlaybackClock = PlaybackClock;
+})();
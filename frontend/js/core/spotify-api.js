@@ -165,6 +165,18 @@
             }
         }
 
+        async clockSync(clientTs) {
+            // Ping de sincronización de reloj (no requiere token)
+            const url = new URL(`${this.baseUrl}/api/clock-sync`);
+            url.searchParams.append('client_ts', clientTs);
+
+            const response = await fetch(url.toString(), { method: 'GET', mode: 'cors' });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return await response.json();
+        }
+
         async getStats() {
             try {
                 console.log("[SpotifyAPIService] 📊 Obteniendo stats...");